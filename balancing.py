@@ -0,0 +1,71 @@
+from instrumentation import TRACER
+from milestone2 import schedule_keys
+
+
+def plan_merge(index, section_key, students, targets):
+    """Moves that empty a section into the course's other sections, or None if some student cannot move.
+
+    Students go to the least-loaded target with a free seat in a block
+    they have free once they leave this section.
+    """
+    leaving = index.section_masks[section_key]
+    free = {target: index.section_free[target] for target in targets}
+    seated = {target: index.seated(target) for target in targets}
+    moves = []
+    for student_id in students:
+        busy = index.student_masks[student_id] & ~leaving
+        options = [target for target in targets if free[target] > 0 and not busy & index.section_masks[target]]
+        if not options:
+            return None
+        target = min(options, key=lambda key: (seated[key], index.section_number[key]))
+        free[target] -= 1
+        seated[target] += 1
+        moves.append((student_id, target))
+    return moves
+
+
+def merge_small_sections(index, constraints, student_schedule, teacher_schedule, section_assignments):
+    """Cancel sections below their course's 'Minimum section size', merging their students elsewhere.
+
+    Sections are tried smallest first. Empty ones are simply cancelled; a
+    section with students is cancelled only if every one of them fits in
+    another section of the course, so merging never unseats anyone. A
+    course's last section is always kept. The schedules, assignments and
+    index are updated in place. Returns the cancelled section keys.
+    """
+    cancelled = []
+    for course_code in list(index.course_sections):
+        min_size, _, _ = constraints.bounds(course_code)
+        for section_key in sorted(index.course_sections[course_code], key=lambda key: (index.seated(key), key)):
+            if index.seated(section_key) >= min_size or len(index.course_sections[course_code]) == 1:
+                continue
+            # Term-aware sections only merge into sections starting in the same term
+            start_term = (index.section_terms[section_key] or (0,))[0]
+            targets = [key for key in index.course_sections[course_code]
+                       if key != section_key and (index.section_terms[key] or (0,))[0] == start_term]
+            moves = plan_merge(index, section_key, section_assignments.get(section_key, []), targets)
+            if moves is None:
+                continue
+
+            old_keys = schedule_keys(index.section_blocks[section_key], index.section_terms[section_key])
+            for student_id, target in moves:
+                for key in old_keys:
+                    student_schedule[student_id].pop(key, None)
+                index.unassign_student(student_id, section_key)
+                index.assign_student(student_id, target)
+                label = f"{course_code} (Section {index.section_number[target]})"
+                for key in schedule_keys(index.section_blocks[target], index.section_terms[target]):
+                    student_schedule[student_id][key] = label
+                section_assignments[target].append(student_id)
+            TRACER.count('students_merged', len(moves))
+
+            lecturer_id = index.section_lecturer[section_key]
+            for key in old_keys:
+                teacher_schedule.get(lecturer_id, {}).pop(key, None)
+            if lecturer_id in teacher_schedule and not teacher_schedule[lecturer_id]:
+                del teacher_schedule[lecturer_id]
+            section_assignments.pop(section_key, None)
+            index.remove_section(section_key)
+            cancelled.append(section_key)
+            TRACER.count('sections_cancelled')
+    return cancelled
@@ -0,0 +1,307 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+import milestone1
+import milestone2
+
+BLOCKS = ["1A", "1B", "2A", "2B", "3", "4A", "4B"]
+YEARS = ['1st Year', '2nd Year', '3rd Year', '4th Year']
+REQUIRED_BY_YEAR = ['BIB9', 'BIB10', 'BIB11', 'BIB12']
+TERMS = ['First term', 'Second Term', 'Any term']
+DEPARTMENTS = ['Bible', 'English', 'Mathematics', 'Science', 'Social Studies', 'Fine Arts', 'World Languages']
+
+SYNTHETIC_RULES = [
+    'The  has N number of blocks - namely : ["1A","1B","2A","2B","3","4A","4B"]',
+    'No teacher can be present twice in same block',
+    'No student can be present twice in same block',
+    '"Required" > "Requested" > "Recommended",  this is the order of priority of requests, treat it as P1, P2, P3 ',
+]
+
+STAGES = ['load_and_clean_data', 'validate_data', 'load_cleaned_data', 'extract_rules_and_constraints',
+          'preprocess_data', 'generate_schedule', 'analyze_schedule', 'save_outputs']
+
+
+# Synthetic data shaped like the workbook sheets
+def synthetic_sheets(num_requests, seed=0, chunk_size=100000, requests_per_student=7):
+    """Yield (sheet name, DataFrame chunk) pairs for a workbook of num_requests requests.
+
+    Students get their year's required Bible course plus electives drawn
+    from a skewed popularity curve; courses get enough sections (and
+    lecturers) for roughly 110% of their expected demand.
+    """
+    rng = np.random.default_rng(seed)
+    num_students = max(1, num_requests // requests_per_student)
+    num_courses = max(10, num_requests // 150)
+
+    # Courses: the four required Bible courses plus electives
+    codes = REQUIRED_BY_YEAR + [f"EL{i:05d}" for i in range(num_courses - len(REQUIRED_BY_YEAR))]
+    popularity = 1.0 / np.arange(1, num_courses + 1) ** 0.8
+    popularity[:len(REQUIRED_BY_YEAR)] = 0
+    popularity /= popularity.sum()
+    elective_requests = max(0, num_requests - num_students)
+    demand = popularity * elective_requests
+    demand[:len(REQUIRED_BY_YEAR)] = num_students / len(REQUIRED_BY_YEAR)
+
+    max_size = rng.integers(20, 41, num_courses)
+    num_sections = np.maximum(1, np.ceil(demand * 1.1 / max_size)).astype(int)
+    lengths = rng.choice([1, 2], num_courses, p=[0.3, 0.7])
+    start_terms = np.where(lengths == 2, 1, rng.choice([1, 2], num_courses))
+    available = [', '.join(sorted(rng.choice(BLOCKS, rng.integers(5, 8), replace=False), key=BLOCKS.index))
+                 for _ in range(num_courses)]
+    titles = [f"Course {code}" for code in codes]
+    departments = rng.choice(DEPARTMENTS, num_courses)
+    departments[:len(REQUIRED_BY_YEAR)] = 'Bible'
+
+    yield 'Course list', pd.DataFrame({
+        'Course code': codes, 'Title': titles, 'Length': lengths.astype(float), 'Priority': 'Core course',
+        'Available blocks': available, 'Unavailable blocks': np.nan,
+        'Minimum section size': np.maximum(1, max_size // 4), 'Target section size': (max_size * 3) // 4,
+        'Maximum section size': max_size, 'Number of sections': num_sections, 'Total credits': lengths / 2
+    })
+
+    # Sections, about five per lecturer
+    section_course = np.repeat(np.arange(num_courses), num_sections)
+    section_number = np.concatenate([np.arange(1, n + 1) for n in num_sections])
+    lecturer_ids = 5300000 + np.arange(len(section_course)) // 5
+    for start in range(0, len(section_course), chunk_size):
+        part = section_course[start:start + chunk_size]
+        yield 'Lecturer Details', pd.DataFrame({
+            'Lecturer ID': lecturer_ids[start:start + chunk_size], 'Lecture Title': np.array(titles)[part],
+            'lecture Code': np.array(codes)[part], 'Length': lengths[part], 'Start Term': start_terms[part],
+            'Section number': section_number[start:start + chunk_size]
+        })
+
+    # Requests, generated a chunk of students at a time
+    codes_array, titles_array = np.array(codes), np.array(titles)
+    students_per_chunk = max(1, chunk_size // requests_per_student)
+    emitted = first = 0
+    while emitted < num_requests:
+        # De-duplication can leave students short, so keep adding students until the count is met
+        count = max(1, min(students_per_chunk, (num_requests - emitted) // requests_per_student))
+        student_ids = 5400000 + first + np.arange(count)
+        first += count
+        years = rng.integers(0, len(YEARS), count)
+
+        # Electives drawn with replacement, then de-duplicated per student
+        per_student = requests_per_student - 1
+        elective_student = np.repeat(np.arange(count), per_student)
+        elective_course = rng.choice(num_courses, count * per_student, p=popularity)
+        pairs = np.unique(elective_student.astype(np.int64) * num_courses + elective_course)
+        student_idx = np.concatenate([np.arange(count), pairs // num_courses])
+        course_idx = np.concatenate([years, pairs % num_courses])
+        kinds = np.concatenate([np.zeros(count, dtype=int), rng.choice([1, 2], len(pairs), p=[0.85, 0.15])])
+
+        remaining = num_requests - emitted
+        if len(student_idx) > remaining:
+            student_idx, course_idx, kinds = student_idx[:remaining], course_idx[:remaining], kinds[:remaining]
+        emitted += len(student_idx)
+
+        yield 'Student requests', pd.DataFrame({
+            'College Year': np.array(YEARS)[years[student_idx]],
+            'Request start term': rng.choice(TERMS, len(student_idx), p=[0.85, 0.1, 0.05]),
+            'Title': titles_array[course_idx],
+            'Type': np.array(['Required', 'Requested', 'Recommended'])[kinds],
+            'student ID': student_ids[student_idx],
+            'Course ID': 270000 + course_idx,
+            'Length': lengths[course_idx],
+            'Course code': codes_array[course_idx],
+            'Priority': 'Core course',
+            'Department(s)': departments[course_idx],
+            'Credits': lengths[course_idx] / 2
+        })
+
+    yield 'RULES', pd.DataFrame({'S. No.': range(1, len(SYNTHETIC_RULES) + 1), 'RULES': SYNTHETIC_RULES})
+
+
+def write_synthetic_exports(export_dir, num_requests, seed=0, chunk_size=100000):
+    """Write the synthetic sheets as per-sheet CSV exports load_and_clean_data accepts"""
+    os.makedirs(export_dir, exist_ok=True)
+    written = set()
+    for sheet_name, chunk in synthetic_sheets(num_requests, seed, chunk_size):
+        path = os.path.join(export_dir, f"{sheet_name}.csv")
+        chunk.to_csv(path, mode='a' if sheet_name in written else 'w', header=sheet_name not in written, index=False)
+        written.add(sheet_name)
+    return export_dir
+
+
+def generate_synthetic_data(num_requests, seed=0):
+    """Synthetic data in the cleaned_data.json shape, for in-memory use at small scales"""
+    keys = dict(milestone1.SHEET_MAPPINGS, RULES='rules')
+    data = {key: [] for key in keys.values()}
+    for sheet_name, chunk in synthetic_sheets(num_requests, seed):
+        if sheet_name == 'Course list':
+            milestone1.parse_block_columns(chunk)
+        data[keys[sheet_name]].extend(chunk.to_dict(orient='records'))
+    return data
+
+
+# Stage timing
+class StageTimer:
+    """Records wall time, CPU time and memory for each benchmarked stage
+
+    peak_traced_bytes is the stage's own tracemalloc peak. The RSS figures
+    are high-water marks for the whole process (and for its reaped child
+    processes) up to the end of the stage, not per-stage peaks.
+    """
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.stages = {}
+
+    def run(self, name, func, *args, **kwargs):
+        if self.trace_memory:
+            tracemalloc.start()
+            tracemalloc.reset_peak()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record = {
+                'seconds': time.perf_counter() - wall,
+                'cpu_seconds': time.process_time() - cpu,
+                'process_max_rss_bytes': _max_rss_bytes(resource.RUSAGE_SELF),
+                'children_max_rss_bytes': _max_rss_bytes(resource.RUSAGE_CHILDREN)
+            }
+            if self.trace_memory:
+                record['peak_traced_bytes'] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            self.stages[name] = record
+
+
+def _max_rss_bytes(who):
+    rss = resource.getrusage(who).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def _quiet(func):
+    """Run a pipeline stage with its progress prints silenced"""
+    def wrapper(*args, **kwargs):
+        stdout = sys.stdout
+        with open(os.devnull, 'w') as devnull:
+            sys.stdout = devnull
+            try:
+                return func(*args, **kwargs)
+            finally:
+                sys.stdout = stdout
+    return wrapper
+
+
+def benchmark_scale(num_requests, seed=0, trace_memory=True, stages=STAGES):
+    """Run the whole pipeline on synthetic data of one size and time every stage"""
+    timer = StageTimer(trace_memory)
+    workdir = tempfile.mkdtemp(prefix='schedule_bench_')
+    cwd = os.getcwd()
+    try:
+        export_dir = write_synthetic_exports(os.path.join(workdir, 'exports'), num_requests, seed)
+        os.chdir(workdir)
+
+        def stage(name, func, *args, **kwargs):
+            if name in stages:
+                return timer.run(name, _quiet(func), *args, **kwargs)
+            return _quiet(func)(*args, **kwargs)
+
+        cleaned = stage('load_and_clean_data', milestone1.load_and_clean_data, export_dir)
+        stage('validate_data', milestone1.validate_data, cleaned, export_dir)
+        del cleaned
+        data = stage('load_cleaned_data', milestone2.load_cleaned_data, 'cleaned_data.json')
+        rules = stage('extract_rules_and_constraints', milestone2.extract_rules_and_constraints, data)
+        preprocessed = stage('preprocess_data', milestone2.preprocess_data, data, rules)
+        student_schedule, teacher_schedule, resolved, unresolved, section_assignments = stage(
+            'generate_schedule', milestone2.generate_schedule, data, rules, preprocessed
+        )
+        analysis = stage('analyze_schedule', milestone2.analyze_schedule, student_schedule, teacher_schedule,
+                         resolved, unresolved, section_assignments, preprocessed['course_details'])
+        stage('save_outputs', milestone2.save_outputs, student_schedule, teacher_schedule, resolved, unresolved,
+              section_assignments, rules, analysis, 'schedule_output')
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'requests': num_requests,
+        'seed': seed,
+        'satisfaction_rate': analysis['satisfaction_rate'],
+        'stages': timer.stages,
+        'total_seconds': sum(record['seconds'] for record in timer.stages.values())
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare_results(current, baseline):
+    """Print per-stage time ratios against a previous benchmark JSON"""
+    previous = {result['requests']: result for result in baseline['results']}
+    for result in current['results']:
+        old = previous.get(result['requests'])
+        if not old:
+            continue
+        print(f"\n{result['requests']} requests vs {baseline['meta'].get('commit') or 'baseline'}:")
+        for name, record in result['stages'].items():
+            if name in old['stages'] and old['stages'][name]['seconds'] > 0:
+                ratio = record['seconds'] / old['stages'][name]['seconds']
+                print(f"  {name:32s} {old['stages'][name]['seconds']:9.3f}s -> {record['seconds']:9.3f}s  x{ratio:.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the scheduling pipeline on synthetic data")
+    parser.add_argument('--scales', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help="request counts to benchmark (1k to 10M)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench_output.json', help="machine-readable results file")
+    parser.add_argument('--compare', help="previous results file to compare against")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--no-memory', action='store_true',
+                        help="skip tracemalloc peaks (they slow the stages down)")
+    args = parser.parse_args(argv)
+
+    results = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'trace_memory': not args.no_memory
+        },
+        'results': []
+    }
+    for scale in args.scales:
+        print(f"Benchmarking {scale} requests...")
+        result = benchmark_scale(scale, args.seed, not args.no_memory, args.stages)
+        for name, record in result['stages'].items():
+            peak = record.get('peak_traced_bytes')
+            peak_text = f", peak {peak / 2**20:.1f} MiB" if peak is not None else ""
+            print(f"  {name:32s} {record['seconds']:9.3f}s{peak_text}")
+        print(f"  satisfaction rate: {result['satisfaction_rate']:.2f}%")
+        results['results'].append(result)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=4)
+    print(f"Results saved to '{args.output}'")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            compare_results(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
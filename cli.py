@@ -0,0 +1,123 @@
+import argparse
+import json
+import os
+import sys
+
+from cli_args import OUTPUT_ARTIFACTS, RUN_FILE, add_scenario_arguments, add_schedule_arguments, \
+    add_service_arguments
+
+# Every stage imports its modules inside its handler, so a command only
+# pays for the dependencies it uses (pandas for clean/validate, matplotlib
+# only when plots are written); the parser itself only needs cli_args
+
+
+def clean(args):
+    """Excel workbook (or sheet exports) -> cleaned_data.json and its columnar cache"""
+    from milestone1 import load_and_clean_data
+    data = load_and_clean_data(args.input, stream=args.stream, chunk_size=args.chunk_size,
+                               examine_sheets=args.examine)
+    return 0 if data else 1
+
+
+def validate(args):
+    """Validation report and detailed HTML report for cleaned_data.json"""
+    from milestone1 import validate_data
+    if not os.path.exists(args.data):
+        print(f"Error: '{args.data}' not found. Run the clean command first.")
+        return 1
+    with open(args.data, 'r') as f:
+        data = json.load(f)
+    validate_data(data, args.input)
+    return 0
+
+
+def schedule(args):
+    """Schedule cleaned_data.json and write the selected outputs"""
+    from milestone2 import run_from_args
+    run_from_args(args)
+    return 0
+
+
+def report(args):
+    """Re-render reports from a saved schedule run without scheduling again"""
+    from milestone2 import load_run, save_outputs
+    if not os.path.exists(args.run):
+        print(f"Error: '{args.run}' not found. Run the schedule command with the 'run' artifact first.")
+        return 1
+    run = load_run(args.run)
+    save_outputs(
+        run['student_schedule'], run['teacher_schedule'], run['resolved'], run['unresolved'],
+        run['section_assignments'], run['rules'], run['analysis'], args.output_dir,
+        run.get('room_assignments'), args.artifacts
+    )
+    print(f"Reports written to '{args.output_dir}'")
+    return 0
+
+
+def scenarios(args):
+    """Compare what-if scenarios against the base schedule"""
+    from scenarios import main as run_scenarios
+    if not os.path.exists(args.data):
+        print(f"Error: '{args.data}' not found. Run the clean command first.")
+        return 1
+    run_scenarios(args.scenarios, args.data, args.workers, args.output)
+    return 0
+
+
+def serve(args):
+    """Keep the schedule in memory and answer queries and changes over HTTP"""
+    from service import main as run_service
+    if not os.path.exists(args.data):
+        print(f"Error: '{args.data}' not found. Run the clean command first.")
+        return 1
+    run_service(args.data, args.host, args.port, not args.no_memo, args.verbose)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Course scheduling pipeline")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    clean_parser = commands.add_parser('clean', help=clean.__doc__)
+    clean_parser.add_argument('--input', default='dataset.xlsx', help="workbook or directory of CSV/Parquet exports")
+    clean_parser.add_argument('--stream', action='store_true', help="read the workbook in chunks (bounds the DataFrames; the cleaned rows are "
+                                   "still all kept for cleaned_data.json)")
+    clean_parser.add_argument('--chunk-size', type=int, default=10000)
+    clean_parser.add_argument('--examine', action='store_true', help="also print the sheets that are not loaded")
+    clean_parser.set_defaults(handler=clean)
+
+    validate_parser = commands.add_parser('validate', help=validate.__doc__)
+    validate_parser.add_argument('--data', default='cleaned_data.json')
+    validate_parser.add_argument('--input', default='dataset.xlsx',
+                                 help="source workbook, read only if the cleaned data has no rooms")
+    validate_parser.set_defaults(handler=validate)
+
+    schedule_parser = commands.add_parser('schedule', help=schedule.__doc__)
+    add_schedule_arguments(schedule_parser)
+    schedule_parser.set_defaults(handler=schedule)
+
+    report_parser = commands.add_parser('report', help=report.__doc__)
+    report_parser.add_argument('--run', default=os.path.join('schedule_output', RUN_FILE))
+    report_parser.add_argument('--output-dir', default='schedule_output')
+    report_parser.add_argument('--artifacts', type=lambda value: value.split(','), metavar='NAMES',
+                               default=[name for name in OUTPUT_ARTIFACTS if name != 'run'],
+                               help=f"comma-separated outputs to write (any of {', '.join(OUTPUT_ARTIFACTS)})")
+    report_parser.set_defaults(handler=report)
+
+    scenarios_parser = commands.add_parser('scenarios', help=scenarios.__doc__)
+    add_scenario_arguments(scenarios_parser)
+    scenarios_parser.set_defaults(handler=scenarios)
+
+    serve_parser = commands.add_parser('serve', help=serve.__doc__)
+    add_service_arguments(serve_parser)
+    serve_parser.set_defaults(handler=serve)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+# Command-line options and output names shared by the scripts and cli.py.
+# Only the standard library is imported here, so building the cli parser
+# (or printing --help) does not load numpy or any scheduling module.
+
+import argparse
+
+OUTPUT_ARTIFACTS = ('student_json', 'teacher_json', 'student_md', 'teacher_md', 'request_stats',
+                    'analysis', 'rooms', 'plots', 'html', 'run')
+
+# Everything a report needs, saved by the 'run' artifact and read back by load_run
+RUN_FILE = 'schedule_run.json'
+
+
+def add_schedule_arguments(parser):
+    """The scheduling options shared by milestone2.py and cli.py's schedule command"""
+    parser.add_argument('--optimize', type=float, default=0, metavar='SECONDS',
+                        help="follow the greedy pass with a local search of this many seconds")
+    parser.add_argument('--restarts', type=int, default=0, help="run this many seeded orderings in parallel")
+    parser.add_argument('--exact', type=float, default=0, metavar='SECONDS',
+                        help="solve as an integer program with this time limit")
+    parser.add_argument('--terms', action=argparse.BooleanOptionalAction,
+                        help="schedule per term from Start Term, Length and Request start term "
+                             "(default: on if the rules have a course length rule)")
+    parser.add_argument('--placement', choices=['greedy', 'first-fit', 'coloring'], default='greedy',
+                        help="how sections get their blocks: the least-loaded free block, the first free block, "
+                             "or coloring the section conflict graph")
+    parser.add_argument('--engine', choices=['course', 'student'], default='course',
+                        help="assign students course by course, or fit each student's requests at once")
+    parser.add_argument('--balance', action=argparse.BooleanOptionalAction,
+                        help="fill sections evenly toward their target size and merge those below minimum "
+                             "(default: on if the rules ask for balanced sections)")
+    parser.add_argument('--shards', type=int, default=0,
+                        help="schedule this many shards of the students in parallel and reconcile them")
+    parser.add_argument('--shard-by', choices=['year', 'component'], default='year',
+                        help="shard by college year, or by connected component of the student-course graph")
+    parser.add_argument('--artifacts', type=lambda value: value.split(','), metavar='NAMES',
+                        help=f"comma-separated outputs to write (default: all of {', '.join(OUTPUT_ARTIFACTS)})")
+    parser.add_argument('--no-memo', action='store_true',
+                        help="recompute rules and preprocessing instead of using the on-disk memo cache")
+    parser.add_argument('--trace', metavar='PATH', help="write a per-stage Chrome trace (chrome://tracing) here")
+    parser.add_argument('--trace-memory', action='store_true', default=None,
+                        help="also record tracemalloc peaks per stage (slower)")
+    return parser
+
+
+def add_scenario_arguments(parser):
+    parser.add_argument('scenarios', help="JSON file with a list of scenarios")
+    parser.add_argument('--data', default='cleaned_data.json')
+    parser.add_argument('--workers', type=int, help="processes to run scenarios in (default: one per CPU)")
+    parser.add_argument('--output', help="also write the comparison rows to this JSON file")
+    return parser
+
+
+def add_service_arguments(parser):
+    parser.add_argument('--data', default='cleaned_data.json')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--no-memo', action='store_true', help="recompute rules and preprocessing")
+    parser.add_argument('--verbose', action='store_true', help="log every request")
+    return parser
@@ -0,0 +1,272 @@
+import hashlib
+import json
+import math
+import os
+import shutil
+from collections.abc import Mapping
+
+import numpy as np
+
+# Bump whenever the on-disk layout changes so old caches are rebuilt
+CACHE_VERSION = 2
+
+MISSING_CODE = -1  # category code for NaN (missing) cells
+
+# Missing cells decode to one shared NaN object, as json.load does, so
+# identity-based dict lookups group them the same way
+NAN = float('nan')
+
+
+def cache_path_for(json_path):
+    """Return the cache directory that sits next to a cleaned data JSON file"""
+    return os.path.splitext(json_path)[0] + '.cache'
+
+
+def _source_files(source_path):
+    if os.path.isdir(source_path):
+        paths = [os.path.join(source_path, entry) for entry in sorted(os.listdir(source_path))]
+    else:
+        paths = [source_path]
+    return [path for path in paths if os.path.isfile(path)]
+
+
+def source_stat(source_path):
+    """[name, size, mtime_ns] of each source file: cheap to check before re-hashing them"""
+    stats = []
+    for path in _source_files(source_path):
+        stat = os.stat(path)
+        stats.append([os.path.basename(path), stat.st_size, stat.st_mtime_ns])
+    return stats
+
+
+def fingerprint_source(source_path):
+    """SHA-256 over the source workbook, or over every file of an export directory"""
+    digest = hashlib.sha256()
+    for path in _source_files(source_path):
+        digest.update(os.path.basename(path).encode())
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def _is_missing(value):
+    return isinstance(value, float) and math.isnan(value)
+
+
+def _column_kind(values):
+    """Pick the narrowest storage kind that round-trips every value exactly"""
+    present = [v for v in values if not _is_missing(v)]
+    if present and all(isinstance(v, list) for v in present) and len(present) == len(values):
+        return 'list'
+    if all(type(v) is int for v in values):
+        return 'int'
+    if all(type(v) is float for v in values):
+        return 'float'
+    return 'category'
+
+
+def _encode(values, categories, codes_by_value):
+    """Intern values into category codes, growing the category table.
+
+    Values are keyed with their type: 1, 1.0 and True are equal (and hash
+    alike) but must each decode to themselves.
+    """
+    codes = np.empty(len(values), dtype=np.int32)
+    for i, value in enumerate(values):
+        if _is_missing(value):
+            codes[i] = MISSING_CODE
+            continue
+        key = (type(value), value)
+        code = codes_by_value.get(key)
+        if code is None:
+            code = codes_by_value[key] = len(categories)
+            categories.append(value)
+        codes[i] = code
+    return codes
+
+
+def write_columnar_cache(structured_data, cache_path, source_path, json_path=None):
+    """Write each table of the cleaned data as one .npy file per column.
+
+    Strings (and any other mixed column) are interned into category codes,
+    block lists are stored as flat codes plus offsets. header.json records
+    the cache version, the source fingerprint (and the size and mtime of
+    its files) and the JSON it mirrors.
+    """
+    tmp_path = cache_path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    header = {
+        'version': CACHE_VERSION,
+        'source': os.path.abspath(source_path),
+        'fingerprint': fingerprint_source(source_path),
+        'source_stat': source_stat(source_path),
+        'json': None,
+        'tables': {}
+    }
+    if json_path and os.path.exists(json_path):
+        stat = os.stat(json_path)
+        header['json'] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    for table_name, rows in structured_data.items():
+        column_names = []
+        for row in rows:
+            for column in row:
+                if column not in column_names:
+                    column_names.append(column)
+
+        table = {'rows': len(rows), 'columns': {}}
+        for position, column in enumerate(column_names):
+            values = [row.get(column, NAN) for row in rows]
+            kind = _column_kind(values)
+            file_name = f"{table_name}.{position}"
+            entry = {'kind': kind, 'file': file_name}
+
+            if kind == 'int':
+                np.save(os.path.join(tmp_path, file_name + '.npy'), np.array(values, dtype=np.int64))
+            elif kind == 'float':
+                np.save(os.path.join(tmp_path, file_name + '.npy'), np.array(values, dtype=np.float64))
+            else:
+                categories = []
+                codes_by_value = {}
+                if kind == 'list':
+                    flat = [item for items in values for item in items]
+                    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+                    np.cumsum([len(items) for items in values], out=offsets[1:])
+                    np.save(os.path.join(tmp_path, file_name + '.offsets.npy'), offsets)
+                    values = flat
+                np.save(os.path.join(tmp_path, file_name + '.npy'), _encode(values, categories, codes_by_value))
+                with open(os.path.join(tmp_path, file_name + '.categories.json'), 'w') as f:
+                    json.dump(categories, f)
+            table['columns'][column] = entry
+        header['tables'][table_name] = table
+
+    with open(os.path.join(tmp_path, 'header.json'), 'w') as f:
+        json.dump(header, f, indent=4)
+
+    # Swap the finished cache in so readers never see a half-written one
+    shutil.rmtree(cache_path, ignore_errors=True)
+    os.replace(tmp_path, cache_path)
+    return cache_path
+
+
+def read_cache_header(cache_path):
+    header_path = os.path.join(cache_path, 'header.json')
+    if not os.path.exists(header_path):
+        return None
+    with open(header_path, 'r') as f:
+        return json.load(f)
+
+
+def is_cache_stale(header, json_path=None, check_source=True):
+    """Return a reason string if the cache no longer matches its inputs, else None"""
+    if header is None:
+        return "no cache"
+    if header.get('version') != CACHE_VERSION:
+        return f"cache version {header.get('version')} != {CACHE_VERSION}"
+    if json_path and header.get('json') and os.path.exists(json_path):
+        stat = os.stat(json_path)
+        if (stat.st_size, stat.st_mtime_ns) != (header['json']['size'], header['json']['mtime_ns']):
+            return f"'{json_path}' changed after the cache was written"
+    source = header.get('source')
+    if check_source and source and os.path.exists(source):
+        # Hash the source again only if a file's size or mtime moved
+        if source_stat(source) != header.get('source_stat') and fingerprint_source(source) != header.get('fingerprint'):
+            return f"'{source}' changed after the cache was written"
+    return None
+
+
+class ColumnTable:
+    """Read-only table backed by memory-mapped column files.
+
+    Columns are only opened (and decoded) the first time a row asks for
+    them, so memory grows with the columns the caller actually reads.
+    """
+
+    def __init__(self, cache_path, table_name, table_header):
+        self.cache_path = cache_path
+        self.name = table_name
+        self.rows = table_header['rows']
+        self.column_specs = table_header['columns']
+        self._columns = {}
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [RowView(self, j) for j in range(*i.indices(self.rows))]
+        if i < 0:
+            i += self.rows
+        if not 0 <= i < self.rows:
+            raise IndexError(i)
+        return RowView(self, i)
+
+    def __iter__(self):
+        for i in range(self.rows):
+            yield RowView(self, i)
+
+    def _path(self, spec, suffix='.npy'):
+        return os.path.join(self.cache_path, spec['file'] + suffix)
+
+    def codes(self, column):
+        """Raw memory-mapped array of a column (category codes for strings)"""
+        return np.load(self._path(self.column_specs[column]), mmap_mode='r')
+
+    def categories(self, column):
+        with open(self._path(self.column_specs[column], '.categories.json'), 'r') as f:
+            return json.load(f)
+
+    def column(self, column):
+        """Decoded column as a list of Python values, loaded once"""
+        if column not in self._columns:
+            spec = self.column_specs[column]
+            data = self.codes(column)
+            if spec['kind'] in ('int', 'float'):
+                values = data.tolist()
+            else:
+                categories = self.categories(column)
+                decoded = [categories[code] if code != MISSING_CODE else NAN for code in data.tolist()]
+                if spec['kind'] == 'list':
+                    offsets = np.load(self._path(spec, '.offsets.npy'), mmap_mode='r').tolist()
+                    decoded = [decoded[offsets[i]:offsets[i + 1]] for i in range(self.rows)]
+                values = decoded
+            self._columns[column] = values
+        return self._columns[column]
+
+
+class RowView(Mapping):
+    """One row of a ColumnTable, read like the dicts in cleaned_data.json"""
+
+    __slots__ = ('table', 'i')
+
+    def __init__(self, table, i):
+        self.table = table
+        self.i = i
+
+    def __getitem__(self, column):
+        if column not in self.table.column_specs:
+            raise KeyError(column)
+        return self.table.column(column)[self.i]
+
+    def __iter__(self):
+        return iter(self.table.column_specs)
+
+    def __len__(self):
+        return len(self.table.column_specs)
+
+    def __repr__(self):
+        return f"RowView({self.table.name}[{self.i}])"
+
+
+def load_columnar_cache(cache_path, json_path=None, check_source=True):
+    """Open a cache as {table: ColumnTable}, or return None if it is missing or stale"""
+    header = read_cache_header(cache_path)
+    reason = is_cache_stale(header, json_path, check_source)
+    if reason:
+        if header is not None:
+            print(f"Ignoring stale columnar cache: {reason}")
+        return None
+    return {name: ColumnTable(cache_path, name, table) for name, table in header['tables'].items()}
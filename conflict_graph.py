@@ -0,0 +1,204 @@
+import heapq
+from collections import defaultdict
+
+import numpy as np
+
+from rule_compiler import compile_constraints
+
+
+def co_request_counts(course_requests, courses):
+    """Number of students requesting each pair of courses, as sparse COO arrays.
+
+    This is the upper triangle of A^T A for the student x course incidence
+    matrix A, computed without ever forming A densely or looping over
+    student pairs: (student, course) codes are sorted once, and entry i is
+    paired with entry i + d of the same student for each offset d up to the
+    longest request list. Returns (rows, cols, counts) with rows < cols,
+    indexing into `courses`.
+    """
+    course_index = {course_code: i for i, course_code in enumerate(courses)}
+    student_index = {}
+    student_codes = []
+    course_codes = []
+    for course_code in courses:
+        for req in course_requests.get(course_code, []):
+            student_id = req.get('student ID', '')
+            if not student_id:
+                continue
+            student_codes.append(student_index.setdefault(student_id, len(student_index)))
+            course_codes.append(course_index[course_code])
+
+    empty = np.zeros(0, dtype=np.int64)
+    if not student_codes:
+        return empty, empty, empty
+
+    # One entry per (student, course), sorted by student then course
+    num_courses = len(courses)
+    keys = np.unique(np.array(student_codes, dtype=np.int64) * num_courses + np.array(course_codes, dtype=np.int64))
+    students, course_ids = np.divmod(keys, num_courses)
+    longest = int(np.bincount(students).max())
+
+    pair_keys = []
+    for offset in range(1, longest):
+        same_student = students[:-offset] == students[offset:]
+        pair_keys.append(course_ids[:-offset][same_student] * num_courses + course_ids[offset:][same_student])
+    if not pair_keys:
+        return empty, empty, empty
+    pairs, counts = np.unique(np.concatenate(pair_keys), return_counts=True)
+    rows, cols = np.divmod(pairs, num_courses)
+    return rows, cols, counts
+
+
+class ConflictGraph:
+    """Sections as nodes, with hard and weighted conflict edges.
+
+    Hard edges join sections that must not share a block: sections of the
+    same course (students choose between them) and sections taught by the
+    same lecturer. Weighted edges join sections of different courses by the
+    number of students requesting both courses, split evenly over the
+    section pairs since each such student sits in one section of each.
+    All sections of a course share the same weighted neighbours, so those
+    edges are stored once per course pair rather than per section pair.
+    """
+
+    def __init__(self, sections):
+        self.sections = sections  # [(section_key, course_code, lecturer_id)]
+        self.hard = [set() for _ in sections]
+        self.courses = []                     # course codes, indexed by course_of
+        self.course_of = []                   # {section index: course index}
+        self.course_sections = []             # {course index: [section index]}
+        self.weights = []                     # {course index: {course index: weight per section pair}}
+
+    @classmethod
+    def build(cls, sections, course_requests):
+        graph = cls(sections)
+        course_index = {}
+        by_lecturer = defaultdict(list)
+        for i, (_, course_code, lecturer_id) in enumerate(sections):
+            if course_code not in course_index:
+                course_index[course_code] = len(graph.courses)
+                graph.courses.append(course_code)
+                graph.course_sections.append([])
+            graph.course_of.append(course_index[course_code])
+            graph.course_sections[course_index[course_code]].append(i)
+            by_lecturer[lecturer_id].append(i)
+        for group in graph.course_sections + list(by_lecturer.values()):
+            for i in group:
+                graph.hard[i].update(j for j in group if j != i)
+
+        graph.weights = [{} for _ in graph.courses]
+        rows, cols, counts = co_request_counts(course_requests, graph.courses)
+        for a, b, count in zip(rows.tolist(), cols.tolist(), counts.tolist()):
+            weight = count / (len(graph.course_sections[a]) * len(graph.course_sections[b]))
+            graph.weights[a][b] = graph.weights[b][a] = weight
+        return graph
+
+    def conflict_weight(self, coloring):
+        """Total weight of weighted edges whose ends share a block"""
+        placed = defaultdict(int)  # {(course index, block): sections}
+        for i, block in coloring.items():
+            placed[self.course_of[i], block] += 1
+        total = 0.0
+        for (course, block), count in placed.items():
+            for other, weight in self.weights[course].items():
+                if other > course:
+                    total += weight * count * placed.get((other, block), 0)
+        return total
+
+
+def color_blocks(graph, allowed, busy=None):
+    """Assign each section a block, DSatur style.
+
+    allowed[i] lists section i's candidate blocks in preference order, and
+    busy (optional) maps a lecturer to blocks already booked elsewhere.
+    The section with the fewest blocks left is colored next (ties: most
+    hard neighbours, then most co-request weight). It takes the candidate
+    block, free of hard neighbours, with the least co-request weight to
+    sections already there. Returns {section index: block}; sections
+    with no block left are omitted.
+    """
+    bits = {}
+    for candidates in allowed:
+        for block in candidates:
+            bits.setdefault(block, 1 << len(bits))
+    busy = busy or {}
+    forbidden = []
+    for _, _, lecturer_id in graph.sections:
+        mask = 0
+        for block in busy.get(lecturer_id, ()):
+            mask |= bits.get(block, 0)
+        forbidden.append(mask)
+
+    # Co-request weight already placed in each block, per course: every
+    # section of a course sees the same neighbours, so one table serves all
+    cost = [defaultdict(float) for _ in graph.courses]
+    total_weight = [
+        sum(weight * len(graph.course_sections[other]) for other, weight in graph.weights[course].items())
+        for course in graph.course_of
+    ]
+
+    def options(i):
+        return [block for block in allowed[i] if not forbidden[i] & bits[block]]
+
+    def entry(i):
+        return len(options(i)), -len(graph.hard[i]), -total_weight[i], i
+
+    heap = [entry(i) for i in range(len(graph.sections))]
+    heapq.heapify(heap)
+    coloring = {}
+    while heap:
+        remaining, _, _, i = heapq.heappop(heap)
+        if i in coloring:
+            continue
+        candidates = options(i)
+        if remaining != len(candidates):
+            # Stale entry: a neighbour took one of its blocks since it was pushed
+            heapq.heappush(heap, entry(i))
+            continue
+        if not candidates:
+            coloring[i] = None
+            continue
+        course_cost = cost[graph.course_of[i]]
+        block = min(candidates, key=lambda b: course_cost[b])  # min keeps preference order on ties
+        coloring[i] = block
+        for j in graph.hard[i]:
+            if j not in coloring and not forbidden[j] & bits[block]:
+                forbidden[j] |= bits[block]
+                heapq.heappush(heap, entry(j))
+        for other, weight in graph.weights[graph.course_of[i]].items():
+            cost[other][block] += weight
+    return {i: block for i, block in coloring.items() if block is not None}
+
+
+def plan_section_blocks(demand, rules, preprocessed_data, busy=None):
+    """Section blocks for every course with demand, placed by coloring the conflict graph.
+
+    demand maps course codes to their number of schedulable requests; each
+    course gets as many sections as that needs, up to 'Number of sections'.
+    busy maps lecturers to blocks they cannot teach in (see color_blocks).
+    Returns ([(section_key, course_code, section_num, lecturer_id, block)], graph).
+    """
+    course_details = preprocessed_data['course_details']
+    course_to_lecturer = preprocessed_data['course_to_lecturer']
+    constraints = preprocessed_data.get('constraints') or compile_constraints(rules, course_details)
+
+    sections = []
+    numbers = []
+    allowed = []
+    for course_code, requests in demand.items():
+        course = course_details.get(course_code, {})
+        _, _, max_size = constraints.bounds(course_code)
+        needed = min(course.get('num_sections', 1), (requests + max_size - 1) // max_size) if max_size > 0 else 0
+        blocks = constraints.blocks_for(course_code)
+        for section_num in range(1, needed + 1):
+            section_key = f"{course_code}_{section_num}"
+            lecturer_id = course_to_lecturer.get(section_key, f"unknown_{course_code}")
+            sections.append((section_key, course_code, lecturer_id))
+            numbers.append(section_num)
+            allowed.append(blocks)
+
+    graph = ConflictGraph.build(sections, preprocessed_data['course_requests'])
+    coloring = color_blocks(graph, allowed, busy)
+    plan = [(section_key, course_code, numbers[i], lecturer_id, coloring[i])
+            for i, (section_key, course_code, lecturer_id) in enumerate(sections) if i in coloring]
+    return plan, graph
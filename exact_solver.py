@@ -0,0 +1,335 @@
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from milestone2 import generate_schedule
+from optimizer import priority_weights
+from schedule_index import ScheduleIndex
+
+
+def _groups(keys):
+    """Split positions 0..n-1 into arrays of positions that share a key"""
+    if len(keys) == 0:
+        return []
+    order = np.argsort(keys, kind='stable')
+    boundaries = np.flatnonzero(np.diff(keys[order])) + 1
+    return np.split(order, boundaries)
+
+
+def _course_components(course_of_request, student_of_request, course_lecturers, num_courses):
+    """Connected course groups: courses are linked by a shared student or lecturer"""
+    parent = np.arange(num_courses)
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i, j):
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parent[root_j] = root_i
+
+    for positions in _groups(student_of_request):
+        courses = course_of_request[positions]
+        for course in courses[1:]:
+            union(courses[0], course)
+    for courses in course_lecturers.values():
+        for course in courses[1:]:
+            union(courses[0], course)
+
+    roots = np.array([find(i) for i in range(num_courses)])
+    return [np.flatnonzero(roots == root) for root in np.unique(roots)]
+
+
+class ModelSpec:
+    """Solver-neutral 0/1 program: maximize weights . v subject to grouped sums <= bound"""
+
+    def __init__(self, num_vars, weights, hints):
+        self.num_vars = num_vars
+        self.weights = weights
+        self.hints = hints
+        self.constraints = []  # (var indices, coefficients or None for all-ones, upper bound)
+
+    def add_at_most(self, groups, var_offset, bound=1):
+        for positions in groups:
+            if len(positions) > bound:
+                self.constraints.append((positions + var_offset, None, bound))
+
+    def repair_hints(self):
+        """Switch hinted variables off until the warm start satisfies every constraint.
+        
+        Solvers such as CBC drop an infeasible start entirely. All-ones rows
+        go first; switching variables off only helps them. Rows with negative
+        coefficients (capacity) come second and only switch off their
+        positive-coefficient variables, so the first pass stays satisfied.
+        """
+        hints = self.hints
+        for weighted in (False, True):
+            for indices, coefs, bound in self.constraints:
+                if (coefs is not None) != weighted:
+                    continue
+                coefs = np.ones(len(indices), dtype=np.int64) if coefs is None else coefs
+                excess = int(coefs[hints[indices]].sum()) - bound
+                for i, coef in zip(indices[::-1], coefs[::-1]):
+                    if excess <= 0:
+                        break
+                    if hints[i] and coef > 0:
+                        hints[i] = False
+                        excess -= coef
+
+
+def _solve_cp_sat(spec, deadline, workers):
+    from ortools.sat.python import cp_model
+
+    model = cp_model.CpModel()
+    v = [model.NewBoolVar('') for _ in range(spec.num_vars)]
+    for indices, coefs, bound in spec.constraints:
+        if coefs is None:
+            model.Add(sum(v[i] for i in indices) <= bound)
+        else:
+            model.Add(sum(int(c) * v[i] for i, c in zip(indices, coefs)) <= bound)
+    model.Maximize(sum(int(w) * v[i] for i, w in enumerate(spec.weights) if w))
+    for i, hint in enumerate(spec.hints):
+        model.AddHint(v[i], int(hint))
+
+    time_limit = deadline - time.perf_counter()
+    if time_limit <= 0:
+        return None, 'NOT_SOLVED', None
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = time_limit
+    solver.parameters.num_workers = workers
+    status = solver.Solve(model)
+    if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        return None, solver.StatusName(status), None
+    values = np.array([solver.Value(var) for var in v], dtype=bool)
+    return values, solver.StatusName(status), solver.BestObjectiveBound()
+
+
+def _solve_cbc(spec, deadline, workers):
+    import pulp
+
+    problem = pulp.LpProblem('schedule', pulp.LpMaximize)
+    v = [pulp.LpVariable(f"v{i}", cat='Binary') for i in range(spec.num_vars)]
+    problem += pulp.lpSum(int(w) * v[i] for i, w in enumerate(spec.weights) if w)
+    for indices, coefs, bound in spec.constraints:
+        if coefs is None:
+            problem += pulp.lpSum(v[i] for i in indices) <= bound
+        else:
+            problem += pulp.lpSum(int(c) * v[i] for i, c in zip(indices, coefs)) <= bound
+    for i, hint in enumerate(spec.hints):
+        v[i].setInitialValue(int(hint))
+
+    time_limit = deadline - time.perf_counter()
+    if time_limit <= 0:
+        return None, 'Not Solved', None
+    solver = pulp.PULP_CBC_CMD(msg=False, timeLimit=time_limit, threads=workers, warmStart=True)
+    problem.solve(solver)
+    status = pulp.LpSolution[problem.sol_status]
+    if problem.sol_status not in (pulp.LpSolutionOptimal, pulp.LpSolutionIntegerFeasible):
+        return None, status, None
+    values = np.array([(var.value() or 0) > 0.5 for var in v], dtype=bool)
+    return values, status, None
+
+
+BACKENDS = {'cp-sat': ('ortools', _solve_cp_sat), 'cbc': ('pulp', _solve_cbc)}
+
+
+def _pick_backend(backend):
+    import importlib.util
+    names = list(BACKENDS) if backend == 'auto' else [backend]
+    for name in names:
+        module, solve = BACKENDS[name]
+        if importlib.util.find_spec(module) is not None:
+            return name, solve
+    raise ImportError("The exact solver needs OR-Tools (pip install ortools) or PuLP (pip install pulp)")
+
+
+def solve_exact(data, rules, preprocessed_data, time_limit=60, backend='auto', warm_start=True, workers=8):
+    """Solve section blocks and student seats together as one 0/1 program.
+
+    Variables are x[section, block] (section runs in block) and
+    a[request, block] (request is seated in its course's section at block).
+    Constraints mirror generate_schedule: available minus unavailable
+    blocks, one block per section, distinct blocks for sections of a course,
+    no lecturer or student twice in a block, and max section size.
+    The objective weights Required > Requested > Recommended like the local
+    search does. Courses are split into groups that share no student or
+    lecturer, each solved on its own with a share of what is left of
+    time_limit once the model is built (building and solving all count
+    against it). The greedy schedule is passed in as a warm start, and a
+    component keeps its repaired warm start whenever the solver returns
+    nothing or a worse objective.
+
+    Returns (generate_schedule results, solver info).
+    """
+    backend_name, solve = _pick_backend(backend)
+    started = time.perf_counter()
+    course_to_lecturer = preprocessed_data['course_to_lecturer']
+    course_details = preprocessed_data['course_details']
+    course_requests = preprocessed_data['course_requests']
+    weights_by_type = priority_weights(rules)
+
+    blocks = list(rules['all_blocks'])
+    block_pos = {block: i for i, block in enumerate(blocks)}
+    num_blocks = len(blocks)
+
+    # Requests that can be scheduled, one per (student, course), highest priority first
+    courses = list(course_requests)
+    course_pos = {course: i for i, course in enumerate(courses)}
+    requests, unschedulable, seen = [], [], set()
+    for course_code, reqs in course_requests.items():
+        for req in reqs:
+            req_type = req.get('Type', '')
+            if req_type not in weights_by_type:
+                continue
+            student_id = req.get('student ID', '')
+            if not student_id or (student_id, course_code) in seen:
+                unschedulable.append(req)
+                continue
+            seen.add((student_id, course_code))
+            requests.append(req)
+
+    students = {}
+    req_course = np.array([course_pos[req.get('Course code', '')] for req in requests], dtype=np.int64)
+    req_student = np.array([students.setdefault(req['student ID'], len(students)) for req in requests],
+                           dtype=np.int64)
+    req_weight = np.array([weights_by_type[req['Type']] for req in requests], dtype=np.int64)
+
+    # Allowed blocks per course as a boolean matrix
+    allowed = np.zeros((len(courses), num_blocks), dtype=bool)
+    max_size = np.zeros(len(courses), dtype=np.int64)
+    sections, lecturers = [], {}
+    course_lecturers = defaultdict(list)
+    for i, course_code in enumerate(courses):
+        course = course_details.get(course_code, {})
+        unavailable = set(course.get('unavailable_blocks', []))
+        for block in course.get('available_blocks', blocks):
+            if block in block_pos and block not in unavailable:
+                allowed[i, block_pos[block]] = True
+        max_size[i] = course.get('max_size', 25)
+        for section_num in range(1, course.get('num_sections', 1) + 1):
+            section_key = f"{course_code}_{section_num}"
+            lecturer_id = course_to_lecturer.get(section_key, f"unknown_{course_code}")
+            sections.append((section_key, i, section_num, lecturers.setdefault(lecturer_id, len(lecturers))))
+            course_lecturers[lecturer_id].append(i)
+    sec_course = np.array([s[1] for s in sections], dtype=np.int64)
+    sec_lecturer = np.array([s[3] for s in sections], dtype=np.int64)
+    lecturer_ids = list(lecturers)
+
+    # Greedy schedule as the warm start
+    hint_blocks, hint_seats = {}, set()
+    if warm_start:
+        index = ScheduleIndex(blocks)
+        _, _, _, _, greedy_assignments = generate_schedule(data, rules, preprocessed_data, index=index)
+        hint_blocks = dict(index.section_blocks)
+        for section_key, members in greedy_assignments.items():
+            course_code = index.section_course[section_key]
+            for student_id in members:
+                hint_seats.add((student_id, course_code, index.section_blocks[section_key]))
+
+    components = _course_components(req_course, req_student,
+                                    {l: np.array(c) for l, c in course_lecturers.items()}, len(courses))
+    deadline = started + time_limit
+    remaining_size = max(1, len(requests) + len(sections))
+
+    section_blocks, seated = {}, {}  # {section_key: block}, {request position: block}
+    info = {'backend': backend_name, 'components': []}
+    for component in components:
+        in_component = np.zeros(len(courses), dtype=bool)
+        in_component[component] = True
+        comp_sections = np.flatnonzero(in_component[sec_course])
+        comp_requests = np.flatnonzero(in_component[req_course])
+        size = len(comp_requests) + len(comp_sections)
+        if len(comp_sections) == 0 or len(comp_requests) == 0:
+            remaining_size -= size
+            continue
+
+        # Vectorised variable layout: x pairs first, then a pairs
+        x_sec, x_block = np.nonzero(allowed[sec_course[comp_sections]])
+        x_sec = comp_sections[x_sec]
+        a_req, a_block = np.nonzero(allowed[req_course[comp_requests]])
+        a_req = comp_requests[a_req]
+        nx, na = len(x_sec), len(a_req)
+
+        weights = np.concatenate([np.zeros(nx, dtype=np.int64), req_weight[a_req]])
+        hints = np.zeros(nx + na, dtype=bool)
+        if warm_start:
+            hints[:nx] = [hint_blocks.get(sections[k][0]) == blocks[b] for k, b in zip(x_sec, x_block)]
+            hints[nx:] = [(requests[r]['student ID'], courses[req_course[r]], blocks[b]) in hint_seats
+                          for r, b in zip(a_req, a_block)]
+        spec = ModelSpec(nx + na, weights, hints)
+
+        spec.add_at_most(_groups(x_sec), 0)                                       # one block per section
+        spec.add_at_most(_groups(sec_course[x_sec] * num_blocks + x_block), 0)    # distinct blocks per course
+        spec.add_at_most(_groups(sec_lecturer[x_sec] * num_blocks + x_block), 0)  # lecturer once per block
+        spec.add_at_most(_groups(a_req), nx)                                      # one seat per request
+        spec.add_at_most(_groups(req_student[a_req] * num_blocks + a_block), nx)  # student once per block
+
+        # Seats at (course, block) <= max size if one of the course's sections runs there
+        x_keys = sec_course[x_sec] * num_blocks + x_block
+        a_keys = req_course[a_req] * num_blocks + a_block
+        keys = np.concatenate([x_keys, a_keys])
+        coefs = np.concatenate([-max_size[sec_course[x_sec]], np.ones(na, dtype=np.int64)])
+        for positions in _groups(keys):
+            spec.constraints.append((positions, coefs[positions], 0))
+
+        if warm_start:
+            spec.repair_hints()
+        # This component's share of the time left; the backend's own model
+        # building counts against it too
+        now = time.perf_counter()
+        share = (deadline - now) * size / remaining_size
+        remaining_size -= size
+        values, status, bound = solve(spec, now + share, workers)
+        objective = int(weights[values].sum()) if values is not None else None
+
+        # The repaired warm start is feasible: keep it over no answer or a worse one
+        hint_objective = int(weights[spec.hints].sum())
+        kept_hints = values is None or objective < hint_objective
+        if kept_hints:
+            values = spec.hints
+        info['components'].append({
+            'courses': len(component), 'requests': len(comp_requests), 'sections': len(comp_sections),
+            'variables': nx + na, 'constraints': len(spec.constraints), 'status': status,
+            'objective': objective, 'warm_start_objective': hint_objective, 'kept_warm_start': kept_hints,
+            'bound': bound
+        })
+        for k, b in zip(x_sec[values[:nx]], x_block[values[:nx]]):
+            section_blocks[sections[k][0]] = blocks[b]
+        for r, b in zip(a_req[values[nx:]], a_block[values[nx:]]):
+            seated[r] = blocks[b]
+
+    # Translate back into the shapes generate_schedule returns
+    section_at = {}
+    teacher_schedule = defaultdict(dict)
+    for section_key, course_idx, section_num, lecturer in sections:
+        if section_key in section_blocks:
+            block = section_blocks[section_key]
+            section_at[(course_idx, block)] = (section_key, section_num)
+            teacher_schedule[lecturer_ids[lecturer]][block] = f"{courses[course_idx]} (Section {section_num})"
+
+    student_schedule = defaultdict(dict)
+    section_assignments = defaultdict(list)
+    resolved, unresolved = [], list(unschedulable)
+    for r, req in enumerate(requests):
+        block = seated.get(r)
+        if block is None:
+            unresolved.append(req)
+            continue
+        section_key, section_num = section_at[(req_course[r], block)]
+        student_schedule[req['student ID']][block] = f"{courses[req_course[r]]} (Section {section_num})"
+        section_assignments[section_key].append(req['student ID'])
+        resolved.append(req)
+    for section_key in section_blocks:
+        section_assignments.setdefault(section_key, [])
+
+    info['seconds'] = time.perf_counter() - started
+    result = (
+        {student: dict(blocks) for student, blocks in student_schedule.items()},
+        {teacher: dict(blocks) for teacher, blocks in teacher_schedule.items()},
+        resolved, unresolved, section_assignments
+    )
+    return result, info
@@ -0,0 +1,320 @@
+import bisect
+import itertools
+from collections import defaultdict
+
+from milestone2 import generate_schedule, schedule_keys
+from rule_compiler import compile_constraints
+from schedule_index import ScheduleIndex
+from terms import NUM_TERMS, request_start_term
+
+
+def normalize_id(value):
+    """Student and lecturer IDs are ints in the data; a string of digits (a URL or JSON body) is the same ID"""
+    if isinstance(value, str) and value.isascii() and value.isdigit():
+        return int(value)
+    return value
+
+
+def request_key(req):
+    """Identify a request by (student ID, Course code)"""
+    return normalize_id(req.get('student ID', '')), req.get('Course code', '')
+
+
+class IncrementalScheduler:
+    """Keeps a finished schedule warm and applies request adds/drops to it.
+
+    Sections keep their blocks; only the students named in a delta, and the
+    waitlisted requests that can use seats or blocks those changes free up,
+    are touched. Each call to apply() returns the assignments it changed.
+    A term-aware schedule (previous['terms'] > 1) stays keyed by term slot
+    and seats requests in sections that start in their requested term.
+    """
+
+    def __init__(self, previous, rules, preprocessed_data, index=None):
+        self.rules = rules
+        self.course_details = preprocessed_data['course_details']
+        self.constraints = preprocessed_data.get('constraints') or \
+            compile_constraints(rules, self.course_details)
+
+        self.student_schedule = defaultdict(dict, {
+            student: dict(blocks) for student, blocks in previous['student_schedule'].items()
+        })
+        self.teacher_schedule = {
+            teacher: dict(blocks) for teacher, blocks in previous['teacher_schedule'].items()
+        }
+        self.section_assignments = defaultdict(list, {
+            key: list(students) for key, students in previous['section_assignments'].items()
+        })
+        if index is None:
+            index = ScheduleIndex.from_schedule(
+                rules['all_blocks'], previous['section_blocks'], self.section_assignments,
+                self.teacher_schedule, self.course_details, preprocessed_data['course_to_lecturer'],
+                previous.get('terms', 1), previous.get('section_terms')
+            )
+        self.index = index
+        self.section_blocks = index.section_blocks
+        self.term_aware = index.terms > 1
+
+        # Placed requests by key, and unplaced ones as per-course waitlists
+        # sorted by (priority rank, arrival) so higher priorities fill first
+        self.placed = {}
+        self._arrival = itertools.count()
+        self.waitlist = defaultdict(list)          # {course_code: [(rank, seq, student_id)]}
+        self.waitlisted = {}                       # {(student, course): (rank, seq, req)}
+        self.student_waitlist = defaultdict(set)   # {student_id: {course_code}}
+
+        # Requests without a student, or repeating a (student, course) already
+        # placed or waiting, can never be seated but still count as unresolved
+        self.unschedulable = []
+
+        for req in previous.get('resolved', []):
+            key = request_key(req)
+            if key in self.placed:
+                self.unschedulable.append(req)
+            else:
+                self.placed[key] = req
+        for req in previous.get('unresolved', []):
+            self._enqueue(req)
+
+    @classmethod
+    def from_run(cls, data, rules, preprocessed_data, term_aware=False):
+        """Run generate_schedule once and keep its index warm for later deltas"""
+        index = ScheduleIndex(rules['all_blocks'], terms=NUM_TERMS if term_aware else 1)
+        student_schedule, teacher_schedule, resolved, unresolved, section_assignments = generate_schedule(
+            data, rules, preprocessed_data, index=index, term_aware=term_aware
+        )
+        previous = {
+            'student_schedule': student_schedule,
+            'teacher_schedule': teacher_schedule,
+            'section_assignments': section_assignments,
+            'section_blocks': index.section_blocks,
+            'terms': index.terms,
+            'section_terms': index.section_terms,
+            'resolved': resolved,
+            'unresolved': unresolved
+        }
+        return cls(previous, rules, preprocessed_data, index=index)
+
+    def _keys(self, section_key, block=None):
+        """Schedule keys a section fills: its block, or one slot per term it runs in"""
+        block = self.section_blocks[section_key] if block is None else block
+        return schedule_keys(block, self.index.section_terms[section_key] if self.term_aware else None)
+
+    def _enqueue(self, req):
+        student_id, course_code = key = request_key(req)
+        if not student_id or key in self.placed:
+            self.unschedulable.append(req)
+            return
+        if key in self.waitlisted:
+            return
+        rank = self.constraints.request_rank(req, len(self.constraints.priority_rank))
+        seq = next(self._arrival)
+        bisect.insort(self.waitlist[course_code], (rank, seq, student_id))
+        self.waitlisted[key] = (rank, seq, req)
+        self.student_waitlist[student_id].add(course_code)
+
+    def _dequeue(self, key):
+        rank, seq, req = self.waitlisted.pop(key)
+        student_id, course_code = key
+        queue = self.waitlist[course_code]
+        del queue[bisect.bisect_left(queue, (rank, seq, student_id))]
+        self.student_waitlist[student_id].discard(course_code)
+        return req
+
+    def _place(self, req, changes):
+        """Seat a request in the first compatible open section; return True on success"""
+        student_id, course_code = request_key(req)
+        if course_code in self.index.student_sections[student_id]:
+            # Already seated in the course through another request
+            return False
+        start_term = request_start_term(req) if self.term_aware else None
+        section_key = self.index.find_section(student_id, course_code, start_term)
+        if section_key is None:
+            return False
+        self.seat(req, section_key, changes)
+        return True
+
+    def seat(self, req, section_key, changes=None):
+        """Seat a request in a given section; the caller has checked that it fits"""
+        student_id, course_code = key = request_key(req)
+        if key in self.waitlisted:
+            self._dequeue(key)
+        block = self.section_blocks[section_key]
+        self.index.assign_student(student_id, section_key)
+        label = f"{course_code} (Section {self.index.section_number[section_key]})"
+        for slot in self._keys(section_key):
+            self.student_schedule[student_id][slot] = label
+        self.section_assignments[section_key].append(student_id)
+        self.placed[key] = req
+        if changes is not None:
+            changes.append({'action': 'assigned', 'student ID': student_id, 'Course code': course_code,
+                            'section': section_key, 'block': block, 'Type': req.get('Type', '')})
+
+    def _drop(self, key, changes=None):
+        student_id, course_code = key
+        section_key = self.index.student_sections[student_id][course_code]
+        block = self.section_blocks[section_key]
+        self.index.unassign_student(student_id, section_key)
+        for slot in self._keys(section_key):
+            del self.student_schedule[student_id][slot]
+        if not self.student_schedule[student_id]:
+            del self.student_schedule[student_id]
+        self.section_assignments[section_key].remove(student_id)
+        req = self.placed.pop(key)
+        if changes is not None:
+            changes.append({'action': 'dropped', 'student ID': student_id, 'Course code': course_code,
+                            'section': section_key, 'block': block, 'Type': req.get('Type', '')})
+        return req
+
+    def unseat(self, key, changes=None):
+        """Take a placed request out of its section and put it back on the waitlist"""
+        req = self._drop(key, changes)
+        self._enqueue(req)
+        return req
+
+    def move_section(self, section_key, block, changes=None):
+        """Move a section to another block, waitlisting the students it now clashes with.
+        
+        Returns the keys of the requests that lost their seat.
+        """
+        course_code = self.index.section_course[section_key]
+        terms = self.index.section_terms[section_key]
+        bit = self.index.slot_mask(block, terms)
+        clashing = [(student_id, course_code) for student_id in self.section_assignments[section_key]
+                    if self.index.student_masks[student_id] & bit]
+        for key in clashing:
+            self.unseat(key, changes)
+
+        old_block = self.section_blocks[section_key]
+        label = f"{course_code} (Section {self.index.section_number[section_key]})"
+        lecturer_id = self.index.section_lecturer[section_key]
+        old_slots, new_slots = self._keys(section_key, old_block), self._keys(section_key, block)
+        booked = self.teacher_schedule.setdefault(lecturer_id, {})
+        for slot in old_slots:
+            if booked.get(slot) == label:
+                del booked[slot]
+        for slot in new_slots:
+            booked[slot] = label
+
+        students = self.section_assignments[section_key]
+        self.index.move_section(section_key, block, students)
+        # The lecturer may still teach something else in the old block's slots
+        for slot, term in zip(old_slots, terms if self.term_aware else (None,)):
+            if slot in booked:
+                self.index.lecturer_masks[lecturer_id] |= self.index.slot_mask(
+                    old_block, None if term is None else (term,))
+        for student_id in students:
+            for slot in old_slots:
+                del self.student_schedule[student_id][slot]
+            for slot in new_slots:
+                self.student_schedule[student_id][slot] = label
+        if changes is not None:
+            changes.append({'action': 'moved', 'section': section_key, 'from': old_block, 'block': block})
+        return clashing
+
+    def _offer_course(self, course_code, changes):
+        """Offer a course's open seats to its waitlist, highest priority first"""
+        for _, _, student_id in list(self.waitlist[course_code]):
+            if not self.index.open_sections[course_code]:
+                break
+            key = (student_id, course_code)
+            self._place(self.waitlisted[key][2], changes)
+
+    def rerun_section(self, section_key, block=None, changes=None):
+        """Seat a section again from scratch, optionally in another block first.
+
+        Its students go back on the course waitlist, which is then offered
+        the course's open seats highest priority first, as generate_schedule
+        would. Returns the list of assignment changes.
+        """
+        changes = [] if changes is None else changes
+        if block is not None and block != self.section_blocks[section_key]:
+            self.move_section(section_key, block, changes)
+        start = len(changes)
+        course_code = self.index.section_course[section_key]
+        for student_id in list(self.section_assignments[section_key]):
+            self.unseat((student_id, course_code), changes)
+        self._offer_course(course_code, changes)
+
+        # Students dropped and seated again in the same section did not change
+        dropped = {(c['student ID'], c['section']) for c in changes[start:] if c['action'] == 'dropped'}
+        kept = {(c['student ID'], c['section']) for c in changes[start:] if c['action'] == 'assigned'} & dropped
+        changes[start:] = [c for c in changes[start:]
+                           if c['action'] not in ('dropped', 'assigned') or (c['student ID'], c['section']) not in kept]
+        return changes
+
+    def apply(self, added=(), removed=()):
+        """Apply a delta of added and removed requests.
+
+        Removed requests give up their seat (or leave the waitlist); added
+        requests are seated greedily or waitlisted. Freed seats and blocks
+        are then offered to waitlisted requests of the affected courses and
+        students. Returns the list of assignment changes, in order.
+        """
+        changes = []
+        freed_courses = set()
+        freed_students = set()
+
+        for req in removed:
+            key = request_key(req)
+            if key in self.placed:
+                self._drop(key, changes)
+                freed_courses.add(key[1])
+                freed_students.add(key[0])
+            elif key in self.waitlisted:
+                self._dequeue(key)
+                changes.append({'action': 'withdrawn', 'student ID': key[0], 'Course code': key[1]})
+
+        for req in added:
+            key = request_key(req)
+            if not key[0] or key in self.placed or key in self.waitlisted:
+                continue
+            if not self._place(req, changes):
+                self._enqueue(req)
+                changes.append({'action': 'waitlisted', 'student ID': key[0], 'Course code': key[1],
+                                'Type': req.get('Type', '')})
+
+        # Offer freed seats to each course's waitlist, highest priority first
+        for course_code in freed_courses:
+            self._offer_course(course_code, changes)
+
+        # A dropped course also frees a block in that student's own timetable
+        for student_id in freed_students:
+            waiting = sorted(self.student_waitlist[student_id],
+                             key=lambda course_code: self.waitlisted[(student_id, course_code)][:2])
+            for course_code in waiting:
+                key = (student_id, course_code)
+                self._place(self.waitlisted[key][2], changes)
+
+        return changes
+
+    @property
+    def resolved(self):
+        return list(self.placed.values())
+
+    @property
+    def unresolved(self):
+        waiting = [entry[2] for entry in sorted(self.waitlisted.values(), key=lambda e: e[:2])]
+        return waiting + self.unschedulable
+
+    def schedule(self):
+        """Copy of the current state in the shapes generate_schedule returns"""
+        return {
+            'student_schedule': {student: dict(blocks) for student, blocks in self.student_schedule.items()},
+            'teacher_schedule': {teacher: dict(blocks) for teacher, blocks in self.teacher_schedule.items()},
+            'section_assignments': defaultdict(list, {
+                key: list(students) for key, students in self.section_assignments.items()
+            }),
+            'section_blocks': dict(self.section_blocks),
+            'terms': self.index.terms,
+            'section_terms': dict(self.index.section_terms),
+            'resolved': self.resolved,
+            'unresolved': self.unresolved
+        }
+
+
+def reschedule(previous, rules, preprocessed_data, added=(), removed=()):
+    """One-shot helper: apply a delta to a previous schedule, return (schedule, changes)"""
+    scheduler = IncrementalScheduler(previous, rules, preprocessed_data)
+    changes = scheduler.apply(added, removed)
+    return scheduler.schedule(), changes
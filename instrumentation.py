@@ -0,0 +1,139 @@
+import json
+import os
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import nullcontext
+
+# Environment variables that switch tracing on without touching the code
+TRACE_ENV = 'SCHEDULER_TRACE'                # path of the trace file to write
+TRACE_MEMORY_ENV = 'SCHEDULER_TRACE_MEMORY'  # "1" to record tracemalloc peaks as well
+
+_NULL_STAGE = nullcontext()
+
+
+class _Stage:
+    """One timed stage; nested stages and loop timers become its children"""
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+        self.loop_times = defaultdict(float)
+
+    def __enter__(self):
+        tracer = self.tracer
+        self.parent = tracer._stack[-1] if tracer._stack else None
+        tracer._stack.append(self)
+        self.peak = 0
+        if tracer.trace_memory:
+            # tracemalloc has one global peak: bank the parent's before resetting it
+            if self.parent:
+                self.parent.peak = max(self.parent.peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        self.blocks = sys.getallocatedblocks()
+        self.cpu = time.process_time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        tracer = self.tracer
+        tracer._stack.pop()
+        args = {
+            'cpu_ms': (time.process_time() - self.cpu) * 1000,
+            'allocated_blocks_delta': sys.getallocatedblocks() - self.blocks
+        }
+        if tracer.trace_memory:
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            args['peak_traced_bytes'] = self.peak
+            if self.parent:
+                self.parent.peak = max(self.parent.peak, self.peak)
+        tracer._complete(self.name, self.start, end, args)
+
+        # Loop timers are aggregates, so they are laid out back to back at
+        # the start of the stage: their widths show each loop's share
+        offset = self.start
+        for name, seconds in self.loop_times.items():
+            tracer._complete(f"{self.name}.{name}", offset, offset + seconds, {'aggregated': True}, cat='loop')
+            offset += seconds
+        return False
+
+
+class Tracer:
+    """Per-stage wall/CPU/memory timings and counters, written as a Chrome trace.
+
+    While disabled, stage() hands back a shared no-op context manager and
+    count()/add_time() return immediately, so instrumented code costs next to
+    nothing. Hot loops should additionally check `enabled` before timing.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.trace_memory = False
+        self.path = None
+        self.events = []
+        self.counters = defaultdict(int)
+        self._stack = []
+        self._origin = time.perf_counter()
+
+    def enable(self, path, trace_memory=False):
+        self.enabled = True
+        self.path = path
+        self.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] += n
+
+    def add_time(self, name, seconds):
+        """Accumulate time spent in a hot loop under the innermost open stage"""
+        if self.enabled and self._stack:
+            self._stack[-1].loop_times[name] += seconds
+
+    def _complete(self, name, start, end, args, cat='stage'):
+        self.events.append({
+            'name': name, 'cat': cat, 'ph': 'X', 'pid': os.getpid(), 'tid': 0,
+            'ts': (start - self._origin) * 1e6, 'dur': (end - start) * 1e6, 'args': args
+        })
+
+    def summary(self):
+        """Stage durations in seconds plus all counters"""
+        stages = defaultdict(float)
+        for event in self.events:
+            stages[event['name']] += event['dur'] / 1e6
+        return {'stages': dict(stages), 'counters': dict(self.counters)}
+
+    def write(self, path=None):
+        """Write the Chrome trace (chrome://tracing, Perfetto, speedscope)"""
+        path = path or self.path
+        if not path:
+            return None
+        end = (time.perf_counter() - self._origin) * 1e6
+        events = list(self.events)
+        if self.counters:
+            events.append({'name': 'counters', 'ph': 'C', 'pid': os.getpid(), 'tid': 0, 'ts': end,
+                           'args': dict(self.counters)})
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms', 'otherData': self.summary()}, f, indent=1)
+        return path
+
+
+TRACER = Tracer()
+
+
+def configure_tracing(path=None, trace_memory=None):
+    """Enable TRACER from an explicit path or from SCHEDULER_TRACE; return whether it is on"""
+    path = path or os.environ.get(TRACE_ENV)
+    if trace_memory is None:
+        trace_memory = os.environ.get(TRACE_MEMORY_ENV) == '1'
+    if path:
+        TRACER.enable(path, trace_memory)
+    return TRACER.enabled
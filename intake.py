@@ -0,0 +1,331 @@
+import asyncio
+import threading
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+
+from incremental import normalize_id, request_key
+from instrumentation import TRACER
+
+
+def stored_request(scheduler, key):
+    """The scheduler's own copy of a placed or waitlisted request, or None"""
+    if key in scheduler.placed:
+        return scheduler.placed[key]
+    if key in scheduler.waitlisted:
+        return scheduler.waitlisted[key][2]
+    return None
+
+
+def validate_change(req, action, constraints, scheduler):
+    """Problems with one submitted request change, in validate_data's terms; empty if it can be applied"""
+    if not isinstance(req, Mapping):
+        return [f"{action} entries must be request objects, got {req!r}"]
+    student_id, course_code = key = request_key(req)
+    problems = []
+    if not student_id:
+        problems.append(f"{action} request for {course_code or '?'} has no student ID")
+    if not course_code:
+        problems.append(f"{action} request for student {student_id or '?'} has no Course code")
+    elif action == 'added' and course_code not in scheduler.course_details:
+        problems.append(f"Unknown course: {course_code} has no course characteristics, so it can never be seated")
+
+    if action == 'added':
+        if req.get('Type', '') not in constraints.priority_rank:
+            problems.append(f"Request type '{req.get('Type', '')}' for {course_code or '?'} is not one of "
+                            f"{', '.join(constraints.priority_rank)}")
+    else:
+        # The year the request was scheduled under, not whatever the client sent
+        year = (stored_request(scheduler, key) or req).get('College Year')
+        if (year, course_code) in constraints.required:
+            problems.append(f"Missing required course: dropping {course_code} leaves student {student_id} "
+                            f"without the {year} required course")
+    return problems
+
+
+def normalize_request(req):
+    """The request with its student ID as the data holds it (a JSON body may send "1234" for 1234)"""
+    student_id = req.get('student ID', '')
+    if normalize_id(student_id) is student_id:
+        return req
+    return dict(req, **{'student ID': normalize_id(student_id)})
+
+
+def coalesce(submissions):
+    """One (added, removed) delta for a batch, the last change to each (student, course) winning.
+
+    A course added and dropped in the same batch is only dropped, one
+    dropped and added again is only added (a no-op if it was never dropped).
+    """
+    latest = {}
+    for added, removed in submissions:
+        for req in removed:
+            latest[request_key(req)] = ('removed', req)
+        for req in added:
+            latest[request_key(req)] = ('added', req)
+    added = [req for action, req in latest.values() if action == 'added']
+    removed = [req for action, req in latest.values() if action == 'removed']
+    return added, removed
+
+
+def student_view(scheduler, student_id):
+    if student_id not in scheduler.student_schedule and not scheduler.student_waitlist.get(student_id):
+        return None
+    return {
+        'student ID': student_id,
+        'schedule': dict(scheduler.student_schedule.get(student_id, {})),
+        'sections': dict(scheduler.index.student_sections.get(student_id, {})),
+        'waitlisted': sorted(scheduler.student_waitlist.get(student_id, ()), key=str)
+    }
+
+
+def teacher_view(scheduler, lecturer_id):
+    if lecturer_id not in scheduler.teacher_schedule:
+        return None
+    return {'lecturer ID': lecturer_id, 'schedule': dict(scheduler.teacher_schedule[lecturer_id])}
+
+
+def section_view(scheduler, section_key):
+    index = scheduler.index
+    if section_key not in index.section_blocks:
+        return None
+    return {
+        'section': section_key,
+        'Course code': index.section_course[section_key],
+        'block': index.section_blocks[section_key],
+        'lecturer ID': index.section_lecturer[section_key],
+        'capacity': index.section_capacity[section_key],
+        'free_seats': index.section_free[section_key],
+        'students': list(scheduler.section_assignments.get(section_key, []))
+    }
+
+
+class Snapshot:
+    """Read-only views of the schedule as of one committed batch.
+
+    Readers take the current snapshot and never wait on the writer: a
+    commit builds the next snapshot beside it, sharing every view the
+    batch did not touch, and swaps it in with one assignment.
+    """
+
+    def __init__(self, version, students, teachers, sections, resolved, unresolved):
+        self.version = version
+        self.students = students  # {student_id: view}
+        self.teachers = teachers  # {lecturer_id: view}
+        self.sections = sections  # {section_key: view}
+        self.resolved = resolved
+        self.unresolved = unresolved
+
+    @classmethod
+    def build(cls, scheduler, version=0):
+        students = {}
+        for student_id in set(scheduler.student_schedule) | set(scheduler.student_waitlist):
+            view = student_view(scheduler, student_id)
+            if view is not None:
+                students[student_id] = view
+        teachers = {lecturer_id: teacher_view(scheduler, lecturer_id) for lecturer_id in scheduler.teacher_schedule}
+        sections = {section_key: section_view(scheduler, section_key) for section_key in scheduler.section_blocks}
+        return cls(version, students, teachers, sections, *cls._counts(scheduler))
+
+    @staticmethod
+    def _counts(scheduler):
+        return len(scheduler.placed), len(scheduler.waitlisted) + len(scheduler.unschedulable)
+
+    def updated(self, scheduler, changes):
+        """The next snapshot, rebuilding only the views the changes touch"""
+        student_ids, section_keys = set(), set()
+        for change in changes:
+            if 'student ID' in change:
+                student_ids.add(change['student ID'])
+            if 'section' in change:
+                section_keys.add(change['section'])
+                if change['action'] == 'moved':
+                    # Everyone in a moved section now meets in another block
+                    student_ids.update(scheduler.section_assignments.get(change['section'], []))
+        lecturer_ids = {scheduler.index.section_lecturer[key] for key in section_keys
+                        if key in scheduler.index.section_lecturer}
+
+        students, teachers, sections = dict(self.students), dict(self.teachers), dict(self.sections)
+        for views, keys, view_of in ((students, student_ids, student_view), (teachers, lecturer_ids, teacher_view),
+                                     (sections, section_keys, section_view)):
+            for key in keys:
+                view = view_of(scheduler, key)
+                if view is None:
+                    views.pop(key, None)
+                else:
+                    views[key] = view
+        return Snapshot(self.version + 1, students, teachers, sections, *self._counts(scheduler))
+
+
+class RequestIntake:
+    """Concurrent intake of request changes, committed to the scheduler in micro-batches.
+
+    submit() validates a change as soon as it arrives and queues it. One
+    commit task takes whatever is queued (waiting up to max_wait for a
+    burst to gather, at most max_batch submissions), coalesces it into a
+    single delta and applies it on the writer thread, which is the only
+    thread that touches the scheduler. The batch's changes are then
+    published as a new Snapshot. Every submitter in the batch gets the
+    batch's changes back.
+    """
+
+    def __init__(self, scheduler, constraints, max_batch=256, max_wait=0.005):
+        self.scheduler = scheduler
+        self.constraints = constraints
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.snapshot = Snapshot.build(scheduler)
+        self.writer = ThreadPoolExecutor(1, thread_name_prefix='schedule-writer')
+        self.queue = None
+        self.loop = None
+        self._committer = None
+
+    def validate(self, added, removed):
+        if not isinstance(added, (list, tuple)) or not isinstance(removed, (list, tuple)):
+            raise ValueError("'added' and 'removed' must be lists of requests")
+        problems = []
+        for action, requests in (('added', added), ('removed', removed)):
+            for req in requests:
+                problems.extend(validate_change(req, action, self.constraints, self.scheduler))
+        if problems:
+            raise ValueError('; '.join(problems))
+
+    async def submit(self, added=(), removed=()):
+        """Queue a change; returns {'batch': snapshot version, 'changes': [...]} once committed.
+
+        A submission cancelled before its batch is committed is left out
+        of the batch.
+        """
+        self.validate(added, removed)
+        added, removed = [normalize_request(req) for req in added], [normalize_request(req) for req in removed]
+        self._ensure_committer()
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put(('changes', (added, removed), future))
+        return await future
+
+    async def call(self, func, *args):
+        """Run func(scheduler, *args) on the writer between batches.
+
+        func returns (result, changes); the changes are published like a
+        batch's and the result is returned.
+        """
+        self._ensure_committer()
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put(('call', (func, args), future))
+        return await future
+
+    def _rebuild(self):
+        # A failed write may have left part of its changes in the scheduler:
+        # publish what the scheduler now holds rather than the old snapshot
+        self.snapshot = Snapshot.build(self.scheduler, self.snapshot.version + 1)
+
+    def _apply(self, submissions):
+        added, removed = coalesce(submissions)
+        with TRACER.stage('intake_commit'):
+            try:
+                changes = self.scheduler.apply(added, removed)
+            except Exception:
+                self._rebuild()
+                raise
+            TRACER.count('intake_batches')
+            TRACER.count('intake_submissions', len(submissions))
+            return changes, self.snapshot.updated(self.scheduler, changes)
+
+    def _call(self, func, args):
+        try:
+            result, changes = func(self.scheduler, *args)
+        except Exception:
+            self._rebuild()
+            raise
+        return result, self.snapshot.updated(self.scheduler, changes)
+
+    @staticmethod
+    def _settle(future, result=None, error=None):
+        # The submitter may have given up (cancelled) while its batch ran
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    async def _commit(self, batch):
+        loop = asyncio.get_running_loop()
+        # Runs of change submissions commit together; calls run alone, in order
+        i = 0
+        while i < len(batch):
+            if batch[i][0] == 'call':
+                (func, args), future = batch[i][1], batch[i][2]
+                if not future.done():
+                    try:
+                        result, self.snapshot = await loop.run_in_executor(self.writer, self._call, func, args)
+                        self._settle(future, result)
+                    except Exception as e:
+                        self._settle(future, error=e)
+                i += 1
+                continue
+            j = i
+            while j < len(batch) and batch[j][0] == 'changes':
+                j += 1
+            run = [entry for entry in batch[i:j] if not entry[2].done()]
+            i = j
+            if not run:
+                continue
+            try:
+                changes, self.snapshot = await loop.run_in_executor(
+                    self.writer, self._apply, [payload for _, payload, _ in run]
+                )
+                outcome = {'batch': self.snapshot.version, 'submissions': len(run), 'changes': changes}
+                for _, _, future in run:
+                    self._settle(future, outcome)
+            except Exception as e:
+                for _, _, future in run:
+                    self._settle(future, error=e)
+
+    async def _commit_loop(self):
+        while True:
+            batch = [await self.queue.get()]
+            await asyncio.sleep(self.max_wait)
+            while len(batch) < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            try:
+                await self._commit(batch)
+            except Exception as e:
+                # Never let one batch stop the intake; its submitters get the error
+                print(f"Request intake: batch failed: {e!r}")
+                for _, _, future in batch:
+                    self._settle(future, error=e)
+
+    def _committer_done(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Request intake: commit task stopped: {task.exception()!r}; restarting it")
+            self._ensure_committer()
+
+    def _ensure_committer(self):
+        """Restart the commit task if it has stopped, so queued changes are never stranded"""
+        if self._committer is None or self._committer.done():
+            self._committer = asyncio.get_running_loop().create_task(self._commit_loop())
+            self._committer.add_done_callback(self._committer_done)
+
+    async def start(self):
+        """Start the commit task on the running loop"""
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        self._ensure_committer()
+
+    def start_thread(self):
+        """Run the intake on its own event loop in a daemon thread, for use from threaded code"""
+        ready = threading.Event()
+
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(self.start())
+            ready.set()
+            loop.run_forever()
+
+        threading.Thread(target=run, name='request-intake', daemon=True).start()
+        ready.wait()
+
+    def run_threadsafe(self, coro, timeout=None):
+        """Wait for an intake coroutine from another thread"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
@@ -0,0 +1,162 @@
+import hashlib
+import inspect
+import json
+import marshal
+import os
+import pickle
+import sys
+
+from columnar_cache import NAN, fingerprint_source
+from instrumentation import TRACER
+
+# Bump whenever the entry format changes so old entries stop matching
+MEMO_VERSION = 1
+
+# Total size the cache may grow to before the least recently used entries go
+DEFAULT_MAX_BYTES = 256 * 2**20
+
+
+def memo_path_for(json_path):
+    """Return the memo directory that sits next to a cleaned data JSON file"""
+    return os.path.splitext(json_path)[0] + '.memo'
+
+
+def _source_files(func):
+    """Source files of func's module and of the modules in this directory it (transitively) imports from"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    files, pending, seen = set(), [func.__module__], set()
+    while pending:
+        name = pending.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        module = sys.modules.get(name)
+        path = getattr(module, '__file__', None)
+        if not path or os.path.dirname(os.path.abspath(path)) != here:
+            continue
+        files.add(os.path.abspath(path))
+        for value in vars(module).values():
+            pending.append(value.__name__ if inspect.ismodule(value) else getattr(value, '__module__', None))
+    return sorted(files)
+
+
+def _code_fingerprint(func):
+    """Hash of a function's bytecode and of the source it depends on.
+
+    Stages call into other modules (compile_constraints, as_request_table,
+    ...), so editing any module the function's own module imports from
+    invalidates its entries too, not just editing the function.
+    """
+    digest = hashlib.sha256(marshal.dumps(func.__code__))
+    for path in _source_files(func):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+class _Pickler(pickle.Pickler):
+    # pickle copies floats by value, so every NaN would come back as its own
+    # object; missing course codes are grouped by identity, so they are
+    # written as a reference to the one shared NaN instead
+    def persistent_id(self, obj):
+        if type(obj) is float and obj != obj:
+            return 'nan'
+        return None
+
+
+class _Unpickler(pickle.Unpickler):
+    def persistent_load(self, pid):
+        if pid == 'nan':
+            return NAN
+        raise pickle.UnpicklingError(f"unknown persistent id {pid!r}")
+
+
+class MemoCache:
+    """Content-addressed on-disk cache of pipeline stage results.
+
+    An entry's key hashes the stage function (name, bytecode and the
+    source of the modules it depends on), the
+    fingerprint of its input file and its config, so a changed input,
+    config or function is simply a miss; stale entries are never read,
+    only aged out. Entries are pickles named by their key. Every hit
+    touches the file, and writes evict the least recently used entries
+    until the directory fits in max_bytes.
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+
+    def key(self, func, fingerprint, config=None):
+        digest = hashlib.sha256()
+        digest.update(f"{MEMO_VERSION}:{func.__module__}.{func.__qualname__}:{_code_fingerprint(func)}".encode())
+        digest.update(fingerprint.encode())
+        digest.update(json.dumps(config, sort_keys=True, default=str).encode())
+        return digest.hexdigest()
+
+    def _entry(self, key):
+        return os.path.join(self.path, key + '.pkl')
+
+    def get(self, key):
+        """Return (True, value) for a stored key, else (False, None)"""
+        entry = self._entry(key)
+        try:
+            with open(entry, 'rb') as f:
+                value = _Unpickler(f).load()
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            # A class an old entry refers to may have been renamed or moved
+            return False, None
+        os.utime(entry)
+        return True, value
+
+    def put(self, key, value):
+        os.makedirs(self.path, exist_ok=True)
+        entry = self._entry(key)
+        tmp_entry = f"{entry}.{os.getpid()}.tmp"
+        with open(tmp_entry, 'wb') as f:
+            _Pickler(f, protocol=pickle.HIGHEST_PROTOCOL).dump(value)
+        # Readers (and parallel scenario workers) never see half an entry
+        os.replace(tmp_entry, entry)
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        for name in os.listdir(self.path):
+            if name.endswith('.pkl'):
+                stat = os.stat(os.path.join(self.path, name))
+                entries.append((stat.st_mtime_ns, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.path, name))
+            total -= size
+            TRACER.count('memo_evictions')
+
+    def memoize(self, func, fingerprint, config, *args):
+        """func(*args), read from the cache when the same inputs were seen before"""
+        key = self.key(func, fingerprint, config)
+        hit, value = self.get(key)
+        name = func.__name__
+        if hit:
+            TRACER.count(f"memo_hits.{name}")
+            return value
+        TRACER.count(f"memo_misses.{name}")
+        value = func(*args)
+        self.put(key, value)
+        return value
+
+
+def open_memo(json_path, use_memo=True):
+    """(MemoCache, fingerprint of json_path) for memoized(), or (None, None) with memoization off"""
+    if not use_memo or not os.path.exists(json_path):
+        return None, None
+    return MemoCache(memo_path_for(json_path)), fingerprint_source(json_path)
+
+
+def memoized(cache, fingerprint, config, func, *args):
+    """func(*args) through the cache, or called directly when there is no cache"""
+    if cache is None:
+        return func(*args)
+    return cache.memoize(func, fingerprint, config, *args)
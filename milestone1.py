@@ -3,88 +3,191 @@ import json
 from collections import defaultdict
 import os
 import re
+from columnar_cache import cache_path_for, write_columnar_cache
+from instrumentation import TRACER, configure_tracing
+from rule_compiler import DEFAULT_PRIORITY_ORDER, DEFAULT_REQUIRED_COURSES, parse_rules, required_courses_from_requests
+
+# Sheets that feed the cleaned data, mapped to their data structure keys
+SHEET_MAPPINGS = {
+    'Lecturer Details': 'course_listings',
+    'Course list': 'course_characteristics',
+    'Student requests': 'student_requests',
+    'Rooms data': 'rooms'
+}
+
+# File types accepted when the sheets are exported one file per sheet
+EXPORT_EXTENSIONS = ('.csv', '.parquet')
+
+# List the sheets of a workbook, or of a directory of per-sheet exports
+def list_sheets(file_path):
+    if os.path.isdir(file_path):
+        sheet_names = []
+        for entry in sorted(os.listdir(file_path)):
+            name, ext = os.path.splitext(entry)
+            if ext.lower() in EXPORT_EXTENSIONS and name not in sheet_names:
+                sheet_names.append(name)
+        return sheet_names
+    
+    from openpyxl import load_workbook
+    workbook = load_workbook(file_path, read_only=True)
+    try:
+        return workbook.sheetnames
+    finally:
+        workbook.close()
+
+# Convert an openpyxl cell value the way pandas.read_excel does
+def _convert_cell(value):
+    if value is None:
+        return float('nan')
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+# Read a sheet as DataFrame chunks of at most chunk_size rows
+def iter_sheet_chunks(file_path, sheet_name, chunk_size=10000):
+    """Yield a sheet in bounded-size chunks without loading it whole"""
+    if os.path.isdir(file_path):
+        csv_path = os.path.join(file_path, f"{sheet_name}.csv")
+        parquet_path = os.path.join(file_path, f"{sheet_name}.parquet")
+        if os.path.exists(csv_path):
+            yield from pd.read_csv(csv_path, chunksize=chunk_size)
+        elif os.path.exists(parquet_path):
+            try:
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise ImportError("Reading Parquet exports requires pyarrow (pip install pyarrow)")
+            for batch in pq.ParquetFile(parquet_path).iter_batches(batch_size=chunk_size):
+                yield batch.to_pandas()
+        return
+    
+    from openpyxl import load_workbook
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook[sheet_name].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = list(header)
+        while header and header[-1] is None:
+            header.pop()
+        columns = [name if name is not None else f"Unnamed: {i}" for i, name in enumerate(header)]
+        
+        chunk = []
+        blank_rows = 0
+        for row in rows:
+            # Blank rows only count if data follows them (trailing ones are dropped)
+            if all(value is None for value in row):
+                blank_rows += 1
+                continue
+            chunk.extend([[float('nan')] * len(columns)] * blank_rows)
+            blank_rows = 0
+            row = list(row[:len(columns)]) + [None] * (len(columns) - len(row))
+            chunk.append([_convert_cell(value) for value in row])
+            if len(chunk) >= chunk_size:
+                yield pd.DataFrame(chunk, columns=columns)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=columns)
+    finally:
+        workbook.close()
+
+# Split the comma-separated block columns of the Course list into lists
+def parse_block_columns(sheet_data):
+    for column in ('Available blocks', 'Unavailable blocks'):
+        if column in sheet_data.columns:
+            present = sheet_data[column].notna()
+            split = sheet_data[column].where(present, '').astype(str).str.split(', ')
+            sheet_data[column] = [blocks if ok else [] for blocks, ok in zip(split, present)]
+    return sheet_data
 
 # Step 1: Load and Clean the Data
-def load_and_clean_data(file_path='dataset.xlsx'):
+def load_and_clean_data(file_path='dataset.xlsx', stream=False, chunk_size=10000, examine_sheets=False):
+    """Load the workbook (or a directory of CSV/Parquet sheet exports) into cleaned data.
+    
+    With stream=True sheets are read chunk_size rows at a time instead of as
+    whole DataFrames. This bounds the pandas copies only: every chunk's
+    rows are still kept as records until cleaned_data.json and its
+    columnar cache are written (and validate_data reads them whole), so
+    peak memory still grows with the number of rows.
+    examine_sheets=True prints the unmapped sheets as well.
+    """
     # Check if file exists
     if not os.path.exists(file_path):
         print(f"Error: File '{file_path}' not found.")
         return None
     
     # Check file size
-    file_size = os.path.getsize(file_path)
+    if os.path.isdir(file_path):
+        file_size = sum(os.path.getsize(os.path.join(file_path, entry)) for entry in os.listdir(file_path))
+    else:
+        file_size = os.path.getsize(file_path)
     print(f"File size: {file_size} bytes")
     if file_size == 0:
         print("Warning: The Excel file appears to be empty (0 bytes).")
     
     # Load Excel file
     try:
-        xls = pd.ExcelFile(file_path)
-        print(f"Found sheets: {xls.sheet_names}")
-        structured_data = {}
+        # Exports are always streamed; workbooks only when asked to
+        if stream or os.path.isdir(file_path):
+            sheet_names = list_sheets(file_path)
+            
+            def read_sheet(sheet_name):
+                return iter_sheet_chunks(file_path, sheet_name, chunk_size)
+        else:
+            xls = pd.ExcelFile(file_path)
+            sheet_names = xls.sheet_names
+            
+            def read_sheet(sheet_name):
+                return [pd.read_excel(xls, sheet_name)]
         
-        # Update sheet mappings to match the actual sheet names in the file
-        # Map actual sheet names to data structure keys
-        sheet_mappings = {
-            'Lecturer Details': 'course_listings',
-            'Course list': 'course_characteristics',
-            'Student requests': 'student_requests'
-        }
+        print(f"Found sheets: {sheet_names}")
+        structured_data = {}
         
         # Process each sheet based on the actual sheet names
-        for sheet_name, key in sheet_mappings.items():
-            if sheet_name in xls.sheet_names:
+        for sheet_name, key in SHEET_MAPPINGS.items():
+            if sheet_name in sheet_names:
                 print(f"Processing sheet: {sheet_name}")
-                sheet_data = pd.read_excel(xls, sheet_name)
-                
-                if not sheet_data.empty:
-                    print(f"{sheet_name} sheet has {len(sheet_data)} rows and {len(sheet_data.columns)} columns")
-                    print(f"Using original column names: {sheet_data.columns.tolist()}")
+                structured_data[key] = []
+                columns = []
+                for sheet_data in read_sheet(sheet_name):
+                    columns = sheet_data.columns.tolist()
                     
                     # Process sheet-specific data
                     if key == 'course_characteristics':
-                        structured_data[key] = []
-                        # Process course characteristics with original column names
-                        for _, row in sheet_data.iterrows():
-                            row_dict = row.to_dict()
-                            # Use original column names
-                            if 'Available blocks' in row_dict:
-                                row_dict['Available blocks'] = row_dict['Available blocks'].split(', ') if pd.notna(row_dict['Available blocks']) else []
-                            if 'Unavailable blocks' in row_dict:
-                                row_dict['Unavailable blocks'] = row_dict['Unavailable blocks'].split(', ') if pd.notna(row_dict['Unavailable blocks']) else []
-                            structured_data[key].append(row_dict)
-                    else:
-                        structured_data[key] = sheet_data.to_dict(orient='records')
+                        parse_block_columns(sheet_data)
+                    structured_data[key].extend(sheet_data.to_dict(orient='records'))
+                
+                if structured_data[key]:
+                    print(f"{sheet_name} sheet has {len(structured_data[key])} rows and {len(columns)} columns")
+                    print(f"Using original column names: {columns}")
                 else:
                     print(f"{sheet_name} sheet is empty")
-                    structured_data[key] = []
             else:
                 print(f"Sheet '{sheet_name}' not found")
                 # Initialize empty lists for missing mappings
                 structured_data[key] = []
         
         # Extract rules from the RULES sheet
-        if 'RULES' in xls.sheet_names:
-            rules_data = pd.read_excel(xls, 'RULES')
-            if not rules_data.empty:
-                structured_data['rules'] = []
-                for _, row in rules_data.iterrows():
-                    rule_dict = row.to_dict()
-                    structured_data['rules'].append(rule_dict)
+        if 'RULES' in sheet_names:
+            rules = []
+            for rules_data in read_sheet('RULES'):
+                rules.extend(rules_data.to_dict(orient='records'))
+            if rules:
+                structured_data['rules'] = rules
                 print(f"Extracted {len(structured_data['rules'])} rules from RULES sheet")
         
         # Also look at other sheets to understand their structure
-        for sheet_name in xls.sheet_names:
-            if sheet_name not in sheet_mappings:
-                try:
-                    print(f"Examining additional sheet: {sheet_name}")
-                    sheet_data = pd.read_excel(xls, sheet_name)
-                    if not sheet_data.empty:
-                        print(f"Sheet has {len(sheet_data)} rows and {len(sheet_data.columns)} columns")
-                        print(f"Column names: {sheet_data.columns.tolist()}")
-                        print(f"First few rows: \n{sheet_data.head(2)}")
-                except Exception as e:
-                    print(f"Error examining sheet '{sheet_name}': {e}")
+        if examine_sheets:
+            for sheet_name in sheet_names:
+                if sheet_name not in SHEET_MAPPINGS:
+                    try:
+                        print(f"Examining additional sheet: {sheet_name}")
+                        sheet_data = next(iter(read_sheet(sheet_name)), None)
+                        if sheet_data is not None and not sheet_data.empty:
+                            print(f"Column names: {sheet_data.columns.tolist()}")
+                            print(f"First few rows: \n{sheet_data.head(2)}")
+                    except Exception as e:
+                        print(f"Error examining sheet '{sheet_name}': {e}")
         
         # Ensure all required keys exist
         for key in ['course_listings', 'course_characteristics', 'student_requests']:
@@ -95,6 +198,11 @@ def load_and_clean_data(file_path='dataset.xlsx'):
         with open('cleaned_data.json', 'w') as f:
             json.dump(structured_data, f, indent=4)
         print("Data cleaned and saved to 'cleaned_data.json'")
+        
+        # Save the columnar cache that milestone2 memory-maps instead of parsing the JSON
+        cache_path = write_columnar_cache(structured_data, cache_path_for('cleaned_data.json'),
+                                          file_path, 'cleaned_data.json')
+        print(f"Columnar cache saved to '{cache_path}'")
         return structured_data
     
     except Exception as e:
@@ -130,56 +238,56 @@ def validate_data(data, file_path='dataset.xlsx'):
         blocks = extract_blocks_from_rules(data['rules'])
         insights.append(f"Identified {len(blocks)} unique blocks from rules: {', '.join(blocks)}")
 
+    # One columnar view of the requests; every check below is a groupby over it
+    requests = pd.DataFrame(data['student_requests'], columns=['College Year', 'student ID', 'Course code', 'Type'])
+    constraints, _ = parse_rules(data.get('rules', []))
+    priority_order = next((constraint.params['types'] for constraint in constraints
+                           if constraint.kind == 'priority_order'), DEFAULT_PRIORITY_ORDER)
+    required_courses = required_courses_from_requests(data['student_requests'], priority_order[0]) \
+        or DEFAULT_REQUIRED_COURSES
+    is_required = (requests['Type'] == priority_order[0]).to_numpy()
+
     # Check request distribution (insight)
-    request_types = defaultdict(int)
-    for req in data['student_requests']:
-        request_types[req['Type']] += 1
-    total_requests = sum(request_types.values())
+    request_types = requests['Type'].value_counts(dropna=False)
+    total_requests = len(requests)
     insights.append(f"Total requests: {total_requests} (Required: {request_types.get('Required', 0)}, "
                     f"Requested: {request_types.get('Requested', 0)}, Recommended: {request_types.get('Recommended', 0)})")
 
     # Student demographics
-    students_by_year = defaultdict(set)
-    for req in data['student_requests']:
-        students_by_year[req['College Year']].add(req['student ID'])
+    students_by_year = requests.groupby('College Year', sort=False, dropna=False)['student ID'].nunique(dropna=False)
+    total_students = int(students_by_year.sum())
     
-    insights.append(f"Total unique students: {sum(len(students) for students in students_by_year.values())}")
+    insights.append(f"Total unique students: {total_students}")
     for year, students in students_by_year.items():
-        insights.append(f"{year}: {len(students)} students")
+        insights.append(f"{year}: {students} students")
 
-    # Check required courses by year
-    required_courses = {
-        '1st Year': 'BIB9', '2nd Year': 'BIB10', '3rd Year': 'BIB11', '4th Year': 'BIB12'
-    }
-    for year, course_code in required_courses.items():
-        required_count = sum(1 for req in data['student_requests'] 
-                            if req['College Year'] == year and req['Course code'] == course_code and req['Type'] == 'Required')
-        total_students = len(students_by_year[year])
-        if required_count < total_students:
-            validation_report.append(
-                f"Missing required course: Only {required_count}/{total_students} {year} students requested {course_code}"
-            )
-        insights.append(f"{year} - {course_code}: {required_count}/{total_students} requested")
+    # Check required courses by year, found the same way the scheduler finds them
+    required_counts = requests[is_required].groupby(['College Year', 'Course code']).size()
+    for year, course_codes in required_courses.items():
+        year_students = int(students_by_year.get(year, 0))
+        for course_code in course_codes:
+            required_count = int(required_counts.get((year, course_code), 0))
+            if required_count < year_students:
+                validation_report.append(
+                    f"Missing required course: Only {required_count}/{year_students} {year} students requested {course_code}"
+                )
+            insights.append(f"{year} - {course_code}: {required_count}/{year_students} requested")
 
     # Check courses with no requests
-    requested_courses = set(req['Course code'] for req in data['student_requests'])
+    demand_by_course = requests['Course code'].value_counts()
     all_courses = set(course['Course code'] for course in data['course_characteristics'])
-    no_request_courses = all_courses - requested_courses
+    no_request_courses = all_courses - set(demand_by_course.index)
     if no_request_courses:
         validation_report.append(f"Courses with no requests: {', '.join(sorted(no_request_courses))}")
         insights.append(f"{len(no_request_courses)} courses have no student requests")
 
     # Check demand vs. capacity
-    demand_by_course = defaultdict(int)
-    for req in data['student_requests']:
-        demand_by_course[req['Course code']] += 1
-    
     oversubscribed_courses = []
     undersubscribed_courses = []
     
     for course in data['course_characteristics']:
         course_code = course['Course code']
-        demand = demand_by_course.get(course_code, 0)
+        demand = int(demand_by_course.get(course_code, 0))
         capacity = course['Number of sections'] * course['Maximum section size']
         
         if demand > capacity:
@@ -197,28 +305,28 @@ def validate_data(data, file_path='dataset.xlsx'):
         insights.append(f"{len(undersubscribed_courses)} courses are under-subscribed (less than 50% capacity)")
 
     # Check lecturer assignments
-    lecturers = set(course['Lecturer ID'] for course in data['course_listings'])
-    insights.append(f"Total unique lecturers: {len(lecturers)}")
+    courses_per_lecturer = pd.DataFrame(data['course_listings'], columns=['Lecturer ID']) \
+        .groupby('Lecturer ID', dropna=False).size()
+    insights.append(f"Total unique lecturers: {len(courses_per_lecturer)}")
     
     # Courses per lecturer
-    courses_per_lecturer = defaultdict(list)
-    for course in data['course_listings']:
-        courses_per_lecturer[course['Lecturer ID']].append(course['lecture Code'])
-    
-    max_courses = max(len(courses) for courses in courses_per_lecturer.values())
-    min_courses = min(len(courses) for courses in courses_per_lecturer.values()) if courses_per_lecturer else 0
+    max_courses = courses_per_lecturer.max()
+    min_courses = courses_per_lecturer.min() if len(courses_per_lecturer) else 0
     insights.append(f"Lecturers teach between {min_courses} and {max_courses} courses")
     
-    # Check if rooms data exists and analyze it
-    try:
-        if os.path.exists(file_path):
-            xls = pd.ExcelFile(file_path)
-            if 'Rooms data' in xls.sheet_names:
-                rooms_data = pd.read_excel(file_path, 'Rooms data')
-                unique_rooms = rooms_data['Room Number'].nunique()
-                insights.append(f"Total unique rooms: {unique_rooms}")
-    except Exception as e:
-        print(f"Warning: Could not analyze Rooms data: {e}")
+    # Analyze rooms data, loaded with the other sheets; older cleaned data
+    # without it falls back to reading the workbook
+    rooms_data = None
+    if 'rooms' in data:
+        rooms_data = pd.DataFrame(data['rooms'])
+    else:
+        try:
+            if os.path.exists(file_path) and 'Rooms data' in list_sheets(file_path):
+                rooms_data = pd.concat(iter_sheet_chunks(file_path, 'Rooms data'), ignore_index=True)
+        except Exception as e:
+            print(f"Warning: Could not analyze Rooms data: {e}")
+    if rooms_data is not None and 'Room Number' in rooms_data:
+        insights.append(f"Total unique rooms: {rooms_data['Room Number'].nunique()}")
 
     # Write validation report
     with open('validation_report.md', 'w') as f:
@@ -228,7 +336,7 @@ def validate_data(data, file_path='dataset.xlsx'):
         f.write(f"- Total courses: {len(data['course_characteristics'])}\n")
         f.write(f"- Total course sections: {len(data['course_listings'])}\n")
         f.write(f"- Total student requests: {total_requests}\n")
-        f.write(f"- Total unique students: {sum(len(students) for students in students_by_year.values())}\n\n")
+        f.write(f"- Total unique students: {total_students}\n\n")
         
         f.write("## Issues\n")
         f.write("\n".join(f"- {line}" for line in validation_report) if validation_report else "- No major issues found.\n")
@@ -437,12 +545,20 @@ def load_and_clean_data(file_path='dataset.xlsx'):
 
 # Main Execution
 if __name__ == "__main__":
+    # SCHEDULER_TRACE=<path> writes a per-stage Chrome trace
+    configure_tracing()
+    
     # Load and clean the data
     file_path = 'dataset.xlsx'
-    cleaned_data = load_and_clean_data(file_path)
+    with TRACER.stage('load_and_clean_data'):
+        cleaned_data = load_and_clean_data(file_path)
     
     # Validate the data if data was loaded successfully
     if cleaned_data:
-        validate_data(cleaned_data, file_path)
+        with TRACER.stage('validate_data'):
+            validate_data(cleaned_data, file_path)
     else:
-        print("Data loading failed. Validation skipped.")
\ No newline at end of file
+        print("Data loading failed. Validation skipped.")
+    
+    if TRACER.enabled:
+        print(f"Stage trace written to '{TRACER.write()}'")
@@ -1,21 +1,50 @@
 import json
-import pandas as pd
 from collections import defaultdict
+from collections.abc import Mapping
 import random
-import matplotlib.pyplot as plt
 import os
-from tabulate import tabulate
-import numpy as np
+import time
+import tracemalloc
+from schedule_index import ScheduleIndex
+from cli_args import OUTPUT_ARTIFACTS, RUN_FILE, add_schedule_arguments
+from columnar_cache import cache_path_for, load_columnar_cache
+from records import as_request_table
+from instrumentation import TRACER, configure_tracing
+from memo import memoized, open_memo
+from rooms import assign_rooms, rooms_by_block
+from rule_compiler import DEFAULT_BLOCKS, DEFAULT_PRIORITY_ORDER, DEFAULT_REQUIRED_COURSES, RequiredCourses, \
+    compile_constraints, parse_rules, required_courses_from_requests
+from terms import NUM_TERMS, all_slots, request_start_term, section_term_spans, section_terms, slot_name
 
 # Step 1: Load Cleaned Data
-def load_cleaned_data(file_path='cleaned_data.json'):
-    with open(file_path, 'r') as f:
-        return json.load(f)
+def load_cleaned_data(file_path='cleaned_data.json', use_cache=True):
+    """Load the cleaned data, preferring the columnar cache written by milestone1.
+    
+    Cached tables are memory-mapped and decoded column by column on first
+    use; a missing or stale cache falls back to parsing the JSON. Student
+    requests come back as a records.RequestTable of interned codes.
+    """
+    data = None
+    if use_cache:
+        data = load_columnar_cache(cache_path_for(file_path), file_path)
+    if data is None:
+        with open(file_path, 'r') as f:
+            data = json.load(f)
+    if 'student_requests' in data:
+        data['student_requests'] = as_request_table(data['student_requests'])
+    return data
 
 # Step 2: Extract Rules and Constraints
 def extract_rules_and_constraints(data):
-    """Extract scheduling rules and constraints from data"""
+    """Extract scheduling rules and constraints from data
+    
+    The RULES sheet is parsed into typed constraints (rule_compiler), kept
+    in rules['constraints'] as plain dicts; preprocess_data compiles them
+    into predicate tables. Rules no constraint type recognises are only
+    descriptive.
+    """
     rules = {}
+    constraints, _ = parse_rules(data.get('rules', []))
     
     # Extract blocks information from rules if available
     if 'rules' in data:
@@ -26,28 +55,35 @@ def extract_rules_and_constraints(data):
                     # Try to extract blocks information
                     rules['blocks_info'] = rule_text
     
-    # Get all available blocks from course characteristics
+    # Blocks listed in the rules, else all available blocks from course characteristics
     all_blocks = set()
-    for course in data['course_characteristics']:
-        if 'Available blocks' in course:
-            all_blocks.update(course['Available blocks'])
+    for constraint in constraints:
+        if constraint.kind == 'blocks':
+            all_blocks.update(constraint.params['blocks'])
+    if not all_blocks:
+        for course in data['course_characteristics']:
+            if 'Available blocks' in course:
+                all_blocks.update(course['Available blocks'])
     
     # Default blocks if not found in data
     if not all_blocks:
-        all_blocks = {"1A", "1B", "2A", "2B", "3", "4A", "4B", "5A", "5B"}
+        all_blocks = set(DEFAULT_BLOCKS)
     
     rules['all_blocks'] = sorted(list(all_blocks))
     
-    # Extract other constraints
-    rules['required_courses'] = {
-        '1st Year': ['BIB9'], 
-        '2nd Year': ['BIB10'], 
-        '3rd Year': ['BIB11'], 
-        '4th Year': ['BIB12']
-    }
-    
     # Priority order for request types
-    rules['priority_order'] = ['Required', 'Requested', 'Recommended']
+    rules['priority_order'] = DEFAULT_PRIORITY_ORDER
+    for constraint in constraints:
+        if constraint.kind == 'priority_order':
+            rules['priority_order'] = constraint.params['types']
+    
+    # Required courses per year: those with requests of the highest priority type
+    rules['required_courses'] = required_courses_from_requests(
+        data.get('student_requests', []), rules['priority_order'][0]
+    ) or DEFAULT_REQUIRED_COURSES
+    constraints.append(RequiredCourses(by_year=rules['required_courses']))
+    
+    rules['constraints'] = [constraint.to_dict() for constraint in constraints]
     
     return rules
 
@@ -82,135 +118,264 @@ def preprocess_data(data, rules):
                 'num_sections': course.get('Number of sections', 1)
             }
     
-    # Group student requests by course code
+    # Group student requests by course code; the requests are Request views
+    # into one RequestTable rather than a dict per row
     course_requests = defaultdict(list)
-    for req in data['student_requests']:
+    for req in as_request_table(data['student_requests']):
         course_code = req.get('Course code', '')
         if course_code:
             course_requests[course_code].append(req)
     
-    # Sort requests by priority
+    # Compile the rules into predicate tables for generate_schedule
+    constraints = compile_constraints(rules, course_details)
+    
+    # Sort requests by priority: Required > Requested > Recommended
     for course_code, requests in course_requests.items():
-        # Sort by priority: Required > Requested > Recommended
-        priority_map = {p: i for i, p in enumerate(rules['priority_order'])}
-        requests.sort(key=lambda x: priority_map.get(x.get('Type', 'Recommended'), 999))
+        requests.sort(key=lambda x: constraints.request_rank(x, 999))
     
     return {
         'course_to_lecturer': course_to_lecturer,
         'course_details': course_details,
-        'course_requests': course_requests
+        'course_requests': course_requests,
+        'constraints': constraints
     }
 
 # Step 4: Generate Schedule Using Optimization
-def generate_schedule(data, rules, preprocessed_data):
-    """Generate optimized schedule based on constraints and priorities"""
-    # Extract preprocessed data
-    course_to_lecturer = preprocessed_data['course_to_lecturer']
-    course_details = preprocessed_data['course_details']
+def schedule_keys(block, terms):
+    """Schedule keys a section in a block fills: the block, or one slot per term it runs in"""
+    if terms is None:
+        return [block]
+    return [slot_name(block, term) for term in terms]
+
+def bucket_requests(rules, preprocessed_data, seed=None):
+    """{request type: [(course_code, requests)]} in priority order
+    
+    With a seed, courses and same-type students are shuffled reproducibly.
+    """
     course_requests = preprocessed_data['course_requests']
+    constraints = preprocessed_data.get('constraints') or compile_constraints(rules, preprocessed_data['course_details'])
+    
+    # Bucket each course's requests by priority once, instead of re-filtering
+    # the full request list for every priority type; the rank comes from
+    # the compiled priority order
+    requests_by_type = {req_type: [] for req_type in rules['priority_order']}
+    for course_code, requests in course_requests.items():
+        buckets = {}
+        for req in requests:
+            rank = constraints.request_rank(req)
+            if rank is not None:
+                buckets.setdefault(rules['priority_order'][rank], []).append(req)
+        for req_type, type_requests in buckets.items():
+            requests_by_type[req_type].append((course_code, type_requests))
+    
+    # Seeded restarts explore other course and student orderings
+    if seed is not None:
+        rng = random.Random(seed)
+        for type_courses in requests_by_type.values():
+            rng.shuffle(type_courses)
+            for _, type_requests in type_courses:
+                rng.shuffle(type_requests)
+    
+    return requests_by_type
+
+def course_demand(rules, requests_by_type):
+    """Combined demand per course over all priority types; courses are listed
+    in the order of their highest-priority requests"""
+    demand = {}
+    for req_type in rules['priority_order']:
+        for course_code, type_requests in requests_by_type[req_type]:
+            demand[course_code] = demand.get(course_code, 0) + len(type_requests)
+    return demand
+
+def create_sections(data, rules, preprocessed_data, demand, index, teacher_schedule, term_aware=False,
+                    placement='greedy'):
+    """First pass: create the sections each course's demand needs and give them blocks
     
+    Sections are placed in the index and their lecturers booked in
+    teacher_schedule. See generate_schedule for term_aware and placement.
+    """
+    course_to_lecturer = preprocessed_data['course_to_lecturer']
+    course_details = preprocessed_data['course_details']
+    constraints = preprocessed_data.get('constraints') or compile_constraints(rules, course_details)
+    
+    # Term-aware runs track (term, block) slots so term-disjoint sections can share a block
+    term_spans = section_term_spans(data, index.terms) if term_aware else {}
+    
+    # Inner-loop instrumentation only runs while tracing is on
+    tracing = TRACER.enabled
+    
+    if placement == 'coloring':
+        # First pass: Place every section at once on the conflict graph, keeping
+        # co-requested courses and shared lecturers in different blocks
+        with TRACER.stage('block_coloring'):
+            from conflict_graph import plan_section_blocks
+            # Lecturers already booked in a caller's index keep those blocks
+            busy = {lecturer_id: index.blocks_in(mask) for lecturer_id, mask in index.lecturer_masks.items() if mask}
+            plan, _ = plan_section_blocks(demand, rules, preprocessed_data, busy)
+            for section_key, course_code, section_num, lecturer_id, block in plan:
+                terms = section_terms(section_key, course_code, term_spans, course_details, index.terms) \
+                    if term_aware else None
+                max_size = course_details.get(course_code, {}).get('max_size', 25)
+                index.place_section(section_key, course_code, section_num, lecturer_id, block, max_size, terms)
+                course_info_str = f"{course_code} (Section {section_num})"
+                for key in schedule_keys(block, terms):
+                    teacher_schedule[lecturer_id][key] = course_info_str
+    else:
+        # First pass: Create each course's sections, in the order of its
+        # highest-priority requests (required courses such as BIB9-BIB12 first)
+        with TRACER.stage('block_search'):
+            spread = placement != 'first-fit'
+            block_load = defaultdict(int)  # {block: sections placed there}
+            for course_code, course_demand in demand.items():
+                # Get course details
+                course = course_details.get(course_code, {})
+                num_sections = course.get('num_sections', 1)
+                _, _, max_size = constraints.bounds(course_code)
+                # Available minus unavailable blocks, precompiled per course
+                course_blocks = constraints.blocks_for(course_code)
+            
+                # Create enough sections for the demand of every type, up to 'Number of sections'
+                needed_sections = min(num_sections, (course_demand + max_size - 1) // max_size)
+            
+                # Create sections and assign blocks
+                assigned_slots = 0  # slots taken by the course's other sections
+                for section_num in range(1, needed_sections + 1):
+                    section_key = f"{course_code}_{section_num}"
+                    lecturer_id = course_to_lecturer.get(section_key, f"unknown_{course_code}")
+                    terms = section_terms(section_key, course_code, term_spans, course_details, index.terms) \
+                        if term_aware else None
+                
+                    # Find best block for this section that doesn't conflict
+                    # with the course's other sections or the lecturer's bookings:
+                    # the one holding the fewest sections so far, or with
+                    # placement='first-fit' simply the first one
+                    best_block = None
+                    for block in course_blocks:
+                        if assigned_slots & index.slot_mask(block, terms):
+                            continue
+                        if tracing:
+                            TRACER.count('blocks_tried')
+                        if index.lecturer_free(lecturer_id, block, terms):
+                            if best_block is None or block_load[block] < block_load[best_block]:
+                                best_block = block
+                            if not spread:
+                                break
+                
+                    if best_block:
+                        if tracing:
+                            TRACER.count('sections_created')
+                        assigned_slots |= index.slot_mask(best_block, terms)
+                        block_load[best_block] += 1
+                        index.place_section(section_key, course_code, section_num, lecturer_id, best_block, max_size,
+                                            terms)
+                    
+                        # Pre-assign the lecturer to this block
+                        course_info_str = f"{course_code} (Section {section_num})"
+                        for key in schedule_keys(best_block, terms):
+                            teacher_schedule[lecturer_id][key] = course_info_str
+
+def generate_schedule(data, rules, preprocessed_data, index=None, seed=None, term_aware=False, placement='greedy',
+                      balance=False):
+    """Generate optimized schedule based on constraints and priorities
+    
+    With a seed, courses and same-type students are visited in a shuffled
+    (but reproducible) order; priority types still go strictly in order.
+    term_aware=True books sections only in the terms their Start Term and
+    Length cover, matches requests on their start term, and keys the
+    schedules by term slot ('1A-T1') instead of by block.
+    Sections go to the free block holding the fewest sections so far;
+    placement='first-fit' takes the first free block instead, and
+    placement='coloring' chooses section blocks on the section conflict
+    graph (conflict_graph.plan_section_blocks).
+    balance=True seats each student in the least-loaded compatible section
+    instead of the first one with room, so sections reach their minimum
+    and approach their target size together; sections still below their
+    minimum are then merged into the course's other sections
+    (balancing.merge_small_sections).
+    """
     # Initialize data structures for scheduling
     student_schedule = defaultdict(dict)  # {student_id: {block: course_info}}
     teacher_schedule = defaultdict(dict)  # {lecturer_id: {block: course_info}}
     section_assignments = defaultdict(list)  # {course_code_section: [student_ids]}
-    section_blocks = {}  # {course_code_section: block}
+    
+    # Constraint index: block bitmasks, section capacities and open sections.
+    # Callers may pass their own index to keep it after the run.
+    if index is None:
+        index = ScheduleIndex(rules['all_blocks'], terms=NUM_TERMS if term_aware else 1)
+    section_blocks = index.section_blocks  # {course_code_section: block}
+    
+    requests_by_type = bucket_requests(rules, preprocessed_data, seed)
     
     # Track resolved/unresolved requests
     resolved_requests = []
     unresolved_requests = []
     
-    # First pass: Assign required courses to ensure they're scheduled
-    # This handles BIB9, BIB10, BIB11, BIB12 and other required courses
-    for req_type in rules['priority_order']:
-        for course_code, requests in course_requests.items():
-            # Get course details
-            course = course_details.get(course_code, {})
-            num_sections = course.get('num_sections', 1)
-            max_size = course.get('max_size', 25)
-            available_blocks = course.get('available_blocks', rules['all_blocks'])
-            unavailable_blocks = course.get('unavailable_blocks', [])
-            
-            # Filter requests by current priority type
-            type_requests = [r for r in requests if r.get('Type', '') == req_type]
-            if not type_requests:
-                continue
-            
-            # Determine how many sections we need to create
-            needed_sections = min(num_sections, (len(type_requests) + max_size - 1) // max_size)
-            
-            # Create sections and assign blocks
-            assigned_blocks = set()
-            for section_num in range(1, needed_sections + 1):
-                section_key = f"{course_code}_{section_num}"
-                
-                # Find best block for this section that doesn't conflict
-                best_block = None
-                for block in available_blocks:
-                    if block in unavailable_blocks or block in assigned_blocks:
-                        continue
-                    
-                    # Check lecturer availability for this block
-                    lecturer_id = course_to_lecturer.get(section_key, f"unknown_{course_code}")
-                    if block in teacher_schedule[lecturer_id]:
-                        continue
-                    
-                    # This block works
-                    best_block = block
-                    break
-                
-                if best_block:
-                    assigned_blocks.add(best_block)
-                    section_blocks[section_key] = best_block
-                    
-                    # Pre-assign the lecturer to this block
-                    lecturer_id = course_to_lecturer.get(section_key, f"unknown_{course_code}")
-                    course_info_str = f"{course_code} (Section {section_num})"
-                    teacher_schedule[lecturer_id][best_block] = course_info_str
+    # Inner-loop instrumentation only runs while tracing is on
+    tracing = TRACER.enabled
+    
+    # First pass: Create the sections the demand needs and give them blocks
+    create_sections(data, rules, preprocessed_data, course_demand(rules, requests_by_type), index, teacher_schedule,
+                    term_aware, placement)
     
     # Second pass: Assign students to sections
-    for req_type in rules['priority_order']:
-        for course_code, requests in course_requests.items():
-            # Filter requests by current priority type
-            type_requests = [r for r in requests if r.get('Type', '') == req_type]
-            if not type_requests:
-                continue
-            
-            # Get course details
-            course = course_details.get(course_code, {})
-            num_sections = course.get('num_sections', 1)
-            max_size = course.get('max_size', 25)
+    with TRACER.stage('student_assignment'):
+        reported_sections = defaultdict(int)  # {course_code: sections listed in section_assignments}
+        for req_type in rules['priority_order']:
+            for course_code, type_requests in requests_by_type[req_type]:
+                course_sections = index.course_sections[course_code]
             
-            # Assign students to pre-created sections
-            for req in type_requests:
-                student_id = req.get('student ID', '')
-                if not student_id:
-                    unresolved_requests.append(req)
-                    continue
-                
-                # Try to assign to any available section
-                assigned = False
-                for section_num in range(1, num_sections + 1):
-                    section_key = f"{course_code}_{section_num}"
-                    block = section_blocks.get(section_key)
-                    
-                    # Skip if section wasn't assigned a block or is full
-                    if not block or len(section_assignments[section_key]) >= max_size:
+                # Assign students to pre-created sections
+                for req in type_requests:
+                    student_id = req.get('student ID', '')
+                    if not student_id or course_code in index.student_sections[student_id]:
+                        # No student, or a repeat of a course the student already has
+                        unresolved_requests.append(req)
                         continue
-                    
-                    # Check if student is available in this block
-                    if block in student_schedule[student_id]:
+                
+                    # Take the first (or, balancing, the least-loaded) section
+                    # with room in a block the student has free
+                    if tracing:
+                        probe_started = time.perf_counter()
+                    start_term = request_start_term(req) if term_aware else None
+                    if balance:
+                        section_key = index.find_least_loaded(student_id, course_code, start_term)
+                    else:
+                        section_key = index.find_section(student_id, course_code, start_term)
+                    if tracing:
+                        probe_finished = time.perf_counter()
+                        TRACER.add_time('section_probe', probe_finished - probe_started)
+                        open_sections = index.open_sections[course_code]
+                        TRACER.count('requests')
+                        TRACER.count('sections_probed', len(open_sections) if section_key is None
+                                     else open_sections.index(section_key) + 1)
+                
+                    # Every section probed so far shows up in the assignments,
+                    # even if it ends up empty
+                    probed = len(course_sections) if section_key is None else course_sections.index(section_key) + 1
+                    for probed_key in course_sections[reported_sections[course_code]:probed]:
+                        section_assignments.setdefault(probed_key, [])
+                    reported_sections[course_code] = max(reported_sections[course_code], probed)
+                
+                    if section_key is None:
+                        unresolved_requests.append(req)
                         continue
-                    
-                    # Assign student to this section
-                    course_info_str = f"{course_code} (Section {section_num})"
-                    student_schedule[student_id][block] = course_info_str
+                
+                    block = section_blocks[section_key]
+                    course_info_str = f"{course_code} (Section {index.section_number[section_key]})"
+                    for key in schedule_keys(block, index.section_terms[section_key]):
+                        student_schedule[student_id][key] = course_info_str
                     section_assignments[section_key].append(student_id)
+                    index.assign_student(student_id, section_key)
                     resolved_requests.append(req)
-                    assigned = True
-                    break
-                
-                if not assigned:
-                    unresolved_requests.append(req)
+                    if tracing:
+                        TRACER.add_time('seat_student', time.perf_counter() - probe_finished)
+    
+    # Third pass (balancing): Merge sections left below their minimum size
+    if balance:
+        with TRACER.stage('merge_small_sections'):
+            from balancing import merge_small_sections
+            merge_small_sections(index, preprocessed_data.get('constraints') or compile_constraints(
+                rules, preprocessed_data['course_details']), student_schedule, teacher_schedule, section_assignments)
     
     # Convert defaultdicts to regular dicts for JSON serialization
     student_schedule_dict = {student: dict(blocks) for student, blocks in student_schedule.items()}
@@ -259,6 +424,38 @@ def analyze_schedule(student_schedule, teacher_schedule, resolved, unresolved, s
     
     analysis['section_fill_rates'] = section_fill_rates
     
+    # Sections created vs allowed: 'Number of sections' caps how many
+    # requests a course can ever seat
+    created_sections = defaultdict(set)
+    for blocks in teacher_schedule.values():
+        for course_info in blocks.values():
+            course_code, _, section_num = course_info.rpartition(' (Section ')
+            created_sections[course_code].add(section_num)
+    course_demand = defaultdict(int)
+    for req in list(resolved) + list(unresolved):
+        course_demand[req.get('Course code', '')] += 1
+    
+    section_counts = {}
+    courses = list(course_details) + [code for code in list(created_sections) + list(course_demand)
+                                      if isinstance(code, str) and code and code not in course_details]
+    for course_code in dict.fromkeys(courses):
+        if not course_demand[course_code] and not created_sections[course_code]:
+            continue
+        course = course_details.get(course_code, {})
+        max_size = course.get('max_size', 25)
+        section_counts[course_code] = {
+            'requests': course_demand[course_code],
+            'needed': (course_demand[course_code] + max_size - 1) // max_size if max_size > 0 else 0,
+            'created': len(created_sections[course_code]),
+            'allowed': course.get('num_sections', 1)
+        }
+    analysis['section_counts'] = section_counts
+    analysis['sections_created'] = sum(counts['created'] for counts in section_counts.values())
+    analysis['sections_allowed'] = sum(counts['allowed'] for counts in section_counts.values())
+    analysis['courses_capped_by_sections'] = sorted(
+        course_code for course_code, counts in section_counts.items() if counts['needed'] > counts['allowed']
+    )
+    
     # Average courses per student
     courses_per_student = {student: len(blocks) for student, blocks in student_schedule.items()}
     if courses_per_student:
@@ -276,20 +473,30 @@ def analyze_schedule(student_schedule, teacher_schedule, resolved, unresolved, s
     return analysis
 
 # Step 6: Visualize Schedule
-def visualize_schedule(student_schedule, teacher_schedule, section_assignments, rules, analysis, output_dir='.'):
-    """Create visualizations of the schedule"""
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # Create a heatmap of student schedules by block
-    blocks = rules['all_blocks']
-    
+# Most section labels the fill rate chart prints before it starts skipping some
+MAX_SECTION_LABELS = 150
+
+def schedule_plot_data(student_schedule, rules, analysis):
+    """The (small) inputs render_plots needs: block counts and section fill rates"""
     # Student block distribution
-    block_counts = {block: 0 for block in blocks}
+    block_counts = {block: 0 for block in rules['all_blocks']}
     for student, schedule in student_schedule.items():
         for block in schedule:
             if block in block_counts:
                 block_counts[block] += 1
     
+    section_keys = list(analysis.get('section_fill_rates', {}).keys())
+    fill_rates = [analysis['section_fill_rates'][k]['fill_rate'] for k in section_keys]
+    return block_counts, section_keys, fill_rates
+
+def render_plots(block_counts, section_keys, fill_rates, output_dir='.'):
+    """Render the block distribution and section fill rate PNGs"""
+    # Imported here so runs that skip the plots never pay for matplotlib
+    import matplotlib
+    matplotlib.use('Agg')  # files only, no display
+    import matplotlib.pyplot as plt
+    import numpy as np
+    
     # Plot student distribution by block
     plt.figure(figsize=(10, 6))
     plt.bar(block_counts.keys(), block_counts.values())
@@ -302,20 +509,31 @@ def visualize_schedule(student_schedule, teacher_schedule, section_assignments,
     plt.close()
     
     # Section fill rates visualization
-    if analysis.get('section_fill_rates'):
-        section_keys = list(analysis['section_fill_rates'].keys())
-        fill_rates = [analysis['section_fill_rates'][k]['fill_rate'] for k in section_keys]
-        
+    if section_keys:
+        # Laying out thousands of tick labels costs more than the rest of the
+        # output together, so large runs label every step-th section only
+        step = -(-len(section_keys) // MAX_SECTION_LABELS)
+        positions = np.arange(len(section_keys))
         plt.figure(figsize=(12, 6))
-        plt.bar(section_keys, fill_rates)
+        if step == 1:
+            plt.bar(section_keys, fill_rates)
+        else:
+            plt.bar(positions, fill_rates, width=1.0)
         plt.title('Section Fill Rates')
         plt.xlabel('Section')
         plt.ylabel('Fill Rate (%)')
         plt.axhline(y=100, color='r', linestyle='-', alpha=0.3)
-        plt.xticks(rotation=90)
+        if step == 1:
+            plt.xticks(rotation=90)
+        else:
+            plt.xticks(positions[::step], section_keys[::step], rotation=90)
         plt.tight_layout()
         plt.savefig(f"{output_dir}/section_fill_rates.png")
         plt.close()
+
+def write_visualization_html(student_schedule, teacher_schedule, rules, analysis, output_dir='.'):
+    """Write schedule_visualization.html with metrics and sample schedules"""
+    blocks = rules['all_blocks']
     
     # Create a text-based visualization of some student schedules (sample of 5)
     student_samples = {}
@@ -424,57 +642,54 @@ def visualize_schedule(student_schedule, teacher_schedule, section_assignments,
         </html>
         ''')
 
-# Step 7: Save Outputs
-def save_outputs(student_schedule, teacher_schedule, resolved, unresolved, section_assignments, rules, analysis, output_dir='.'):
-    """Save all outputs to files"""
+
+def visualize_schedule(student_schedule, teacher_schedule, section_assignments, rules, analysis, output_dir='.'):
+    """Create visualizations of the schedule"""
     os.makedirs(output_dir, exist_ok=True)
-    
-    # Student Schedules
-    with open(f"{output_dir}/student_schedules.json", 'w') as f:
-        json.dump(student_schedule, f, indent=4)
-    
-    # Teacher Schedules
-    with open(f"{output_dir}/teacher_schedules.json", 'w') as f:
-        json.dump(teacher_schedule, f, indent=4)
-    
-    # Create a user-friendly version of student schedules
-    with open(f"{output_dir}/student_schedules.md", 'w') as f:
-        f.write("# Student Schedules\n\n")
-        sample_students = list(student_schedule.keys())[:20]  # Show first 20 students
-        
-        for student in sample_students:
-            f.write(f"## Student: {student}\n\n")
-            
-            # Create a table for this student's schedule
-            headers = ["Block", "Course"]
-            rows = []
-            for block in sorted(rules['all_blocks']):
-                course = student_schedule[student].get(block, "")
-                rows.append([block, course])
-            
-            f.write(tabulate(rows, headers=headers, tablefmt="pipe"))
-            f.write("\n\n")
-    
-    # Create a user-friendly version of teacher schedules
-    with open(f"{output_dir}/teacher_schedules.md", 'w') as f:
-        f.write("# Teacher Schedules\n\n")
-        sample_teachers = list(teacher_schedule.keys())[:20]  # Show first 20 teachers
-        
-        for teacher in sample_teachers:
-            f.write(f"## Teacher: {teacher}\n\n")
+    render_plots(*schedule_plot_data(student_schedule, rules, analysis), output_dir)
+    write_visualization_html(student_schedule, teacher_schedule, rules, analysis, output_dir)
+
+# Step 7: Save Outputs
+def _json_default(value):
+    # Rows read from the columnar cache are Mappings rather than dicts
+    if isinstance(value, Mapping):
+        return dict(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def write_json(obj, path, indent=4):
+    """Stream obj to path as JSON, encoded chunk by chunk rather than as one string"""
+    with open(path, 'w', buffering=1 << 20) as f:
+        for chunk in json.JSONEncoder(indent=indent, default=_json_default).iterencode(obj):
+            f.write(chunk)
+
+def load_run(path):
+    """Read a schedule_run.json back as keyword arguments for save_outputs"""
+    with open(path, 'r') as f:
+        run = json.load(f)
+    run['section_assignments'] = defaultdict(list, run['section_assignments'])
+    return run
+
+def write_schedule_markdown(schedules, rules, path, title, heading, limit=20):
+    """Markdown tables of the first `limit` schedules, one row per block"""
+    from tabulate import tabulate
+    with open(path, 'w') as f:
+        f.write(f"# {title}\n\n")
+        for owner in list(schedules.keys())[:limit]:
+            f.write(f"## {heading}: {owner}\n\n")
             
-            # Create a table for this teacher's schedule
+            # Create a table for this schedule
             headers = ["Block", "Course"]
             rows = []
             for block in sorted(rules['all_blocks']):
-                course = teacher_schedule[teacher].get(block, "")
+                course = schedules[owner].get(block, "")
                 rows.append([block, course])
             
             f.write(tabulate(rows, headers=headers, tablefmt="pipe"))
             f.write("\n\n")
-    
-    # Request resolution stats
-    with open(f"{output_dir}/request_stats.md", 'w') as f:
+
+def write_request_stats(resolved, unresolved, analysis, path):
+    """Request resolution stats, with a breakdown by priority type"""
+    with open(path, 'w') as f:
         total_requests = len(resolved) + len(unresolved)
         resolved_count = len(resolved)
         unresolved_count = len(unresolved)
@@ -491,7 +706,13 @@ def save_outputs(student_schedule, teacher_schedule, resolved, unresolved, secti
             unresolved_percentage = 0
             
         f.write(f"- **Resolved**: {resolved_count} ({resolved_percentage:.2f}%)\n")
-        f.write(f"- **Unresolved**: {unresolved_count} ({unresolved_percentage:.2f}%)\n\n")
+        f.write(f"- **Unresolved**: {unresolved_count} ({unresolved_percentage:.2f}%)\n")
+        if 'sections_created' in analysis:
+            f.write(f"- **Sections**: {analysis['sections_created']} created of {analysis['sections_allowed']} allowed\n")
+            capped = analysis['courses_capped_by_sections']
+            f.write(f"- **Courses capped by Number of sections**: {len(capped)}"
+                    f"{' (' + ', '.join(capped) + ')' if capped else ''}\n")
+        f.write("\n")
         
         # Break down by priority
         f.write("## Priority Breakdown\n\n")
@@ -513,18 +734,114 @@ def save_outputs(student_schedule, teacher_schedule, resolved, unresolved, secti
             total = stats['resolved'] + stats['unresolved']
             success_rate = (stats['resolved'] / total * 100) if total > 0 else 0
             f.write(f"| {priority} | {stats['resolved']} | {stats['unresolved']} | {total} | {success_rate:.2f}% |\n")
+
+def write_room_outputs(room_assignments, rules, output_dir='.'):
+    """room_assignments.json plus a room x block timetable in room_schedules.md"""
+    from tabulate import tabulate
+    write_json(room_assignments, f"{output_dir}/room_assignments.json")
+    
+    with open(f"{output_dir}/room_schedules.md", 'w') as f:
+        f.write("# Room Schedules\n\n")
+        headers = ["Room"] + sorted(rules['all_blocks'])
+        rows = []
+        for room, blocks in sorted(rooms_by_block(room_assignments).items()):
+            rows.append([room] + [blocks.get(block, "") for block in sorted(rules['all_blocks'])])
+        f.write(tabulate(rows, headers=headers, tablefmt="pipe"))
+        f.write("\n")
+
+def save_outputs(student_schedule, teacher_schedule, resolved, unresolved, section_assignments, rules, analysis, output_dir='.',
+                 room_assignments=None, artifacts=None, workers=4):
+    """Save all outputs to files
+    
+    The writers are independent, so they run on a thread pool while the
+    matplotlib plots render in a separate process (pyplot is neither
+    thread-safe nor GIL-free). artifacts selects a subset of
+    OUTPUT_ARTIFACTS; the default writes all of them.
+    """
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+    os.makedirs(output_dir, exist_ok=True)
     
-    # Save analysis results
-    with open(f"{output_dir}/schedule_analysis.json", 'w') as f:
-        json.dump(analysis, f, indent=4)
-    
-    # Visualization
-    visualize_schedule(student_schedule, teacher_schedule, section_assignments, rules, analysis, output_dir)
+    artifacts = set(OUTPUT_ARTIFACTS if artifacts is None else artifacts)
+    unknown = artifacts - set(OUTPUT_ARTIFACTS)
+    if unknown:
+        raise ValueError(f"Unknown output artifacts: {', '.join(sorted(unknown))}")
+    
+    writers = {
+        'student_json': (write_json, student_schedule, f"{output_dir}/student_schedules.json"),
+        'teacher_json': (write_json, teacher_schedule, f"{output_dir}/teacher_schedules.json"),
+        'student_md': (write_schedule_markdown, student_schedule, rules, f"{output_dir}/student_schedules.md",
+                       "Student Schedules", "Student"),
+        'teacher_md': (write_schedule_markdown, teacher_schedule, rules, f"{output_dir}/teacher_schedules.md",
+                       "Teacher Schedules", "Teacher"),
+        'request_stats': (write_request_stats, resolved, unresolved, analysis, f"{output_dir}/request_stats.md"),
+        'analysis': (write_json, analysis, f"{output_dir}/schedule_analysis.json"),
+        'html': (write_visualization_html, student_schedule, teacher_schedule, rules, analysis, output_dir),
+        'run': (write_json, {
+            'student_schedule': student_schedule,
+            'teacher_schedule': teacher_schedule,
+            'resolved': resolved,
+            'unresolved': unresolved,
+            'section_assignments': section_assignments,
+            'rules': rules,
+            'analysis': analysis,
+            'room_assignments': room_assignments
+        }, f"{output_dir}/{RUN_FILE}")
+    }
+    if room_assignments is not None:
+        writers['rooms'] = (write_room_outputs, room_assignments, rules, output_dir)
+    
+    # Start the plot process first, before any writer threads exist. A
+    # child forked while the caller traces allocations would trace (and be
+    # slowed by) its own, so it stops tracing before rendering.
+    plot_pool = plot_future = None
+    if 'plots' in artifacts:
+        plot_pool = ProcessPoolExecutor(max_workers=1, initializer=tracemalloc.stop)
+        plot_future = plot_pool.submit(render_plots, *schedule_plot_data(student_schedule, rules, analysis), output_dir)
+    
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(writer, *args) for name, (writer, *args) in writers.items() if name in artifacts]
+            for future in futures:
+                future.result()
+        if plot_future is not None:
+            plot_future.result()
+    finally:
+        if plot_pool is not None:
+            plot_pool.shutdown()
 
 # Main execution
-def main():
-    """Main function to run the scheduling process"""
+def main(optimize_seconds=0, restarts=0, exact_time_limit=0, trace_path=None, trace_memory=None, term_aware=None,
+         placement='greedy', artifacts=None, use_memo=True, engine='course', balance=None, shards=0,
+         shard_by='year'):
+    """Main function to run the scheduling process
+    
+    exact_time_limit > 0 solves the schedule as an integer program instead
+    (exact_solver.solve_exact, needs OR-Tools or PuLP). restarts > 0 runs
+    that many seeded orderings in parallel and keeps the best
+    (parallel.parallel_schedule). optimize_seconds > 0 follows the greedy
+    pass with a local search (optimizer.LocalSearch) given that wall-clock
+    budget. trace_path (or SCHEDULER_TRACE) writes a per-stage Chrome
+    trace there. term_aware=True schedules per term (greedy engine only),
+    with outputs keyed by term slot. placement='coloring' places the
+    greedy engine's sections on the conflict graph, placement='first-fit'
+    in the first free block rather than the least-loaded one. artifacts
+    limits the outputs written (see OUTPUT_ARTIFACTS). use_memo=False
+    recomputes the rules and preprocessing instead of reading them from
+    the memo cache. engine='student' fits each student's whole request set
+    at once (student_engine.generate_student_schedule) instead of going
+    course by course. balance=True fills sections evenly toward their
+    target size and merges sections left below their minimum (course
+    engine only). term_aware and balance left at None follow the RULES
+    sheet: a course length rule turns on term-aware scheduling, a balanced
+    sections rule turns on balancing. shards > 1 schedules that many
+    shards of the students (by shard_by, 'year' or 'component') in
+    parallel and reconciles them (sharding.sharded_schedule).
+    Only the first of exact, optimize, restarts, shards and the student
+    engine runs; the others, and options it does not take, are ignored
+    with a warning.
+    """
     print("Starting scheduling process...")
+    configure_tracing(trace_path, trace_memory)
     
     # Create output directory
     output_dir = 'schedule_output'
@@ -532,38 +849,136 @@ def main():
     
     # Step 1: Load the cleaned data
     print("Loading cleaned data...")
-    data = load_cleaned_data('cleaned_data.json')
+    data_file = 'cleaned_data.json'
+    with TRACER.stage('load_cleaned_data'):
+        data = load_cleaned_data(data_file)
+    
+    # Steps 2 and 3 are memoized on disk, keyed by the content of the input
+    memo, fingerprint = open_memo(data_file, use_memo)
     
     # Step 2: Extract rules and constraints
     print("Extracting rules and constraints...")
-    rules = extract_rules_and_constraints(data)
+    with TRACER.stage('extract_rules_and_constraints'):
+        rules = memoized(memo, fingerprint, None, extract_rules_and_constraints, data)
     
     # Step 3: Preprocess data
     print("Preprocessing data...")
-    preprocessed_data = preprocess_data(data, rules)
+    with TRACER.stage('preprocess_data'):
+        preprocessed_data = memoized(memo, fingerprint, rules, preprocess_data, data, rules)
+    
+    # Modes the caller left open follow the compiled rules
+    if term_aware is None:
+        term_aware = preprocessed_data['constraints'].term_lengths
+    if balance is None:
+        balance = preprocessed_data['constraints'].balanced_sections
+    
+    # Only the first mode asked for runs (in the order of Step 4); say what
+    # it leaves out rather than dropping it silently
+    modes = [('exact solving', exact_time_limit > 0), ('local search', optimize_seconds > 0),
+             ('seeded restarts', restarts > 0), ('sharding', shards > 1), ('the student engine', engine == 'student')]
+    active = [name for name, requested in modes if requested]
+    for name in active[1:]:
+        print(f"Warning: {active[0]} takes precedence; ignoring {name}")
+    other_engine = bool(active)
+    if term_aware and other_engine:
+        print("Warning: term-aware scheduling only applies to the greedy engine; ignoring it")
+    if balance and other_engine:
+        print("Warning: balancing only applies to the greedy engine; ignoring it")
+    if placement != 'greedy' and active and active[0] not in ('sharding', 'the student engine'):
+        print("Warning: placement only applies to the greedy, sharded and student engines; ignoring it")
+    if shard_by != 'year' and shards <= 1:
+        print("Warning: shard_by only applies with more than one shard; ignoring it")
     
     # Step 4: Generate the schedule
     print("Generating schedule...")
-    student_schedule, teacher_schedule, resolved, unresolved, section_assignments = generate_schedule(
-        data, rules, preprocessed_data
-    )
+    with TRACER.stage('generate_schedule'):
+        if exact_time_limit > 0:
+            from exact_solver import solve_exact
+            print(f"Solving exactly with a {exact_time_limit}s time limit...")
+            (student_schedule, teacher_schedule, resolved, unresolved, section_assignments), info = solve_exact(
+                data, rules, preprocessed_data, time_limit=exact_time_limit
+            )
+            for component in info['components']:
+                print(f"  {component['courses']} courses, {component['variables']} variables: "
+                      f"{component['status']} (objective {component['objective']}, bound {component['bound']})"
+                      f"{'; kept the greedy warm start' if component['kept_warm_start'] else ''}")
+        elif optimize_seconds > 0:
+            from optimizer import improve_schedule
+            print(f"Improving schedule with local search for {optimize_seconds}s...")
+            schedule, stats = improve_schedule(data, rules, preprocessed_data, time_budget=optimize_seconds)
+            print(f"Local search: score {stats['initial_score']} -> {stats['best_score']} "
+                  f"after {stats['iterations']} moves")
+            student_schedule = schedule['student_schedule']
+            teacher_schedule = schedule['teacher_schedule']
+            resolved, unresolved = schedule['resolved'], schedule['unresolved']
+            section_assignments = schedule['section_assignments']
+        elif restarts > 0:
+            from parallel import parallel_schedule
+            print(f"Running {restarts} seeded restarts in parallel...")
+            (student_schedule, teacher_schedule, resolved, unresolved, section_assignments), best_seed, _ = \
+                parallel_schedule(data, rules, preprocessed_data, runs=restarts)
+            print(f"Best ordering: seed {best_seed}")
+        elif shards > 1:
+            from sharding import sharded_schedule
+            print(f"Scheduling up to {shards} shards by {shard_by} in parallel...")
+            (student_schedule, teacher_schedule, resolved, unresolved, section_assignments), info = \
+                sharded_schedule(data, rules, preprocessed_data, shards=shards, shard_by=shard_by, placement=placement)
+            print(f"Shards of {', '.join(str(size) for size in info['shards'])} requests; reconciling moved "
+                  f"{info['sections_moved']} sections, dropped {info['sections_dropped']} and reseated "
+                  f"{info['requests_refilled']} requests")
+        elif engine == 'student':
+            from student_engine import generate_student_schedule
+            print("Scheduling student by student...")
+            student_schedule, teacher_schedule, resolved, unresolved, section_assignments = \
+                generate_student_schedule(data, rules, preprocessed_data, placement=placement)
+        else:
+            student_schedule, teacher_schedule, resolved, unresolved, section_assignments = generate_schedule(
+                data, rules, preprocessed_data, term_aware=term_aware, placement=placement, balance=balance
+            )
+    
+    # Term-aware outputs list every (term, block) slot where they list blocks
+    output_rules = rules
+    if term_aware and not other_engine:
+        output_rules = dict(rules, all_blocks=all_slots(rules['all_blocks']))
     
     # Step 5: Analyze the schedule
     print("Analyzing schedule quality...")
-    analysis = analyze_schedule(
-        student_schedule, teacher_schedule, resolved, unresolved, 
-        section_assignments, preprocessed_data['course_details']
-    )
+    with TRACER.stage('analyze_schedule'):
+        analysis = analyze_schedule(
+            student_schedule, teacher_schedule, resolved, unresolved, 
+            section_assignments, preprocessed_data['course_details']
+        )
+    
+    # Step 5b: Assign rooms to the sections that run
+    room_assignments = None
+    if data.get('rooms'):
+        print("Assigning rooms...")
+        with TRACER.stage('assign_rooms'):
+            room_assignments, unroomed = assign_rooms(
+                data['rooms'], student_schedule, section_assignments,
+                preprocessed_data['course_details'], output_rules['all_blocks']
+            )
+        print(f"Assigned rooms to {len(room_assignments)} sections ({len(unroomed)} without a room)")
     
     # Step 6 & 7: Visualize and save outputs
     print("Saving outputs and visualizations...")
-    save_outputs(
-        student_schedule, teacher_schedule, resolved, unresolved, 
-        section_assignments, rules, analysis, output_dir
-    )
+    with TRACER.stage('save_outputs'):
+        save_outputs(
+            student_schedule, teacher_schedule, resolved, unresolved, 
+            section_assignments, output_rules, analysis, output_dir, room_assignments, artifacts
+        )
     
     print(f"Scheduling complete! Results saved to '{output_dir}' directory.")
     print(f"Satisfaction rate: {analysis['satisfaction_rate']:.2f}%")
+    
+    if TRACER.enabled:
+        print(f"Stage trace written to '{TRACER.write()}'")
+
+def run_from_args(args):
+    main(args.optimize, args.restarts, args.exact, args.trace, args.trace_memory, args.terms, args.placement,
+         args.artifacts, not args.no_memo, args.engine, args.balance, args.shards, args.shard_by)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Generate the course schedule from cleaned_data.json")
+    run_from_args(add_schedule_arguments(parser).parse_args())
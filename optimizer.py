@@ -0,0 +1,212 @@
+import math
+import random
+import time
+
+from incremental import IncrementalScheduler
+
+
+def priority_weights(rules):
+    """Weight per request type: each priority level outweighs ten of the next"""
+    order = rules['priority_order']
+    return {req_type: 10 ** (len(order) - 1 - rank) for rank, req_type in enumerate(order)}
+
+
+class LocalSearch:
+    """Time-boxed simulated annealing over a finished greedy schedule.
+
+    The score is the priority-weighted number of resolved requests, the same
+    quantity analyze_schedule's satisfaction rate counts. Every move works on
+    an IncrementalScheduler and is scored from the handful of students and
+    sections it touches, never by re-analysing the whole schedule:
+
+    - relocate: seat a waitlisted request by moving the student's clashing
+      course to another section of that course (never loses score)
+    - bump: seat a waitlisted request by unseating the clashing one
+    - move: shift a section to another block, losing the students who clash
+      there and filling the freed seats from the course's waitlist
+    """
+
+    def __init__(self, scheduler, rules, course_details, seed=0, weights=None):
+        self.scheduler = scheduler
+        self.index = scheduler.index
+        self.rules = rules
+        self.course_details = course_details
+        self.random = random.Random(seed)
+        self.weights = weights or priority_weights(rules)
+        self.score = self.best_score = sum(self.weight(req) for req in scheduler.placed.values())
+        self.best_snapshot = None
+
+        self.sections = sorted(self.index.section_blocks)
+        self._waiting_keys = []
+
+    def weight(self, req):
+        return self.weights.get(req.get('Type', ''), 0)
+
+    def _random_waiting(self):
+        """Pick a random waitlisted request, refreshing the sample list lazily"""
+        waitlisted = self.scheduler.waitlisted
+        for _ in range(3):
+            if not self._waiting_keys:
+                self._waiting_keys = list(waitlisted)
+                if not self._waiting_keys:
+                    return None
+            key = self._waiting_keys.pop(self.random.randrange(len(self._waiting_keys)))
+            if key in waitlisted:
+                return key
+        return None
+
+    def _blocking_section(self, student_id, block):
+        """Section the student attends in a block, if any"""
+        for section_key in self.index.student_sections[student_id].values():
+            if self.index.section_blocks[section_key] == block:
+                return section_key
+        return None
+
+    def _alternative_section(self, student_id, section_key):
+        """Another open section of the same course whose block the student has free"""
+        course_code = self.index.section_course[section_key]
+        busy = self.index.student_masks[student_id]
+        for other_key in self.index.open_sections[course_code]:
+            if other_key != section_key and not busy & self.index.section_masks[other_key]:
+                return other_key
+        return None
+
+    def _accept(self, delta, temperature):
+        if delta >= 0:
+            return True
+        return temperature > 0 and self.random.random() < math.exp(delta / temperature)
+
+    def try_seat_waiting(self, temperature):
+        """relocate / bump move for one random waitlisted request"""
+        key = self._random_waiting()
+        if key is None:
+            return None
+        student_id, course_code = key
+        req = self.scheduler.waitlisted[key][2]
+        gain = self.weight(req)
+
+        candidates = list(self.index.open_sections[course_code])
+        self.random.shuffle(candidates)
+        for section_key in candidates:
+            block = self.index.section_blocks[section_key]
+            blocking = self._blocking_section(student_id, block)
+            if blocking is None:
+                # Seat is free outright (state changed since it was waitlisted)
+                self.scheduler.seat(req, section_key)
+                self._apply(gain)
+                return gain
+
+            blocking_key = (student_id, self.index.section_course[blocking])
+            alternative = self._alternative_section(student_id, blocking)
+            if alternative is not None:
+                blocked_req = self.scheduler.unseat(blocking_key)
+                self.scheduler.seat(blocked_req, alternative)
+                self.scheduler.seat(req, section_key)
+                self._apply(gain)
+                return gain
+
+            delta = gain - self.weight(self.scheduler.placed[blocking_key])
+            if self._accept(delta, temperature):
+                if delta < 0:
+                    self._before_worsening()
+                self.scheduler.unseat(blocking_key)
+                self.scheduler.seat(req, section_key)
+                self._apply(delta)
+                return delta
+            return None
+        return None
+
+    def try_move_section(self, temperature):
+        """move: shift one random section to another block"""
+        if not self.sections:
+            return None
+        section_key = self.random.choice(self.sections)
+        index = self.index
+        course_code = index.section_course[section_key]
+        course = self.course_details.get(course_code, {})
+        lecturer_id = index.section_lecturer[section_key]
+        current = index.section_blocks[section_key]
+
+        used = {index.section_blocks[key] for key in index.course_sections[course_code]}
+        unavailable = set(course.get('unavailable_blocks', []))
+        options = [block for block in course.get('available_blocks', self.rules['all_blocks'])
+                   if block not in used and block not in unavailable and index.lecturer_free(lecturer_id, block)]
+        if not options:
+            return None
+        block = self.random.choice(options)
+        bit = index.slot_mask(block, index.section_terms[section_key])
+
+        # Delta: students who clash at the new block lose the section, the
+        # freed and spare seats go to waitlisted students free at that block
+        enrolled = self.scheduler.section_assignments[section_key]
+        losers = [student_id for student_id in enrolled if index.student_masks[student_id] & bit]
+        loss = sum(self.weight(self.scheduler.placed[(student_id, course_code)]) for student_id in losers)
+        seats = index.section_free[section_key] + len(losers)
+        gainers = []
+        for _, _, student_id in self.scheduler.waitlist[course_code]:
+            if len(gainers) == seats:
+                break
+            if not index.student_masks[student_id] & bit:
+                gainers.append(student_id)
+        gain = sum(self.weight(self.scheduler.waitlisted[(student_id, course_code)][2]) for student_id in gainers)
+
+        delta = gain - loss
+        if current == block or not self._accept(delta, temperature):
+            return None
+        if delta < 0:
+            self._before_worsening()
+        self.scheduler.move_section(section_key, block)
+        for student_id in gainers:
+            self.scheduler.seat(self.scheduler.waitlisted[(student_id, course_code)][2], section_key)
+        self._apply(delta)
+        return delta
+
+    def _apply(self, delta):
+        """Book an applied move's score change and track the best score"""
+        self.score += delta
+        if self.score > self.best_score:
+            self.best_score = self.score
+            self.best_snapshot = None  # the current state is the best again
+
+    def _before_worsening(self):
+        """Snapshot a record-holding state before a move takes the score below it"""
+        if self.best_snapshot is None and self.score == self.best_score:
+            self.best_snapshot = self.scheduler.schedule()
+
+    def run(self, time_budget=5.0, start_temperature=2.0, end_temperature=0.05, move_probability=0.2):
+        """Anneal for time_budget wall-clock seconds and return (best schedule, stats)"""
+        initial_score = self.best_score = self.score
+        self.best_snapshot = None  # None while the current state is the best one
+        iterations = accepted = 0
+
+        started = now = time.perf_counter()
+        deadline = started + time_budget
+        while now < deadline:
+            progress = (now - started) / time_budget
+            temperature = start_temperature * (end_temperature / start_temperature) ** progress
+            if self.random.random() < move_probability:
+                delta = self.try_move_section(temperature)
+            else:
+                delta = self.try_seat_waiting(temperature)
+            iterations += 1
+            if delta is not None:
+                accepted += 1
+            now = time.perf_counter()
+
+        schedule = self.best_snapshot or self.scheduler.schedule()
+        total = len(schedule['resolved']) + len(schedule['unresolved'])
+        return schedule, {
+            'initial_score': initial_score,
+            'best_score': self.best_score,
+            'iterations': iterations,
+            'accepted_moves': accepted,
+            'satisfaction_rate': len(schedule['resolved']) / total * 100 if total else 100,
+            'elapsed_seconds': now - started
+        }
+
+
+def improve_schedule(data, rules, preprocessed_data, time_budget=5.0, seed=0):
+    """Run the greedy scheduler, then anneal its result for time_budget seconds"""
+    scheduler = IncrementalScheduler.from_run(data, rules, preprocessed_data)
+    search = LocalSearch(scheduler, rules, preprocessed_data['course_details'], seed=seed)
+    return search.run(time_budget)
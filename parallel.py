@@ -0,0 +1,61 @@
+import multiprocessing
+import os
+import statistics
+from concurrent.futures import ProcessPoolExecutor
+
+from milestone2 import analyze_schedule, generate_schedule
+
+# Inputs shared with the workers. Under 'fork' the children inherit this
+# module state copy-on-write, so nothing large is pickled per task; other
+# start methods receive it once per worker through the initializer.
+_SHARED = {}
+
+
+def _init_worker(shared):
+    _SHARED.update(shared)
+
+
+def score_schedule(analysis):
+    """Rank key for a run: higher satisfaction first, then more even section fill"""
+    fill_rates = [section['fill_rate'] for section in analysis['section_fill_rates'].values()]
+    spread = statistics.pstdev(fill_rates) if len(fill_rates) > 1 else 0
+    return analysis['satisfaction_rate'], -spread
+
+
+def _run_seed(seed):
+    """Worker: schedule with one seeded ordering and return only its score"""
+    data, rules, preprocessed_data = _SHARED['data'], _SHARED['rules'], _SHARED['preprocessed_data']
+    student_schedule, teacher_schedule, resolved, unresolved, section_assignments = generate_schedule(
+        data, rules, preprocessed_data, seed=seed
+    )
+    analysis = analyze_schedule(student_schedule, teacher_schedule, resolved, unresolved,
+                                section_assignments, preprocessed_data['course_details'])
+    return seed, score_schedule(analysis)
+
+
+def parallel_schedule(data, rules, preprocessed_data, runs=8, workers=None, base_seed=0):
+    """Run seeded generate_schedule variants across a process pool and keep the best.
+    
+    Seed None (the unshuffled greedy order) always competes too. Workers send
+    back only (seed, score); the winning seed is re-run here, which is cheap
+    and deterministic, so full schedules never cross process boundaries.
+    Returns (generate_schedule results, winning seed, {seed: score}).
+    """
+    seeds = [None] + [base_seed + i for i in range(runs)]
+    workers = workers or min(len(seeds), os.cpu_count() or 1)
+    shared = {'data': data, 'rules': rules, 'preprocessed_data': preprocessed_data}
+
+    if 'fork' in multiprocessing.get_all_start_methods():
+        _SHARED.update(shared)
+        pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork'))
+    else:
+        pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(shared,))
+    try:
+        with pool:
+            scores = dict(pool.map(_run_seed, seeds))
+    finally:
+        _SHARED.clear()
+
+    best_seed = max(seeds, key=lambda seed: scores[seed])
+    result = generate_schedule(data, rules, preprocessed_data, seed=best_seed)
+    return result, best_seed, scores
@@ -0,0 +1,179 @@
+from array import array
+from collections.abc import Mapping, Sequence
+
+from columnar_cache import MISSING_CODE, NAN
+
+# Code for a column a row does not have at all (a NaN cell is a value)
+ABSENT = -1
+
+
+class Interner:
+    """Two-way map between values and dense integer IDs.
+
+    Every value is stored once, so rows that repeat a student ID, course
+    code or request type all point at the same object. Lookups are by
+    equality with identity first, which keeps the shared NaN object of
+    json.load and the columnar cache as a single value, and keyed by type
+    as well, so 1, 1.0 and True stay three values.
+    """
+
+    __slots__ = ('ids', 'typed_ids', 'values')
+
+    def __init__(self, values=()):
+        self.ids = {}
+        self.typed_ids = {}  # {(type, value): id} for values equal to an earlier one of another type
+        self.values = []
+        for value in values:
+            self.intern(value)
+
+    def intern(self, value):
+        code = self.ids.get(value)
+        if code is None:
+            code = self.ids[value] = len(self.values)
+            self.values.append(value)
+        elif type(self.values[code]) is not type(value):
+            key = (type(value), value)
+            code = self.typed_ids.get(key)
+            if code is None:
+                code = self.typed_ids[key] = len(self.values)
+                self.values.append(value)
+        return code
+
+    def id_of(self, value):
+        code = self.ids.get(value)
+        if code is not None and type(self.values[code]) is not type(value):
+            return self.typed_ids.get((type(value), value))
+        return code
+
+    def __getitem__(self, code):
+        return self.values[code]
+
+    def __len__(self):
+        return len(self.values)
+
+
+class RequestTable(Sequence):
+    """Student requests as struct-of-arrays.
+
+    Each column is one array('i') of interned codes plus the Interner that
+    decodes them, about 4 bytes per cell against a dict slot and a string
+    per cell for the exported rows. Rows are handed out as Request views,
+    which read like the original dicts, so the scheduler, the analysis and
+    the JSON writers need no changes; dict(request) gives the row back.
+    """
+
+    def __init__(self):
+        self.columns = []    # column names, in first-seen order
+        self.interners = {}  # {column: Interner}
+        self.codes = {}      # {column: array('i') of codes, ABSENT if the row lacks the column}
+        self.rows = 0
+
+    def _add_column(self, column):
+        self.columns.append(column)
+        self.interners[column] = Interner()
+        self.codes[column] = array('i', [ABSENT]) * self.rows
+
+    def append(self, row):
+        for column in row:
+            if column not in self.interners:
+                self._add_column(column)
+        for column in self.columns:
+            codes = self.codes[column]
+            if column in row:
+                codes.append(self.interners[column].intern(row[column]))
+            else:
+                codes.append(ABSENT)
+        self.rows += 1
+
+    @classmethod
+    def from_rows(cls, rows):
+        table = cls()
+        for row in rows:
+            table.append(row)
+        return table
+
+    @classmethod
+    def from_column_table(cls, column_table):
+        """Adopt a columnar cache table's category codes without decoding any row"""
+        table = cls()
+        table.rows = len(column_table)
+        for column, spec in column_table.column_specs.items():
+            if spec['kind'] == 'list':
+                # Unhashable cells: fall back to reading the rows
+                return cls.from_rows(column_table)
+            table.columns.append(column)
+            if spec['kind'] == 'category':
+                interner = table.interners[column] = Interner(column_table.categories(column))
+                codes = column_table.codes(column)
+                if (codes == MISSING_CODE).any():
+                    codes = codes.copy()
+                    codes[codes == MISSING_CODE] = interner.intern(NAN)
+                table.codes[column] = array('i', codes.astype('int32').tobytes())
+            else:
+                interner = table.interners[column] = Interner()
+                table.codes[column] = array('i', map(interner.intern, column_table.column(column)))
+        return table
+
+    def ids(self, column):
+        """Interned codes of a column, e.g. integer student IDs for 'student ID'"""
+        return self.codes[column]
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [Request(self, i) for i in range(*row.indices(self.rows))]
+        if row < 0:
+            row += self.rows
+        if not 0 <= row < self.rows:
+            raise IndexError(row)
+        return Request(self, row)
+
+    def __iter__(self):
+        for row in range(self.rows):
+            yield Request(self, row)
+
+
+class Request(Mapping):
+    """One row of a RequestTable, read like a request dict"""
+
+    __slots__ = ('table', 'row')
+
+    def __init__(self, table, row):
+        self.table = table
+        self.row = row
+
+    def __getitem__(self, column):
+        codes = self.table.codes.get(column)
+        if codes is None or codes[self.row] == ABSENT:
+            raise KeyError(column)
+        return self.table.interners[column].values[codes[self.row]]
+
+    def get(self, column, default=None):
+        # Mapping.get goes through a KeyError for every missing column;
+        # this is on the scheduler's hot path
+        codes = self.table.codes.get(column)
+        if codes is None:
+            return default
+        code = codes[self.row]
+        return default if code == ABSENT else self.table.interners[column].values[code]
+
+    def __iter__(self):
+        row = self.row
+        return (column for column in self.table.columns if self.table.codes[column][row] != ABSENT)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"Request({dict(self)!r})"
+
+
+def as_request_table(rows):
+    """A RequestTable for rows that are not one yet (dicts or columnar cache rows)"""
+    if isinstance(rows, RequestTable):
+        return rows
+    if hasattr(rows, 'column_specs'):
+        return RequestTable.from_column_table(rows)
+    return RequestTable.from_rows(rows)
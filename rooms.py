@@ -0,0 +1,166 @@
+import bisect
+import re
+from collections import defaultdict
+
+# Seats assumed for a room none of whose historical courses has a known size
+DEFAULT_ROOM_CAPACITY = 25
+
+# Labels look like "BIB9 (Section 2)" in the student and teacher schedules
+SECTION_LABEL = re.compile(r'^(.*) \(Section (\d+)\)$')
+
+
+def room_capacities(rooms_data, course_details, default=DEFAULT_ROOM_CAPACITY):
+    """Seats per room.
+
+    The Rooms data sheet has no capacity column, so a room holds as many as
+    the largest section (by max_size) it has been used for. A 'Capacity'
+    column, if an export adds one, takes precedence.
+    """
+    capacities = {}
+    for row in rooms_data:
+        room = row.get('Room Number')
+        if room is None or room != room:
+            continue
+        capacity = row.get('Capacity')
+        if capacity is None or capacity != capacity:
+            course = course_details.get(row.get('Course Code'), {})
+            capacity = course.get('max_size', 0)
+        capacities[room] = max(capacities.get(room, 0), int(capacity))
+    return {room: capacity or default for room, capacity in capacities.items()}
+
+
+def historical_rooms(rooms_data):
+    """Room each section used last time, keyed like section_assignments"""
+    previous = {}
+    for row in rooms_data:
+        course_code = row.get('Course Code')
+        room = row.get('Room Number')
+        if isinstance(course_code, str) and room == room:
+            previous.setdefault(f"{course_code}_{row.get('Section number', 1)}", room)
+    return previous
+
+
+class RoomIndex:
+    """Rooms sorted by capacity with one occupancy bitset per block.
+
+    Bit i of occupied[block] is set while the i-th smallest room is taken in
+    that block. The smallest free room with at least `size` seats is then
+    a bisect into the capacities plus one lowest-set-bit lookup, however
+    many rooms and sections there are.
+    """
+
+    def __init__(self, capacities, blocks):
+        ordered = sorted(capacities.items(), key=lambda item: (item[1], str(item[0])))
+        self.rooms = [room for room, _ in ordered]
+        self.capacities = [capacity for _, capacity in ordered]
+        self.position = {room: i for i, room in enumerate(self.rooms)}
+        self.all_rooms = (1 << len(self.rooms)) - 1
+        self.occupied = {block: 0 for block in blocks}
+        self.booked = {}  # {section_key: (room, blocks)}
+
+    def capacity(self, room):
+        return self.capacities[self.position[room]]
+
+    def is_free(self, room, block):
+        return not self.occupied.get(block, 0) >> self.position[room] & 1
+
+    def _occupied(self, blocks):
+        occupied = 0
+        for block in blocks:
+            occupied |= self.occupied.get(block, 0)
+        return occupied
+
+    def find_room(self, blocks, size, preferred=None):
+        """Preferred room if it fits and is free in all blocks, else the smallest such room"""
+        occupied = self._occupied(blocks)
+        i = self.position.get(preferred)
+        if i is not None and self.capacities[i] >= size and not occupied >> i & 1:
+            return preferred
+        start = bisect.bisect_left(self.capacities, size)
+        free = ~occupied & self.all_rooms >> start << start
+        if not free:
+            return None
+        return self.rooms[(free & -free).bit_length() - 1]
+
+    def book(self, section_key, room, blocks):
+        for block in blocks:
+            self.occupied[block] = self.occupied.get(block, 0) | 1 << self.position[room]
+        self.booked[section_key] = (room, tuple(blocks))
+
+    def release(self, section_key):
+        room, blocks = self.booked.pop(section_key)
+        for block in blocks:
+            self.occupied[block] &= ~(1 << self.position[room])
+
+    def free_rooms(self, block, size=0):
+        """Free rooms in a block with at least `size` seats, smallest first"""
+        start = bisect.bisect_left(self.capacities, size)
+        free = ~self.occupied.get(block, 0) & self.all_rooms >> start << start
+        return [self.rooms[i] for i in range(start, len(self.rooms)) if free >> i & 1]
+
+
+def section_blocks_from_schedule(student_schedule):
+    """{section_key: [blocks]} for every section with at least one student.
+
+    Term-aware schedules list a section under each term slot it spans.
+    """
+    section_blocks = defaultdict(list)
+    for blocks in student_schedule.values():
+        for block, label in blocks.items():
+            match = SECTION_LABEL.match(label)
+            if match:
+                section = section_blocks[f"{match.group(1)}_{match.group(2)}"]
+                if block not in section:
+                    section.append(block)
+    return section_blocks
+
+
+def assign_rooms(rooms_data, student_schedule, section_assignments, course_details, blocks):
+    """Give every running section a room in its block (every term slot it spans).
+
+    Sections are placed largest first, each in the room it used last time
+    when that still fits, otherwise in the smallest free room that seats
+    the course's max_size. A section no such room is left for gets the
+    smallest free room that seats its actual enrolment instead.
+    Returns ({section_key: room details}, [section keys left without a room]).
+    """
+    index = RoomIndex(room_capacities(rooms_data, course_details), blocks)
+    previous = historical_rooms(rooms_data)
+    section_blocks = section_blocks_from_schedule(student_schedule)
+
+    def max_size(section_key):
+        course_code = section_key.rsplit('_', 1)[0]
+        return course_details.get(course_code, {}).get('max_size', DEFAULT_ROOM_CAPACITY)
+
+    room_assignments = {}
+    unroomed = []
+    for section_key in sorted(section_blocks, key=lambda key: (-max_size(key), key)):
+        blocks = section_blocks[section_key]
+        enrolled = len(section_assignments.get(section_key, []))
+        size = max_size(section_key)
+        room = index.find_room(blocks, size, previous.get(section_key))
+        fits_max_size = room is not None
+        if room is None:
+            room = index.find_room(blocks, enrolled, previous.get(section_key))
+        if room is None:
+            unroomed.append(section_key)
+            continue
+        index.book(section_key, room, blocks)
+        room_assignments[section_key] = {
+            'blocks': blocks,
+            'room': room,
+            'capacity': index.capacity(room),
+            'students': enrolled,
+            'max_size': size,
+            'fits_max_size': fits_max_size
+        }
+    return room_assignments, unroomed
+
+
+def rooms_by_block(room_assignments):
+    """{room: {block: section_key}} view of the assignments"""
+    timetable = defaultdict(dict)
+    for section_key, details in room_assignments.items():
+        for block in details['blocks']:
+            timetable[details['room']][block] = section_key
+    return timetable
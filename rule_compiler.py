@@ -0,0 +1,208 @@
+import re
+
+# Used when neither the RULES sheet nor the course list names any blocks
+DEFAULT_BLOCKS = ["1A", "1B", "2A", "2B", "3", "4A", "4B", "5A", "5B"]
+DEFAULT_PRIORITY_ORDER = ['Required', 'Requested', 'Recommended']
+DEFAULT_REQUIRED_COURSES = {
+    '1st Year': ['BIB9'],
+    '2nd Year': ['BIB10'],
+    '3rd Year': ['BIB11'],
+    '4th Year': ['BIB12']
+}
+
+# (min, target, max) section size for courses without characteristics
+DEFAULT_SIZE_BOUNDS = (5, 20, 25)
+
+BLOCK_ID = re.compile(r'["\'](\d+[A-Z]?)["\']')
+
+
+class Constraint:
+    """One typed rule. Subclasses set `kind`, parse their rule text and fill the predicate tables"""
+
+    kind = None
+    pattern = None  # regex over the rule text that selects this type
+
+    def __init__(self, rule=None, **params):
+        self.rule = rule  # 'S. No.' of the rule it came from, None if derived from the data
+        self.params = params
+
+    @classmethod
+    def parse(cls, text):
+        """Constraint parameters from a matching rule text, or None if it does not really apply"""
+        return {}
+
+    def apply(self, tables):
+        pass
+
+    def to_dict(self):
+        return {'kind': self.kind, 'rule': self.rule, **self.params}
+
+
+class BlockSet(Constraint):
+    """The blocks the school day is divided into"""
+
+    kind = 'blocks'
+    pattern = re.compile(r'blocks?\b.*\[.*\]', re.IGNORECASE | re.DOTALL)
+
+    @classmethod
+    def parse(cls, text):
+        listed = text[text.index('['):text.rindex(']')]
+        blocks = list(dict.fromkeys(BLOCK_ID.findall(listed)))
+        return {'blocks': blocks} if blocks else None
+
+
+class BalancedSections(Constraint):
+    """Sections stay within their size bounds and are filled evenly (milestone2.main then balances by default)"""
+
+    kind = 'balanced_sections'
+    pattern = re.compile(r'overcrowded|distribute .* equally', re.IGNORECASE | re.DOTALL)
+
+    def apply(self, tables):
+        tables.balanced_sections = True
+
+
+class PriorityOrder(Constraint):
+    """Request types from highest to lowest priority"""
+
+    kind = 'priority_order'
+    pattern = re.compile(r'"[^"]+"(\s*>\s*"[^"]+")+')
+
+    @classmethod
+    def parse(cls, text):
+        return {'types': re.findall(r'"([^"]+)"', cls.pattern.search(text).group(0))}
+
+    def apply(self, tables):
+        tables.priority_rank = {req_type: rank for rank, req_type in enumerate(self.params['types'])}
+
+
+class CourseLength(Constraint):
+    """A course's Length says whether it runs for one term or the full year (main then schedules per term)"""
+
+    kind = 'course_length'
+    pattern = re.compile(r'\blength\b.*\b(term|year)\b', re.IGNORECASE | re.DOTALL)
+
+    def apply(self, tables):
+        tables.term_lengths = True
+
+
+class RequiredCourses(Constraint):
+    """Courses every student of a year must take, e.g. so their requests cannot be dropped"""
+
+    kind = 'required_courses'
+
+    def apply(self, tables):
+        for year, course_codes in self.params['by_year'].items():
+            for course_code in course_codes:
+                tables.required.add((year, course_code))
+
+
+# Rule types tried in order on every rule text; the first whose pattern
+# matches (and whose parse accepts the text) wins. Adding a rule type is
+# a new Constraint subclass here, not a change to the scheduler. Rules the
+# scheduler always keeps (no double booking, mixed-year sections, the
+# courses' available and unavailable blocks) stay descriptive.
+RULE_TYPES = [BlockSet, BalancedSections, PriorityOrder, CourseLength]
+
+CONSTRAINT_TYPES = {cls.kind: cls for cls in RULE_TYPES + [RequiredCourses]}
+
+
+def parse_rules(rules_data):
+    """Typed constraints for the RULES sheet rows, plus the rule texts no type recognised"""
+    constraints = []
+    descriptive = []
+    for row in rules_data:
+        text = row.get('RULES')
+        if not isinstance(text, str):
+            continue
+        for rule_type in RULE_TYPES:
+            if rule_type.pattern.search(text):
+                params = rule_type.parse(text)
+                if params is not None:
+                    constraints.append(rule_type(row.get('S. No.'), **params))
+                    break
+        else:
+            descriptive.append(text)
+    return constraints, descriptive
+
+
+def required_courses_from_requests(requests, required_type):
+    """{college year: [course codes]} with a request of the required type, in first-seen order"""
+    by_year = {}
+    for req in requests:
+        if req.get('Type') == required_type:
+            year, course_code = req.get('College Year'), req.get('Course code')
+            if isinstance(year, str) and isinstance(course_code, str):
+                courses = by_year.setdefault(year, [])
+                if course_code not in courses:
+                    courses.append(course_code)
+    return by_year
+
+
+def constraint_from_dict(entry):
+    params = {key: value for key, value in entry.items() if key not in ('kind', 'rule')}
+    return CONSTRAINT_TYPES[entry['kind']](entry.get('rule'), **params)
+
+
+class ConstraintTables:
+    """Precompiled predicate tables over the constraints.
+
+    Everything generate_schedule asks per course or per request is a dict
+    lookup or a bit test here: the blocks a course may run in (already in
+    preference order, with unavailable blocks removed), a request's
+    priority rank, the required courses and the section size bounds.
+    """
+
+    def __init__(self, blocks):
+        self.blocks = list(blocks)
+        self.block_bits = {block: 1 << i for i, block in enumerate(self.blocks)}
+        self.priority_rank = {req_type: rank for rank, req_type in enumerate(DEFAULT_PRIORITY_ORDER)}
+        self.required = set()                # {(college year, course_code)}
+        self.balanced_sections = False   # fill sections evenly (balance mode)
+        self.term_lengths = False        # schedule per term by Length (term-aware mode)
+        self.course_blocks = {}       # {course_code: [blocks]}
+        self.course_block_masks = {}  # {course_code: block bitmask}
+        self.size_bounds = {}         # {course_code: (min, target, max)}
+
+    def block_allowed(self, course_code, block):
+        mask = self.course_block_masks.get(course_code)
+        bit = self.block_bits.get(block, 0)
+        return bool(bit & mask) if mask is not None else bool(bit)
+
+    def blocks_for(self, course_code):
+        return self.course_blocks.get(course_code, self.blocks)
+
+    def bounds(self, course_code):
+        return self.size_bounds.get(course_code, DEFAULT_SIZE_BOUNDS)
+
+    def request_rank(self, req, default=None):
+        """Priority rank of a request's Type (0 is highest), or default for a type outside the order.
+
+        A required course does not promote its requests: only those of the
+        required type rank first, an elective request for the same course
+        keeps its own type's rank.
+        """
+        return self.priority_rank.get(req.get('Type', ''), default)
+
+
+def compile_constraints(rules, course_details):
+    """ConstraintTables for rules['constraints'] and the courses' own block and size columns"""
+    tables = ConstraintTables(rules['all_blocks'])
+    for entry in rules.get('constraints', []):
+        constraint_from_dict(entry).apply(tables)
+
+    for course_code in course_details:
+        course = course_details[course_code]
+        unavailable = set(course.get('unavailable_blocks', []))
+        blocks = [block for block in course.get('available_blocks', tables.blocks)
+                  if block not in unavailable and block in tables.block_bits]
+        mask = 0
+        for block in blocks:
+            mask |= tables.block_bits[block]
+        tables.course_blocks[course_code] = blocks
+        tables.course_block_masks[course_code] = mask
+        tables.size_bounds[course_code] = (
+            course.get('min_size', DEFAULT_SIZE_BOUNDS[0]),
+            course.get('target_size', DEFAULT_SIZE_BOUNDS[1]),
+            course.get('max_size', DEFAULT_SIZE_BOUNDS[2])
+        )
+    return tables
@@ -0,0 +1,204 @@
+import argparse
+import json
+import multiprocessing
+import os
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+
+from cli_args import add_scenario_arguments
+from memo import memoized, open_memo
+from milestone2 import analyze_schedule, extract_rules_and_constraints, generate_schedule, load_cleaned_data, \
+    preprocess_data
+from rule_compiler import compile_constraints
+from schedule_index import ScheduleIndex
+
+# A scenarios file is a JSON list of what-if questions, each a set of
+# overrides on the base data:
+#
+#   [{"name": "BIB10 x3", "courses": {"BIB10": {"num_sections": 3}}},
+#    {"name": "5361519 out in 4A", "lecturer_unavailable": {"5361519": ["4A"]}},
+#    {"name": "no block 3", "closed_blocks": ["3"]}]
+#
+# "courses" overrides any course_details field (num_sections, max_size,
+# available_blocks, unavailable_blocks, ...), "lecturer_unavailable" keeps
+# lecturers out of blocks, and "closed_blocks" takes blocks out altogether.
+# The base scenario (no overrides) always runs first for comparison.
+BASE_SCENARIO = {'name': 'base'}
+
+# Base inputs shared with the workers, as in parallel.py: inherited
+# copy-on-write under 'fork', sent once per worker otherwise
+_SHARED = {}
+
+
+def _init_worker(shared):
+    _SHARED.update(shared)
+
+
+class CourseOverlay(Mapping):
+    """Read-only view of course_details with a scenario's changes on top.
+
+    The base dict is never copied or modified: a course's merged details
+    are built the first time it is looked up, and only for that course.
+    """
+
+    def __init__(self, base, overrides=None, closed_blocks=()):
+        self.base = base
+        self.overrides = overrides or {}
+        self.closed_blocks = set(closed_blocks)
+        self._merged = {}
+
+    def __getitem__(self, course_code):
+        if course_code not in self._merged:
+            if course_code in self.base:
+                course = dict(self.base[course_code], **self.overrides.get(course_code, {}))
+            else:
+                course = dict(self.overrides[course_code])
+            if self.closed_blocks and 'available_blocks' in course:
+                course['available_blocks'] = [block for block in course['available_blocks']
+                                              if block not in self.closed_blocks]
+            self._merged[course_code] = course
+        return self._merged[course_code]
+
+    def __iter__(self):
+        yield from self.base
+        for course_code in self.overrides:
+            if course_code not in self.base:
+                yield course_code
+
+    def __len__(self):
+        return len(self.base) + sum(1 for course_code in self.overrides if course_code not in self.base)
+
+    def __contains__(self, course_code):
+        return course_code in self.base or course_code in self.overrides
+
+
+def apply_scenario(rules, preprocessed_data, scenario):
+    """Scenario rules and preprocessed data as shallow overlays on the base.
+
+    Only the top-level dicts are copied; course_details becomes a
+    CourseOverlay, the constraint tables are recompiled over it, and
+    everything else (requests, lecturers) is shared.
+    """
+    closed_blocks = scenario.get('closed_blocks', [])
+    scenario_rules = rules
+    if closed_blocks:
+        scenario_rules = dict(rules, all_blocks=[block for block in rules['all_blocks'] if block not in closed_blocks])
+    scenario_data = preprocessed_data
+    if scenario.get('courses') or closed_blocks:
+        course_details = CourseOverlay(preprocessed_data['course_details'], scenario.get('courses'), closed_blocks)
+        scenario_data = dict(preprocessed_data, course_details=course_details,
+                             constraints=compile_constraints(scenario_rules, course_details))
+    return scenario_rules, scenario_data
+
+
+def lecturer_ids(preprocessed_data):
+    """{str(lecturer_id): lecturer_id}, since JSON object keys are always strings"""
+    return {str(lecturer_id): lecturer_id for lecturer_id in preprocessed_data['course_to_lecturer'].values()}
+
+
+def scenario_index(rules, preprocessed_data, scenario):
+    """ScheduleIndex with the scenario's unavailable lecturers already booked out"""
+    index = ScheduleIndex(rules['all_blocks'])
+    known = lecturer_ids(preprocessed_data)
+    for lecturer, blocks in scenario.get('lecturer_unavailable', {}).items():
+        lecturer_id = known.get(str(lecturer), lecturer)
+        for block in blocks:
+            index.lecturer_masks[lecturer_id] |= index.bit(block)
+    return index
+
+
+def summarize(name, analysis):
+    """One comparison row from a schedule analysis"""
+    fill_rates = [section['fill_rate'] for section in analysis['section_fill_rates'].values()]
+    return {
+        'scenario': name,
+        'satisfaction_rate': analysis['satisfaction_rate'],
+        'avg_fill_rate': sum(fill_rates) / len(fill_rates) if fill_rates else 0,
+        'min_fill_rate': min(fill_rates) if fill_rates else 0,
+        'max_fill_rate': max(fill_rates) if fill_rates else 0,
+        'sections_created': analysis['sections_created'],
+        'request_types': analysis['request_types']
+    }
+
+
+def run_scenario(scenario):
+    """Schedule one scenario against the shared base state and summarize it"""
+    data, rules, preprocessed_data = _SHARED['data'], _SHARED['rules'], _SHARED['preprocessed_data']
+    scenario_rules, scenario_data = apply_scenario(rules, preprocessed_data, scenario)
+    index = scenario_index(scenario_rules, scenario_data, scenario)
+    student_schedule, teacher_schedule, resolved, unresolved, section_assignments = generate_schedule(
+        data, scenario_rules, scenario_data, index=index, placement=scenario.get('placement', 'greedy')
+    )
+    analysis = analyze_schedule(student_schedule, teacher_schedule, resolved, unresolved,
+                                section_assignments, scenario_data['course_details'])
+    return summarize(scenario.get('name', 'unnamed'), analysis)
+
+
+def run_scenarios(data, rules, preprocessed_data, scenarios, workers=None):
+    """Run the base scenario and every given scenario, in parallel when workers > 1.
+
+    The base state is loaded and preprocessed once by the caller; each
+    scenario only builds its overlays, so a batch costs one scheduling
+    pass per scenario. Returns the summary rows in scenario order.
+    """
+    scenarios = [BASE_SCENARIO] + list(scenarios)
+    workers = workers or min(len(scenarios), os.cpu_count() or 1)
+    shared = {'data': data, 'rules': rules, 'preprocessed_data': preprocessed_data}
+
+    if workers <= 1:
+        _SHARED.update(shared)
+        try:
+            return [run_scenario(scenario) for scenario in scenarios]
+        finally:
+            _SHARED.clear()
+
+    if 'fork' in multiprocessing.get_all_start_methods():
+        _SHARED.update(shared)
+        pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork'))
+    else:
+        pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(shared,))
+    try:
+        with pool:
+            return list(pool.map(run_scenario, scenarios))
+    finally:
+        _SHARED.clear()
+
+
+def comparison_table(rows):
+    """Markdown table of the scenario rows, with the change in satisfaction against the base"""
+    from tabulate import tabulate
+    base_rate = rows[0]['satisfaction_rate'] if rows else 0
+    table = [
+        [row['scenario'], f"{row['satisfaction_rate']:.2f}%", f"{row['satisfaction_rate'] - base_rate:+.2f}",
+         f"{row['avg_fill_rate']:.1f}%", f"{row['min_fill_rate']:.1f}%", f"{row['max_fill_rate']:.1f}%",
+         row['sections_created']]
+        for row in rows
+    ]
+    headers = ['Scenario', 'Satisfaction', 'vs base', 'Avg fill', 'Min fill', 'Max fill', 'Sections']
+    return tabulate(table, headers=headers, tablefmt='pipe')
+
+
+def main(scenario_file, data_file='cleaned_data.json', workers=None, output=None):
+    with open(scenario_file, 'r') as f:
+        scenarios = json.load(f)
+
+    print("Loading and preprocessing data once...")
+    data = load_cleaned_data(data_file)
+    memo, fingerprint = open_memo(data_file)
+    rules = memoized(memo, fingerprint, None, extract_rules_and_constraints, data)
+    preprocessed_data = memoized(memo, fingerprint, rules, preprocess_data, data, rules)
+
+    print(f"Running {len(scenarios)} scenarios plus the base...")
+    rows = run_scenarios(data, rules, preprocessed_data, scenarios, workers)
+    print(comparison_table(rows))
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(rows, f, indent=4)
+        print(f"Scenario results saved to '{output}'")
+    return rows
+
+
+if __name__ == "__main__":
+    args = add_scenario_arguments(argparse.ArgumentParser(description="Run what-if scenarios")).parse_args()
+    main(args.scenarios, args.data, args.workers, args.output)
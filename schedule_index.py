@@ -0,0 +1,223 @@
+import heapq
+from collections import defaultdict
+
+
+class ScheduleIndex:
+    """Constraint index over a schedule in progress.
+
+    Keeps per-student and per-lecturer block bitmasks, per-section free
+    capacity counters and, for every course, the ordered list of sections
+    that still have room. Every check the scheduler makes ("is this student
+    free in this block?", "does this section have a seat?") becomes a bit
+    test or a counter lookup instead of a scan over dicts and section keys.
+
+    With terms > 1 every block gets one bit per term, so a mask covers
+    term x block slots. A section then occupies only the slots of the terms
+    it runs in, and term-disjoint sections can share a block. bit(block)
+    still covers all terms of the block.
+    """
+
+    def __init__(self, blocks, terms=1):
+        self.terms = terms
+        self.blocks = []
+        self.block_bits = {}
+        for block in blocks:
+            self.bit(block)
+
+        self.student_masks = defaultdict(int)   # {student_id: slot bitmask}
+        self.lecturer_masks = defaultdict(int)  # {lecturer_id: slot bitmask}
+
+        self.section_blocks = {}    # {section_key: block}
+        self.section_terms = {}     # {section_key: (term, ...)} the section runs in
+        self.section_masks = {}     # {section_key: slot bitmask}
+        self.section_course = {}    # {section_key: course_code}
+        self.section_number = {}    # {section_key: section_num}
+        self.section_lecturer = {}  # {section_key: lecturer_id}
+        self.section_free = {}      # {section_key: free seats}
+        self.section_capacity = {}  # {section_key: seats}
+        self.course_sections = defaultdict(list)  # {course_code: [section_key]} in section order
+        self.open_sections = defaultdict(list)    # {course_code: [section_key]} with free seats
+        self.student_sections = defaultdict(dict)  # {student_id: {course_code: section_key}}
+        self.load_heaps = {}  # {course_code: [(seated, section_num, section_key)]}, see find_least_loaded
+
+    def bit(self, block):
+        """Return the bitmask for a block (all its terms), registering unseen blocks"""
+        if block not in self.block_bits:
+            self.block_bits[block] = ((1 << self.terms) - 1) << (len(self.blocks) * self.terms)
+            self.blocks.append(block)
+        return self.block_bits[block]
+
+    def slot_mask(self, block, terms=None):
+        """Bitmask for a block in the given terms (None: every term)"""
+        bits = self.bit(block)
+        if terms is None:
+            return bits
+        first = (bits & -bits).bit_length() - 1
+        mask = 0
+        for term in terms:
+            mask |= 1 << (first + term)
+        return mask
+
+    def blocks_in(self, mask):
+        """Expand a bitmask back into block names"""
+        return [block for block in self.blocks if mask & self.block_bits[block]]
+
+    def place_section(self, section_key, course_code, section_num, lecturer_id, block, capacity, terms=None):
+        """Record that a section runs in a block (in the given terms) and book its lecturer"""
+        if section_key not in self.section_blocks:
+            self.section_course[section_key] = course_code
+            self.section_number[section_key] = section_num
+            self.section_free[section_key] = capacity
+            self.section_capacity[section_key] = capacity
+            self.course_sections[course_code].append(section_key)
+            if capacity > 0:
+                self.open_sections[course_code].append(section_key)
+        self.section_blocks[section_key] = block
+        self.section_terms[section_key] = terms
+        self.section_masks[section_key] = mask = self.slot_mask(block, terms)
+        self.section_lecturer[section_key] = lecturer_id
+        self.lecturer_masks[lecturer_id] |= mask
+
+    def lecturer_free(self, lecturer_id, block, terms=None):
+        return not self.lecturer_masks[lecturer_id] & self.slot_mask(block, terms)
+
+    def student_free(self, student_id, block, terms=None):
+        return not self.student_masks[student_id] & self.slot_mask(block, terms)
+
+    def find_section(self, student_id, course_code, start_term=None):
+        """Return the first section of a course with a free seat in a block the student has free.
+
+        start_term restricts the search to sections whose first term it is.
+        """
+        busy = self.student_masks[student_id]
+        for section_key in self.open_sections[course_code]:
+            if start_term is not None and (self.section_terms[section_key] or (0,))[0] != start_term:
+                continue
+            if not busy & self.section_masks[section_key]:
+                return section_key
+        return None
+
+    def seated(self, section_key):
+        return self.section_capacity[section_key] - self.section_free[section_key]
+
+    def _push_load(self, section_key):
+        heap = self.load_heaps.get(self.section_course[section_key])
+        if heap is not None and self.section_free[section_key] > 0:
+            heapq.heappush(heap, (self.seated(section_key), self.section_number[section_key], section_key))
+
+    def find_least_loaded(self, student_id, course_code, start_term=None):
+        """Return the open section of a course with the fewest students, in a block the student has free.
+
+        Each course keeps a heap of (seated, section_num, section_key). Seat
+        changes push a fresh entry and leave the old one behind; entries
+        whose count no longer matches (or whose section is full or gone)
+        are dropped when they surface. Sections the student cannot take
+        are set aside and pushed back, so a probe costs O(log sections)
+        plus the sections skipped.
+        """
+        heap = self.load_heaps.get(course_code)
+        if heap is None:
+            heap = self.load_heaps[course_code] = [
+                (self.seated(key), self.section_number[key], key) for key in self.open_sections[course_code]
+            ]
+            heapq.heapify(heap)
+        busy = self.student_masks[student_id]
+        skipped = []
+        found = None
+        while heap:
+            seated, _, section_key = heap[0]
+            if (section_key not in self.section_free or self.section_free[section_key] == 0
+                    or seated != self.seated(section_key)):
+                heapq.heappop(heap)
+                continue
+            if (start_term is not None and (self.section_terms[section_key] or (0,))[0] != start_term) \
+                    or busy & self.section_masks[section_key]:
+                skipped.append(heapq.heappop(heap))
+                continue
+            found = section_key
+            break
+        for entry in skipped:
+            heapq.heappush(heap, entry)
+        return found
+
+    def assign_student(self, student_id, section_key):
+        """Seat a student in a section, closing the section once it is full"""
+        course_code = self.section_course[section_key]
+        self.student_masks[student_id] |= self.section_masks[section_key]
+        self.student_sections[student_id][course_code] = section_key
+        self.section_free[section_key] -= 1
+        if self.section_free[section_key] == 0:
+            self.open_sections[course_code].remove(section_key)
+        self._push_load(section_key)
+
+    def unassign_student(self, student_id, section_key):
+        """Free a student's seat and block, reopening the section if it was full"""
+        course_code = self.section_course[section_key]
+        self.student_masks[student_id] &= ~self.section_masks[section_key]
+        del self.student_sections[student_id][course_code]
+        self.section_free[section_key] += 1
+        if self.section_free[section_key] == 1:
+            # Keep open sections in section order so probing stays deterministic
+            self.open_sections[course_code] = [
+                key for key in self.course_sections[course_code] if self.section_free[key] > 0
+            ]
+        self._push_load(section_key)
+
+    def remove_section(self, section_key):
+        """Cancel an empty section and free its lecturer's block"""
+        course_code = self.section_course.pop(section_key)
+        self.course_sections[course_code].remove(section_key)
+        if section_key in self.open_sections[course_code]:
+            self.open_sections[course_code].remove(section_key)
+        lecturer_id = self.section_lecturer.pop(section_key)
+        self.lecturer_masks[lecturer_id] &= ~self.section_masks.pop(section_key)
+        for table in (self.section_blocks, self.section_terms, self.section_number, self.section_free,
+                      self.section_capacity):
+            del table[section_key]
+
+    def move_section(self, section_key, block, students):
+        """Move a section and its enrolled students to another block"""
+        old_bit = self.section_masks[section_key]
+        new_bit = self.slot_mask(block, self.section_terms[section_key])
+        self.section_blocks[section_key] = block
+        self.section_masks[section_key] = new_bit
+        lecturer_id = self.section_lecturer[section_key]
+        self.lecturer_masks[lecturer_id] = (self.lecturer_masks[lecturer_id] & ~old_bit) | new_bit
+        for student_id in students:
+            self.student_masks[student_id] = (self.student_masks[student_id] & ~old_bit) | new_bit
+
+    @classmethod
+    def from_schedule(cls, blocks, section_blocks, section_assignments, teacher_schedule,
+                      course_details, course_to_lecturer, terms=1, section_terms=None):
+        """Rebuild the index from the dicts generate_schedule returns.
+
+        A term-aware schedule passes its term count and {section_key: terms};
+        its teacher schedule is then keyed by term slot ('1A-T2').
+        """
+        index = cls(blocks, terms)
+        section_terms = section_terms or {}
+        for lecturer_id, booked in teacher_schedule.items():
+            for key in booked:
+                block, term = key, None
+                if terms > 1:
+                    block, _, term = key.rpartition('-T')
+                    term = (int(term) - 1,)
+                index.lecturer_masks[lecturer_id] |= index.slot_mask(block, term)
+
+        # Place sections in course/section order so open lists come out sorted
+        def section_order(section_key):
+            course_code, _, section_num = section_key.rpartition('_')
+            return course_code, int(section_num)
+
+        for section_key in sorted(section_blocks, key=section_order):
+            course_code, section_num = section_order(section_key)
+            lecturer_id = course_to_lecturer.get(section_key, f"unknown_{course_code}")
+            max_size = course_details.get(course_code, {}).get('max_size', 25)
+            index.place_section(section_key, course_code, section_num, lecturer_id,
+                                section_blocks[section_key], max_size, section_terms.get(section_key))
+
+        for section_key, students in section_assignments.items():
+            if section_key in section_blocks:
+                for student_id in students:
+                    index.assign_student(student_id, section_key)
+        return index
@@ -0,0 +1,216 @@
+import argparse
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+from cli_args import add_service_arguments
+from incremental import IncrementalScheduler, normalize_id
+from intake import RequestIntake
+from memo import memoized, open_memo
+from milestone2 import _json_default, extract_rules_and_constraints, load_cleaned_data, preprocess_data
+from rule_compiler import compile_constraints
+
+# Endpoints (all JSON):
+#
+#   GET  /health                     loaded counts and request satisfaction
+#   GET  /students/<id>              a student's blocks, sections and waitlist
+#   GET  /teachers/<id>              a lecturer's blocks
+#   GET  /sections/<key>             a section's block, lecturer and students
+#   POST /requests                   {"added": [request, ...], "removed": [request, ...]}
+#   POST /sections/<key>/rerun       {"block": "2A"} (optional) reseat the section
+#
+# Requests are the same dicts as cleaned_data.json's student_requests.
+# Reads are dict lookups on the latest committed snapshot; writes are
+# validated, batched with any concurrent ones and applied to the warm
+# IncrementalScheduler, and return the batch's assignment changes.
+
+
+class ScheduleService:
+    """The schedule kept in memory, with the lookups and changes the API serves.
+
+    Reads come from the intake's current Snapshot and never wait on
+    writes. Request changes and section reruns go through the
+    RequestIntake, which commits them in micro-batches on its writer.
+    """
+
+    def __init__(self, data, rules, preprocessed_data):
+        self.rules = rules
+        self.constraints = preprocessed_data.get('constraints') or \
+            compile_constraints(rules, preprocessed_data['course_details'])
+        self.scheduler = IncrementalScheduler.from_run(data, rules, preprocessed_data)
+        self.intake = RequestIntake(self.scheduler, self.constraints)
+        self.intake.start_thread()
+        self.started = time.time()
+
+    @classmethod
+    def load(cls, data_file='cleaned_data.json', use_memo=True):
+        print(f"Loading '{data_file}'...")
+        data = load_cleaned_data(data_file)
+        memo, fingerprint = open_memo(data_file, use_memo)
+        rules = memoized(memo, fingerprint, None, extract_rules_and_constraints, data)
+        preprocessed_data = memoized(memo, fingerprint, rules, preprocess_data, data, rules)
+        print("Generating the initial schedule...")
+        return cls(data, rules, preprocessed_data)
+
+    def health(self):
+        snapshot = self.intake.snapshot
+        total = snapshot.resolved + snapshot.unresolved
+        return 200, {
+            'status': 'ok',
+            'uptime_seconds': round(time.time() - self.started, 1),
+            'version': snapshot.version,
+            'students_scheduled': sum(1 for view in snapshot.students.values() if view['schedule']),
+            'sections': len(snapshot.sections),
+            'resolved_requests': snapshot.resolved,
+            'unresolved_requests': snapshot.unresolved,
+            'satisfaction_rate': snapshot.resolved / total * 100 if total else 0
+        }
+
+    def student(self, text):
+        view = self.intake.snapshot.students.get(normalize_id(text))
+        if view is None:
+            return 404, {'error': f"No schedule or requests for student '{text}'"}
+        return 200, view
+
+    def teacher(self, text):
+        view = self.intake.snapshot.teachers.get(normalize_id(text))
+        if view is None:
+            return 404, {'error': f"No schedule for lecturer '{text}'"}
+        return 200, view
+
+    def section(self, section_key):
+        view = self.intake.snapshot.sections.get(section_key)
+        if view is None:
+            return 404, {'error': f"No section '{section_key}'"}
+        return 200, view
+
+    def change_requests(self, body):
+        try:
+            outcome = self.intake.run_threadsafe(self.intake.submit(body.get('added', []), body.get('removed', [])))
+        except ValueError as e:
+            return 400, {'error': str(e)}
+        return 200, outcome
+
+    def rerun_section(self, section_key, body):
+        block = body.get('block')
+        if block is not None and not isinstance(block, str):
+            return 400, {'error': f"'block' must be a block name, got {block!r}"}
+        return self.intake.run_threadsafe(self.intake.call(self._rerun, section_key, block))
+
+    def _rerun(self, scheduler, section_key, block):
+        """Runs on the intake's writer; returns ((status, payload), changes)"""
+        index = scheduler.index
+        if section_key not in index.section_blocks:
+            return (404, {'error': f"No section '{section_key}'"}), []
+        if block is not None and block != index.section_blocks[section_key]:
+            course_code = index.section_course[section_key]
+            if not self.constraints.block_allowed(course_code, block):
+                return (409, {'error': f"{course_code} cannot run in block '{block}'"}), []
+            if not index.lecturer_free(index.section_lecturer[section_key], block, index.section_terms[section_key]):
+                return (409, {'error': f"The lecturer of {section_key} is already teaching in block '{block}'"}), []
+            # A course's sections run in distinct blocks
+            for other_key in index.course_sections[course_code]:
+                if other_key != section_key and index.section_blocks[other_key] == block:
+                    return (409, {'error': f"{other_key} already runs in block '{block}'"}), []
+        changes = scheduler.rerun_section(section_key, block)
+        return (200, {'changes': changes}), changes
+
+
+class ScheduleHandler(BaseHTTPRequestHandler):
+    service = None  # set by make_server
+    verbose = False
+
+    def _send(self, status, payload):
+        body = json.dumps(payload, default=_json_default).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _path(self):
+        return [unquote(part) for part in self.path.split('?', 1)[0].strip('/').split('/')]
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        body = json.loads(self.rfile.read(length))
+        if not isinstance(body, dict):
+            raise ValueError("request body must be a JSON object")
+        return body
+
+    def _dispatch(self, route):
+        # Whatever goes wrong, the client gets a JSON error rather than a dropped connection
+        try:
+            route()
+        except Exception as e:
+            self._send(500, {'error': f"{type(e).__name__}: {e}"})
+
+    def do_GET(self):
+        self._dispatch(self._get)
+
+    def do_POST(self):
+        self._dispatch(self._post)
+
+    def _get(self):
+        parts = self._path()
+        if parts == ['health']:
+            self._send(*self.service.health())
+        elif len(parts) == 2 and parts[0] == 'students':
+            self._send(*self.service.student(parts[1]))
+        elif len(parts) == 2 and parts[0] == 'teachers':
+            self._send(*self.service.teacher(parts[1]))
+        elif len(parts) == 2 and parts[0] == 'sections':
+            self._send(*self.service.section(parts[1]))
+        else:
+            self._send(404, {'error': f"Unknown endpoint '{self.path}'"})
+
+    def _post(self):
+        parts = self._path()
+        try:
+            body = self._body()
+        except ValueError as e:
+            self._send(400, {'error': f"Invalid JSON body: {e}"})
+            return
+        if parts == ['requests']:
+            self._send(*self.service.change_requests(body))
+        elif len(parts) == 3 and parts[0] == 'sections' and parts[2] == 'rerun':
+            self._send(*self.service.rerun_section(parts[1], body))
+        else:
+            self._send(404, {'error': f"Unknown endpoint '{self.path}'"})
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            super().log_message(format, *args)
+
+
+class ScheduleServer(ThreadingHTTPServer):
+    # Counselors submit in bursts; the default backlog of 5 resets connections
+    request_queue_size = 128
+
+
+def make_server(service, host='127.0.0.1', port=8000, verbose=False):
+    handler = type('Handler', (ScheduleHandler,), {'service': service, 'verbose': verbose})
+    return ScheduleServer((host, port), handler)
+
+
+def main(data_file='cleaned_data.json', host='127.0.0.1', port=8000, use_memo=True, verbose=False):
+    service = ScheduleService.load(data_file, use_memo)
+    _, stats = service.health()
+    print(f"Schedule ready: {stats['students_scheduled']} students, {stats['sections']} sections, "
+          f"{stats['satisfaction_rate']:.2f}% of requests satisfied")
+    server = make_server(service, host, port, verbose)
+    print(f"Serving on http://{host}:{server.server_address[1]} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    args = add_service_arguments(argparse.ArgumentParser(description="Serve schedules over HTTP")).parse_args()
+    main(args.data, args.host, args.port, not args.no_memo, args.verbose)
@@ -0,0 +1,337 @@
+import multiprocessing
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from incremental import request_key
+from instrumentation import TRACER
+from milestone2 import generate_schedule
+from rule_compiler import compile_constraints
+from scenarios import CourseOverlay
+from schedule_index import ScheduleIndex
+
+# Shard specs shared with the workers, as in parallel.py: inherited
+# copy-on-write under 'fork', sent once per worker otherwise
+_SHARED = {}
+
+
+def _init_worker(shared):
+    _SHARED.update(shared)
+
+
+def component_units(student_ids):
+    """{unit: [student IDs]} for the connected components of the student-course graph.
+
+    Two students land in the same unit when they share a course, directly
+    or through other students, so units never share a course.
+    """
+    parent = list(range(len(student_ids)))  # union-find over course positions
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    first_course = {}  # {student_id: position of a course they request}
+    for i, course_students in enumerate(student_ids.values()):
+        for student_id in course_students:
+            if student_id in first_course:
+                root, other = find(first_course[student_id]), find(i)
+                if root != other:
+                    parent[other] = root
+            else:
+                first_course[student_id] = i
+
+    units = defaultdict(list)
+    for student_id, i in first_course.items():
+        units[find(i)].append(student_id)
+    return units
+
+
+def year_units(course_requests, student_ids):
+    """{college year: [student IDs]}, each student under the year of their first request"""
+    year_of = {}
+    for course_code, requests in course_requests.items():
+        for student_id, req in zip(student_ids[course_code], requests):
+            if student_id not in year_of:
+                year_of[student_id] = req.get('College Year')
+    units = defaultdict(list)
+    for student_id, year in year_of.items():
+        units[year if isinstance(year, str) else None].append(student_id)
+    return units
+
+
+def partition_requests(course_requests, shards, shard_by='year'):
+    """Split the requests into at most `shards` groups that never split a student.
+
+    Students are grouped into units (by year, or by connected component),
+    and the units packed into shards largest first, each into the shard
+    with the fewest requests so far. Requests without a student ID follow
+    their unit too (they all share the '' student). Returns a list of
+    {course_code: [requests]} in priority order, largest shard first.
+    """
+    student_ids = {course_code: [req.get('student ID', '') for req in requests]
+                   for course_code, requests in course_requests.items()}
+    if shard_by == 'year':
+        units = year_units(course_requests, student_ids)
+    else:
+        units = component_units(student_ids)
+    load = defaultdict(int)
+    for course_students in student_ids.values():
+        for student_id in course_students:
+            load[student_id] += 1
+    unit_loads = sorted(((sum(load[s] for s in students), students) for students in units.values()),
+                        key=lambda entry: -entry[0])
+
+    shard_loads = [0] * max(1, min(shards, len(unit_loads)))
+    shard_of = {}
+    for unit_load, students in unit_loads:
+        shard = shard_loads.index(min(shard_loads))
+        shard_loads[shard] += unit_load
+        for student_id in students:
+            shard_of[student_id] = shard
+
+    partitions = [defaultdict(list) for _ in shard_loads]
+    for course_code, requests in course_requests.items():
+        for student_id, req in zip(student_ids[course_code], requests):
+            partitions[shard_of[student_id]][course_code].append(req)
+    order = sorted(range(len(partitions)), key=lambda shard: -shard_loads[shard])
+    return [dict(partitions[shard]) for shard in order if shard_loads[shard]]
+
+
+def apportion_sections(partitions, course_details, constraints):
+    """{course_code: [sections per shard]} within each course's 'Number of sections'.
+
+    Each shard asks for the sections its own demand needs. When a shared
+    course has too few sections for every ask, they go one at a time to
+    the shard with the most demand still unseated.
+    """
+    allotment = {}
+    courses = {course_code for partition in partitions for course_code in partition}
+    for course_code in courses:
+        num_sections = course_details.get(course_code, {}).get('num_sections', 1)
+        _, _, max_size = constraints.bounds(course_code)
+        demand = [len(partition.get(course_code, ())) for partition in partitions]
+        wanted = [(shard_demand + max_size - 1) // max_size for shard_demand in demand]
+        if sum(wanted) <= num_sections:
+            allotment[course_code] = wanted
+            continue
+        given = [0] * len(partitions)
+        for _ in range(num_sections):
+            shard = max(range(len(partitions)), key=lambda s: (demand[s] - given[s] * max_size, -s))
+            given[shard] += 1
+        allotment[course_code] = given
+    return allotment
+
+
+def section_offsets(allotment):
+    """{course_code: [first section number - 1 per shard]} so shards number their sections apart"""
+    offsets = {}
+    for course_code, counts in allotment.items():
+        offsets[course_code] = [sum(counts[:shard]) for shard in range(len(counts))]
+    return offsets
+
+
+def shard_data(preprocessed_data, partition, allotment, offsets, shard):
+    """Preprocessed data for one shard: its requests, its share of each course's sections and their lecturers"""
+    course_to_lecturer = preprocessed_data['course_to_lecturer']
+    shard_lecturers = dict(course_to_lecturer)
+    overrides = {}
+    for course_code in partition:
+        overrides[course_code] = {'num_sections': allotment[course_code][shard]}
+        offset = offsets[course_code][shard]
+        if offset:
+            for section_num in range(1, allotment[course_code][shard] + 1):
+                shard_lecturers[f"{course_code}_{section_num}"] = course_to_lecturer.get(
+                    f"{course_code}_{offset + section_num}", f"unknown_{course_code}")
+    return dict(preprocessed_data, course_requests=partition, course_to_lecturer=shard_lecturers,
+                course_details=CourseOverlay(preprocessed_data['course_details'], overrides))
+
+
+def run_shard(shard):
+    """Worker: schedule one shard; returns its sections under their global keys, with
+    (student, request position, rank) seats, and the (rank, position) of unseated requests"""
+    data, rules, preprocessed_data = _SHARED['data'], _SHARED['rules'], _SHARED['preprocessed_data']
+    partition, offsets = _SHARED['partitions'][shard], _SHARED['offsets']
+    index = ScheduleIndex(rules['all_blocks'])
+    _, _, resolved, unresolved, section_assignments = generate_schedule(
+        data, rules, shard_data(preprocessed_data, partition, _SHARED['allotment'], offsets, shard),
+        index=index, placement=_SHARED['placement']
+    )
+
+    sections = []
+    global_keys = {}
+    for section_key, block in index.section_blocks.items():
+        course_code = index.section_course[section_key]
+        section_num = offsets[course_code][shard] + index.section_number[section_key]
+        global_keys[section_key] = f"{course_code}_{section_num}"
+        sections.append((global_keys[section_key], course_code, section_num, index.section_lecturer[section_key],
+                         block))
+    # Priority ranks are worked out here, in parallel, for the reconciler's reseating order
+    constraints = preprocessed_data.get('constraints') or \
+        compile_constraints(rules, preprocessed_data['course_details'])
+    default_rank = len(constraints.priority_rank)
+    positions = {id(req): i for i, req in enumerate(req for requests in partition.values() for req in requests)}
+    seat_of = {request_key(req): (positions[id(req)], constraints.request_rank(req, default_rank)) for req in resolved}
+    return {
+        'sections': sections,
+        'assignments': {
+            global_keys[key]: [(student_id, *seat_of[(student_id, index.section_course[key])])
+                               for student_id in students]
+            for key, students in section_assignments.items()
+        },
+        'unresolved': [(constraints.request_rank(req, default_rank), positions[id(req)]) for req in unresolved]
+    }
+
+
+def reconcile_block(index, constraints, course_code, lecturer_id, seats, course_slots=0):
+    """Another block for a section whose lecturer or course another shard booked: the one clashing with fewest students
+
+    course_slots masks the blocks the course's sections already hold.
+    """
+    best_block, best_clashes = None, None
+    for block in constraints.blocks_for(course_code):
+        if course_slots & index.bit(block) or not index.lecturer_free(lecturer_id, block):
+            continue
+        bit = index.bit(block)
+        clashes = sum(1 for student_id, _, _ in seats if index.student_masks[student_id] & bit)
+        if best_block is None or clashes < best_clashes:
+            best_block, best_clashes = block, clashes
+    return best_block
+
+
+def reconcile(rules, preprocessed_data, partitions, results):
+    """Merge the shard schedules into one, resolving what the shards could not see.
+
+    Shards are merged in order. A section whose lecturer an earlier shard
+    already booked in its block, or whose course already has a section
+    there (each shard only keeps its own sections of a course apart),
+    moves to the free block that clashes with the fewest of its students
+    (or is dropped if there is none);
+    students it now clashes with lose the seat. Then every unseated
+    request, bumped or left over from its shard, is offered the open
+    sections of all shards in priority order, so shards short of a shared
+    course's sections use the seats of the others. Returns the five
+    generate_schedule structures and the reconciliation counts.
+    """
+    constraints = preprocessed_data.get('constraints') or \
+        compile_constraints(rules, preprocessed_data['course_details'])
+    index = ScheduleIndex(rules['all_blocks'])
+    student_schedule = defaultdict(dict)
+    teacher_schedule = defaultdict(dict)
+    section_assignments = defaultdict(list)
+    course_slots = defaultdict(int)  # {course_code: bitmask of blocks its sections hold}
+    resolved, pending = [], []
+    stats = {'sections_moved': 0, 'sections_dropped': 0, 'requests_bumped': 0, 'requests_refilled': 0}
+
+    def seat(student_id, section_key, req):
+        course_code = index.section_course[section_key]
+        label = f"{course_code} (Section {index.section_number[section_key]})"
+        student_schedule[student_id][index.section_blocks[section_key]] = label
+        section_assignments[section_key].append(student_id)
+        index.assign_student(student_id, section_key)
+        resolved.append(req)
+
+    for partition, result in zip(partitions, results):
+        requests = [req for course_requests in partition.values() for req in course_requests]
+        pending.extend((rank, requests[i]) for rank, i in result['unresolved'])
+
+        for section_key, course_code, section_num, lecturer_id, block in result['sections']:
+            seats = result['assignments'].get(section_key, [])
+            if course_slots[course_code] & index.bit(block) or not index.lecturer_free(lecturer_id, block):
+                block = reconcile_block(index, constraints, course_code, lecturer_id, seats, course_slots[course_code])
+                if block is None:
+                    stats['sections_dropped'] += 1
+                    stats['requests_bumped'] += len(seats)
+                    pending.extend((rank, requests[i]) for _, i, rank in seats)
+                    continue
+                stats['sections_moved'] += 1
+
+            _, _, max_size = constraints.bounds(course_code)
+            index.place_section(section_key, course_code, section_num, lecturer_id, block, max_size)
+            course_slots[course_code] |= index.bit(block)
+            teacher_schedule[lecturer_id][block] = f"{course_code} (Section {section_num})"
+            section_assignments.setdefault(section_key, [])
+            for student_id, i, rank in seats:
+                if index.student_free(student_id, block):
+                    seat(student_id, section_key, requests[i])
+                else:
+                    stats['requests_bumped'] += 1
+                    pending.append((rank, requests[i]))
+
+    unresolved = []
+    pending.sort(key=lambda entry: entry[0])
+    for _, req in pending:
+        student_id, course_code = request_key(req)
+        section_key = None
+        if student_id and course_code not in index.student_sections[student_id]:
+            section_key = index.find_section(student_id, course_code)
+        if section_key is None:
+            unresolved.append(req)
+        else:
+            seat(student_id, section_key, req)
+            stats['requests_refilled'] += 1
+    TRACER.count('sections_moved', stats['sections_moved'])
+    TRACER.count('requests_refilled', stats['requests_refilled'])
+
+    student_schedule_dict = {student: dict(blocks) for student, blocks in student_schedule.items()}
+    teacher_schedule_dict = {teacher: dict(blocks) for teacher, blocks in teacher_schedule.items()}
+    return (student_schedule_dict, teacher_schedule_dict, resolved, unresolved, section_assignments), stats
+
+
+def sharded_schedule(data, rules, preprocessed_data, shards=None, shard_by='year', placement='greedy',
+                     workers=None):
+    """Schedule weakly coupled shards of the students in parallel, then reconcile them.
+
+    The requests are partitioned by college year or by connected
+    component (partition_requests), each course's sections are shared out
+    between the shards that request it (apportion_sections), and every
+    shard runs generate_schedule in its own process. Workers send back
+    only section placements and request positions. reconcile() then fixes
+    lecturers double-booked and courses run twice in one block across
+    shards, and reseats what is left over.
+    Returns (generate_schedule results, info).
+    """
+    shards = shards or os.cpu_count() or 1
+    constraints = preprocessed_data.get('constraints') or \
+        compile_constraints(rules, preprocessed_data['course_details'])
+
+    with TRACER.stage('partition_shards'):
+        partitions = partition_requests(preprocessed_data['course_requests'], shards, shard_by)
+        allotment = apportion_sections(partitions, preprocessed_data['course_details'], constraints)
+        offsets = section_offsets(allotment)
+    sizes = [sum(len(requests) for requests in partition.values()) for partition in partitions]
+    if len(partitions) == 1:
+        # Nothing to reconcile: one shard is an ordinary run
+        schedule = generate_schedule(data, rules, preprocessed_data, placement=placement)
+        return schedule, {'sections_moved': 0, 'sections_dropped': 0, 'requests_bumped': 0, 'requests_refilled': 0,
+                          'shards': sizes}
+
+    shared = {'data': data, 'rules': rules, 'preprocessed_data': preprocessed_data, 'partitions': partitions,
+              'allotment': allotment, 'offsets': offsets, 'placement': placement}
+    workers = workers or min(len(partitions), os.cpu_count() or 1)
+
+    with TRACER.stage('schedule_shards'):
+        if workers <= 1:
+            _SHARED.update(shared)
+            try:
+                results = [run_shard(shard) for shard in range(len(partitions))]
+            finally:
+                _SHARED.clear()
+        else:
+            if 'fork' in multiprocessing.get_all_start_methods():
+                _SHARED.update(shared)
+                pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork'))
+            else:
+                pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(shared,))
+            try:
+                with pool:
+                    results = list(pool.map(run_shard, range(len(partitions))))
+            finally:
+                _SHARED.clear()
+
+    with TRACER.stage('reconcile_shards'):
+        schedule, stats = reconcile(rules, preprocessed_data, partitions, results)
+
+    return schedule, dict(stats, shards=sizes)
@@ -0,0 +1,132 @@
+from collections import defaultdict
+
+from instrumentation import TRACER
+from milestone2 import bucket_requests, course_demand, create_sections
+from schedule_index import ScheduleIndex
+
+
+def requests_by_student(rules, requests_by_type):
+    """{student_id: [(rank, course_code, req)]} in priority order, plus the requests with no student ID"""
+    by_student = defaultdict(list)
+    anonymous = []
+    for rank, req_type in enumerate(rules['priority_order']):
+        for course_code, type_requests in requests_by_type[req_type]:
+            for req in type_requests:
+                student_id = req.get('student ID', '')
+                if student_id:
+                    by_student[student_id].append((rank, course_code, req))
+                else:
+                    anonymous.append(req)
+    return by_student, anonymous
+
+
+def match_requests(candidates):
+    """Fit one student's requests into distinct blocks by augmenting paths.
+
+    candidates[i] lists (block, section_key) options for request i, and
+    requests are given in priority order. Each request in turn looks for
+    an augmenting path (Kuhn's algorithm): it takes a free block, or one
+    whose holder can move to another of its options. Requests already
+    matched stay matched, so adding them in priority order gives the
+    matching that keeps the most high-priority requests. Returns
+    ({request index: (block, section_key)}, augmenting path searches).
+    """
+    holder = {}  # {block: request index}
+    choice = {}
+    searches = 0
+
+    def augment(i, seen):
+        for block, section_key in candidates[i]:
+            if block in seen:
+                continue
+            seen.add(block)
+            if block not in holder or augment(holder[block], seen):
+                holder[block] = i
+                choice[i] = (block, section_key)
+                return True
+        return False
+
+    for i in range(len(candidates)):
+        searches += 1
+        augment(i, set())
+    return choice, searches
+
+
+def generate_student_schedule(data, rules, preprocessed_data, index=None, placement='greedy'):
+    """Schedule student by student instead of course by course.
+
+    Sections are created and placed exactly as generate_schedule does.
+    Students are then taken hardest first: those with higher-priority
+    requests, then those with the least slack (distinct blocks their
+    courses run in, minus the courses they request). Each student's whole
+    request set is fitted at once with match_requests over the sections
+    that still have seats, then committed. The work per student depends
+    only on their own requests, so the pass is linear in students.
+    Returns the same five structures as generate_schedule.
+    """
+    student_schedule = defaultdict(dict)
+    teacher_schedule = defaultdict(dict)
+    section_assignments = defaultdict(list)
+    if index is None:
+        index = ScheduleIndex(rules['all_blocks'])
+
+    requests_by_type = bucket_requests(rules, preprocessed_data)
+    create_sections(data, rules, preprocessed_data, course_demand(rules, requests_by_type), index, teacher_schedule,
+                    placement=placement)
+
+    # Every created section is listed, even if it ends up empty
+    course_blocks = {}  # {course_code: blocks its sections run in}
+    for course_code, section_keys in index.course_sections.items():
+        course_blocks[course_code] = {index.section_blocks[key] for key in section_keys}
+        for section_key in section_keys:
+            section_assignments.setdefault(section_key, [])
+
+    resolved_requests = []
+    unresolved_requests = []
+
+    with TRACER.stage('student_matching'):
+        by_student, anonymous = requests_by_student(rules, requests_by_type)
+        unresolved_requests.extend(anonymous)
+
+        def difficulty(student_id):
+            requests = by_student[student_id]
+            blocks = set()
+            for _, course_code, _ in requests:
+                blocks |= course_blocks.get(course_code, set())
+            return requests[0][0], len(blocks) - len(requests)
+
+        for student_id in sorted(by_student, key=difficulty):
+            # One request per course; a repeated course request cannot be met twice
+            requests = []
+            seen_courses = set()
+            for _, course_code, req in by_student[student_id]:
+                if course_code in seen_courses or course_code in index.student_sections[student_id]:
+                    unresolved_requests.append(req)
+                    continue
+                seen_courses.add(course_code)
+                requests.append((course_code, req))
+
+            # Open sections in blocks the student still has free
+            busy = index.student_masks[student_id]
+            candidates = [
+                [(index.section_blocks[section_key], section_key) for section_key in index.open_sections[course_code]
+                 if not busy & index.section_masks[section_key]]
+                for course_code, _ in requests
+            ]
+            choice, searches = match_requests(candidates)
+            TRACER.count('students')
+            TRACER.count('augmenting_searches', searches)
+
+            for i, (course_code, req) in enumerate(requests):
+                if i not in choice:
+                    unresolved_requests.append(req)
+                    continue
+                block, section_key = choice[i]
+                student_schedule[student_id][block] = f"{course_code} (Section {index.section_number[section_key]})"
+                section_assignments[section_key].append(student_id)
+                index.assign_student(student_id, section_key)
+                resolved_requests.append(req)
+
+    student_schedule_dict = {student: dict(blocks) for student, blocks in student_schedule.items()}
+    teacher_schedule_dict = {teacher: dict(blocks) for teacher, blocks in teacher_schedule.items()}
+    return student_schedule_dict, teacher_schedule_dict, resolved_requests, unresolved_requests, section_assignments
@@ -0,0 +1,65 @@
+# Terms in the school year; course 'Length' counts how many of them a course spans
+NUM_TERMS = 2
+
+# 'Request start term' values, mapped to 0-based terms (None: any term will do)
+REQUEST_START_TERMS = {
+    'first term': 0,
+    'second term': 1,
+    'any term': None
+}
+
+
+def request_start_term(req):
+    """0-based term a request has to start in, or None if any term will do"""
+    value = req.get('Request start term')
+    if not isinstance(value, str):
+        return None
+    return REQUEST_START_TERMS.get(value.strip().lower())
+
+
+def _term_span(start_term, length, num_terms):
+    """Terms covered by a course starting in start_term (1-based) for length terms"""
+    try:
+        start = int(start_term) - 1
+        length = int(round(float(length)))
+    except (TypeError, ValueError):
+        return tuple(range(num_terms))
+    start = min(max(start, 0), num_terms - 1)
+    length = max(length, 1)
+    return tuple(range(start, min(start + length, num_terms)))
+
+
+def section_term_spans(data, num_terms=NUM_TERMS):
+    """{section_key: terms} from the Start Term and Length of each course listing"""
+    spans = {}
+    for course in data.get('course_listings', []):
+        course_code = course.get('lecture Code', '')
+        if course_code:
+            section_key = f"{course_code}_{course.get('Section number', 1)}"
+            spans[section_key] = _term_span(course.get('Start Term', 1), course.get('Length', num_terms), num_terms)
+    return spans
+
+
+def section_terms(section_key, course_code, spans, course_details, num_terms=NUM_TERMS):
+    """Terms a section runs in.
+
+    Listed sections use their own Start Term and Length. Extra sections
+    copy the course's first listed section, and unlisted courses start in
+    the first term for the course's Length.
+    """
+    if section_key in spans:
+        return spans[section_key]
+    first_section = spans.get(f"{course_code}_1")
+    if first_section is not None:
+        return first_section
+    return _term_span(1, course_details.get(course_code, {}).get('length', num_terms), num_terms)
+
+
+def slot_name(block, term):
+    """Schedule key for a block in one term, e.g. '1A-T2'"""
+    return f"{block}-T{term + 1}"
+
+
+def all_slots(blocks, num_terms=NUM_TERMS):
+    return [slot_name(block, term) for block in blocks for term in range(num_terms)]
+
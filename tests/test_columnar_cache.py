@@ -0,0 +1,36 @@
+import os
+
+import columnar_cache
+from columnar_cache import is_cache_stale, load_columnar_cache, read_cache_header, write_columnar_cache
+
+
+def test_equal_values_of_different_types_round_trip(tmp_path):
+    source = tmp_path / 'export.xlsx'
+    source.write_bytes(b'workbook')
+    cache_path = str(tmp_path / 'data.cache')
+    write_columnar_cache({'rows': [{'v': 1}, {'v': 1.0}, {'v': True}, {'v': 1}]}, cache_path, str(source))
+
+    values = load_columnar_cache(cache_path).get('rows').column('v')
+    assert [(type(v), v) for v in values] == [(int, 1), (float, 1.0), (bool, True), (int, 1)]
+
+
+def test_source_is_rehashed_only_when_its_stat_changes(tmp_path, monkeypatch):
+    source = tmp_path / 'export.xlsx'
+    source.write_bytes(b'workbook')
+    cache_path = str(tmp_path / 'data.cache')
+    write_columnar_cache({'rows': [{'v': 'a'}]}, cache_path, str(source))
+    header = read_cache_header(cache_path)
+
+    hashed = []
+    fingerprint_source = columnar_cache.fingerprint_source
+    monkeypatch.setattr(columnar_cache, 'fingerprint_source', lambda path: hashed.append(path) or fingerprint_source(path))
+    assert is_cache_stale(header) is None
+    assert hashed == []
+
+    # Touched but unchanged: hashed once, still fresh
+    os.utime(source, ns=(0, 0))
+    assert is_cache_stale(header) is None
+    assert len(hashed) == 1
+
+    source.write_bytes(b'workbook, edited')
+    assert is_cache_stale(header) is not None
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+import exact_solver
+from benchmark import generate_synthetic_data
+from milestone2 import extract_rules_and_constraints, generate_schedule, preprocess_data
+
+
+@pytest.fixture(scope='module')
+def inputs():
+    data = generate_synthetic_data(600, seed=5)
+    rules = extract_rules_and_constraints(data)
+    return data, rules, preprocess_data(data, rules)
+
+
+@pytest.mark.parametrize('answer', ['nothing', 'worse'])
+def test_component_keeps_warm_start_over_a_worse_answer(inputs, monkeypatch, answer):
+    def solve(spec, deadline, workers):
+        if answer == 'nothing':
+            return None, 'UNKNOWN', None
+        return np.zeros(spec.num_vars, dtype=bool), 'FEASIBLE', None
+
+    monkeypatch.setattr(exact_solver, '_pick_backend', lambda backend: ('stub', solve))
+    data, rules, pre = inputs
+    greedy = generate_schedule(data, rules, pre)
+    (student_schedule, teacher_schedule, resolved, unresolved, section_assignments), info = \
+        exact_solver.solve_exact(data, rules, pre, time_limit=5)
+
+    assert all(component['kept_warm_start'] for component in info['components'])
+    assert len(resolved) == len(greedy[2])
+    assert sum(len(members) for members in section_assignments.values()) == len(resolved)
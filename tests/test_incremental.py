@@ -0,0 +1,69 @@
+import copy
+
+import pytest
+
+from benchmark import generate_synthetic_data
+from incremental import IncrementalScheduler
+from milestone2 import extract_rules_and_constraints, preprocess_data
+
+
+@pytest.fixture(scope='module')
+def inputs():
+    data = generate_synthetic_data(600, seed=2)
+    rules = extract_rules_and_constraints(data)
+    return data, rules, preprocess_data(data, rules)
+
+
+def seated(scheduler):
+    return next((student_id, course_code, section_key)
+                for student_id, sections in scheduler.index.student_sections.items()
+                for course_code, section_key in sections.items())
+
+
+def test_term_aware_changes_stay_keyed_by_slot(inputs):
+    data, rules, pre = inputs
+    scheduler = IncrementalScheduler.from_run(data, rules, pre, term_aware=True)
+    student_id, course_code, section_key = seated(scheduler)
+    req = scheduler.placed[(student_id, course_code)]
+    slots = [slot for slot, label in scheduler.student_schedule[student_id].items()
+             if label.startswith(f"{course_code} ")]
+    assert slots and all('-T' in slot for slot in slots)
+
+    changes = scheduler.apply(removed=[req])
+    assert changes[0]['action'] == 'dropped'
+    assert not any(slot in scheduler.student_schedule.get(student_id, {}) for slot in slots)
+    scheduler.apply(added=[req])
+    assert all(all('-T' in slot for slot in blocks) for blocks in scheduler.student_schedule.values())
+
+    # Rebuilt from the plain dicts, the index books the same slots
+    rebuilt = IncrementalScheduler(scheduler.schedule(), rules, pre)
+    assert rebuilt.index.terms == scheduler.index.terms
+    assert dict(rebuilt.index.section_masks) == dict(scheduler.index.section_masks)
+    assert {k: v for k, v in rebuilt.index.student_masks.items() if v} == \
+        {k: v for k, v in scheduler.index.student_masks.items() if v}
+
+
+def test_duplicate_request_is_not_seated_twice(inputs):
+    data, rules, pre = inputs
+    scheduler = IncrementalScheduler.from_run(data, rules, pre)
+    student_id, course_code, section_key = seated(scheduler)
+    duplicate = dict(scheduler.placed[(student_id, course_code)])
+
+    previous = scheduler.schedule()
+    previous['resolved'].append(duplicate)
+    rebuilt = IncrementalScheduler(previous, rules, pre)
+    assert len(rebuilt.resolved) == len(scheduler.resolved)
+    assert duplicate in rebuilt.unresolved
+    assert rebuilt.index.student_sections[student_id][course_code] == section_key
+
+
+def test_moving_a_section_leaves_the_previous_schedule_alone(inputs):
+    data, rules, pre = inputs
+    previous = IncrementalScheduler.from_run(data, rules, pre).schedule()
+    before = copy.deepcopy(previous)
+    scheduler = IncrementalScheduler(previous, rules, pre)
+    section_key = next(key for key, students in scheduler.section_assignments.items() if students)
+    block = next(block for block in rules['all_blocks'] if block != scheduler.section_blocks[section_key])
+    scheduler.move_section(section_key, block)
+    assert scheduler.teacher_schedule != before['teacher_schedule']
+    assert previous == before
@@ -0,0 +1,108 @@
+import asyncio
+import time
+
+import pytest
+
+from benchmark import generate_synthetic_data
+from incremental import IncrementalScheduler
+from intake import RequestIntake
+from milestone2 import extract_rules_and_constraints, preprocess_data
+
+
+@pytest.fixture(scope='module')
+def warm():
+    data = generate_synthetic_data(400, seed=1)
+    rules = extract_rules_and_constraints(data)
+    pre = preprocess_data(data, rules)
+    return data, rules, pre
+
+
+def make_intake(warm, **options):
+    data, rules, pre = warm
+    return RequestIntake(IncrementalScheduler.from_run(data, rules, pre), pre['constraints'], **options)
+
+
+def some_request(intake):
+    student_id = next(iter(intake.scheduler.student_schedule))
+    course_code = next(iter(intake.scheduler.course_details))
+    return {'student ID': student_id, 'College Year': '1st Year', 'Course code': course_code, 'Type': 'Requested'}
+
+
+def test_cancelled_submit_does_not_stall_intake(warm):
+    intake = make_intake(warm, max_wait=0.05)
+
+    async def run():
+        await intake.start()
+        # Cancelled while queued: left out of the batch
+        queued = asyncio.create_task(intake.submit([some_request(intake)]))
+        await asyncio.sleep(0.01)
+        queued.cancel()
+        # Cancelled while its call runs on the writer
+        running = asyncio.create_task(intake.call(lambda scheduler: (time.sleep(0.1), [])))
+        await asyncio.sleep(0.1)
+        running.cancel()
+        outcome = await asyncio.wait_for(intake.submit([], []), 5)
+        assert outcome['submissions'] == 1
+        assert not intake._committer.done()
+
+    asyncio.run(run())
+
+
+def test_failed_batch_rebuilds_snapshot(warm):
+    intake = make_intake(warm, max_wait=0)
+    scheduler = intake.scheduler
+    student_id = next(iter(scheduler.student_schedule))
+
+    def fail_partway(added, removed):
+        scheduler.student_schedule[student_id] = {}
+        raise RuntimeError('boom')
+
+    async def run():
+        await intake.start()
+        version = intake.snapshot.version
+        scheduler.apply = fail_partway
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(intake.submit([], []), 5)
+        assert intake.snapshot.version == version + 1
+        assert intake.snapshot.students[student_id]['schedule'] == {}
+        del scheduler.apply
+        outcome = await asyncio.wait_for(intake.submit([], []), 5)
+        assert outcome['batch'] == version + 2
+
+    asyncio.run(run())
+
+
+def test_string_student_ids_match_int_ids(warm):
+    intake = make_intake(warm, max_wait=0)
+    scheduler = intake.scheduler
+    student_id, course_code = next(key for key, req in scheduler.placed.items()
+                                   if isinstance(key[0], int) and req['Type'] != 'Required')
+    req = scheduler.placed[(student_id, course_code)]
+
+    async def run():
+        await intake.start()
+        outcome = await asyncio.wait_for(intake.submit([], [dict(req, **{'student ID': str(student_id)})]), 5)
+        assert [change['action'] for change in outcome['changes']][:1] == ['dropped']
+        outcome = await asyncio.wait_for(intake.submit([dict(req, **{'student ID': str(student_id)})]), 5)
+        assert outcome['changes'][0]['student ID'] == student_id
+        # Seated again, or waitlisted if someone waiting took the freed seat
+        key = (student_id, course_code)
+        stored = scheduler.placed[key] if key in scheduler.placed else scheduler.waitlisted[key][2]
+        assert stored['student ID'] == student_id
+        assert not any(isinstance(seated, str) for seated, _ in scheduler.placed)
+
+    asyncio.run(run())
+
+
+def test_required_drop_is_refused_without_a_college_year(warm):
+    intake = make_intake(warm, max_wait=0)
+    key, req = next((key, req) for key, req in intake.scheduler.placed.items() if req['Type'] == 'Required')
+    bare = {'student ID': key[0], 'Course code': key[1]}
+
+    async def run():
+        await intake.start()
+        with pytest.raises(ValueError, match='Missing required course'):
+            await intake.submit([], [bare])
+        assert key in intake.scheduler.placed
+
+    asyncio.run(run())
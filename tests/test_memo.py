@@ -0,0 +1,41 @@
+import importlib
+import sys
+
+from memo import MemoCache
+
+
+def write_module(directory, name, source):
+    (directory / f"{name}.py").write_text(source)
+    sys.modules.pop(name, None)
+    importlib.invalidate_caches()
+    return importlib.import_module(name)
+
+
+def test_key_changes_when_a_dependency_changes(tmp_path, monkeypatch):
+    # The stage and its dependency live beside memo.py in the real tree
+    monkeypatch.setattr('memo.__file__', str(tmp_path / 'memo.py'))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    write_module(tmp_path, 'memo_dep', "def helper():\n    return 1\n")
+    stage = write_module(tmp_path, 'memo_stage', "from memo_dep import helper\n\ndef stage():\n    return helper()\n")
+    cache = MemoCache(str(tmp_path / 'cache'))
+    key = cache.key(stage.stage, 'input')
+    assert cache.key(stage.stage, 'input') == key
+
+    write_module(tmp_path, 'memo_dep', "def helper():\n    return 2\n")
+    assert cache.key(stage.stage, 'input') != key
+
+
+def test_entry_of_a_missing_class_is_a_miss(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(str(tmp_path))
+    module = write_module(tmp_path, 'memo_gone', "class Gone:\n    pass\n")
+    cache = MemoCache(str(tmp_path / 'cache'))
+    cache.put('gone', module.Gone())
+    assert cache.get('gone')[0]
+
+    (tmp_path / 'memo_gone.py').write_text("")
+    sys.modules.pop('memo_gone')
+    assert cache.get('gone') == (False, None)
+
+    (tmp_path / 'memo_gone.py').unlink()
+    assert cache.get('gone') == (False, None)
+    sys.modules.pop('memo_gone', None)
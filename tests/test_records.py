@@ -0,0 +1,23 @@
+from columnar_cache import NAN, load_columnar_cache, write_columnar_cache
+from records import Interner, RequestTable
+
+
+def test_interner_keeps_equal_values_of_different_types_apart():
+    interner = Interner()
+    codes = [interner.intern(value) for value in [1, 1.0, True, 1, NAN, NAN]]
+    assert codes == [0, 1, 2, 0, 3, 3]
+    assert [(type(interner[code]), interner[code]) for code in codes[:4]] == \
+        [(int, 1), (float, 1.0), (bool, True), (int, 1)]
+    assert interner.id_of(1.0) == 1 and interner.id_of(False) is None
+
+
+def test_request_table_round_trips_mixed_values(tmp_path):
+    rows = [{'student ID': 1, 'Course code': value} for value in [1, 1.0, True]]
+    assert [row['Course code'] for row in RequestTable.from_rows(rows)] == [1, 1.0, True]
+    assert [type(row['Course code']) for row in RequestTable.from_rows(rows)] == [int, float, bool]
+
+    source = tmp_path / 'export.xlsx'
+    source.write_bytes(b'workbook')
+    write_columnar_cache({'student_requests': rows}, str(tmp_path / 'data.cache'), str(source))
+    table = RequestTable.from_column_table(load_columnar_cache(str(tmp_path / 'data.cache'))['student_requests'])
+    assert [type(row['Course code']) for row in table] == [int, float, bool]
@@ -0,0 +1,56 @@
+from milestone2 import extract_rules_and_constraints, preprocess_data
+from rule_compiler import DEFAULT_REQUIRED_COURSES, compile_constraints
+
+
+def test_required_courses_fall_back_to_defaults():
+    rules = extract_rules_and_constraints({'rules': [], 'course_characteristics': [], 'student_requests': []})
+    assert rules['required_courses'] == DEFAULT_REQUIRED_COURSES
+    assert {'kind': 'required_courses', 'rule': None, 'by_year': DEFAULT_REQUIRED_COURSES} in rules['constraints']
+
+
+def test_required_courses_come_from_required_requests():
+    data = {'rules': [], 'course_characteristics': [], 'student_requests': [
+        {'student ID': 1, 'College Year': '1st Year', 'Course code': 'BIB9', 'Type': 'Required'},
+        {'student ID': 1, 'College Year': '1st Year', 'Course code': 'ART', 'Type': 'Requested'},
+    ]}
+    assert extract_rules_and_constraints(data)['required_courses'] == {'1st Year': ['BIB9']}
+
+
+def test_elective_request_for_required_course_keeps_its_rank():
+    data = {'rules': [], 'course_characteristics': [], 'course_listings': [], 'student_requests': [
+        {'student ID': 1, 'College Year': '1st Year', 'Course code': 'BIB9', 'Type': 'Required'},
+        {'student ID': 2, 'College Year': '1st Year', 'Course code': 'BIB9', 'Type': 'Recommended'},
+        {'student ID': 3, 'College Year': '1st Year', 'Course code': 'BIB9', 'Type': 'Requested'},
+    ]}
+    rules = extract_rules_and_constraints(data)
+    constraints = compile_constraints(rules, {})
+    ranks = [constraints.request_rank(req) for req in data['student_requests']]
+    assert ranks == [0, 2, 1]
+    ordered = preprocess_data(data, rules)['course_requests']['BIB9']
+    assert [req['student ID'] for req in ordered] == [1, 3, 2]
+
+
+def test_rule_flags_reach_the_tables():
+    data = {'course_characteristics': [], 'student_requests': [], 'rules': [
+        {'S. No.': 3, 'RULES': 'No teacher can be present twice in same block'},
+        {'S. No.': 7, 'RULES': 'No sections should be overcrowded - distribute the students almost equally'},
+        {'S. No.': 10, 'RULES': 'Length / Course Length (1 = One Term, 2 = Full Year) decide the course term'},
+    ]}
+    rules = extract_rules_and_constraints(data)
+    assert [entry['kind'] for entry in rules['constraints']] == ['balanced_sections', 'course_length',
+                                                                 'required_courses']
+    constraints = compile_constraints(rules, {})
+    assert constraints.balanced_sections and constraints.term_lengths
+
+
+def test_validation_checks_the_compiled_required_courses(tmp_path, monkeypatch):
+    from milestone1 import validate_data
+    monkeypatch.chdir(tmp_path)
+    data = {'rules': [], 'course_characteristics': [], 'course_listings': [], 'rooms': [], 'student_requests': [
+        {'student ID': 1, 'College Year': '3rd year', 'Course code': 'BIB11', 'Type': 'Required'},
+        {'student ID': 2, 'College Year': '3rd year', 'Course code': 'ART', 'Type': 'Requested'},
+    ]}
+    validate_data(data)
+    report = (tmp_path / 'validation_report.md').read_text()
+    assert "Only 1/2 3rd year students requested BIB11" in report
+    assert "BIB9" not in report
@@ -0,0 +1,48 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from benchmark import generate_synthetic_data
+from milestone2 import extract_rules_and_constraints, preprocess_data
+from service import ScheduleService, make_server
+
+
+@pytest.fixture(scope='module')
+def service():
+    data = generate_synthetic_data(600, seed=3)
+    rules = extract_rules_and_constraints(data)
+    return ScheduleService(data, rules, preprocess_data(data, rules))
+
+
+def test_rerun_into_a_block_of_another_section_of_the_course_is_refused(service):
+    index = service.scheduler.index
+    course_code, (section_key, other_key) = next(
+        (course_code, keys[:2]) for course_code, keys in index.course_sections.items() if len(keys) > 1)
+    block = index.section_blocks[other_key]
+
+    status, payload = service.rerun_section(section_key, {'block': block})
+    assert status == 409, payload
+    assert index.section_blocks[section_key] != block
+    assert service.rerun_section(section_key, {'block': ['2A']})[0] == 400
+
+
+def test_handler_errors_are_sent_as_json(service, monkeypatch):
+    def fail(*args):
+        raise TypeError("unhashable type: 'list'")
+
+    monkeypatch.setattr(service, 'rerun_section', fail)
+    server = make_server(service, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        request = urllib.request.Request(f"http://127.0.0.1:{server.server_address[1]}/sections/X_1/rerun",
+                                         data=b'{}', method='POST')
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(request, timeout=5)
+        assert error.value.code == 500
+        assert 'unhashable' in json.load(error.value)['error']
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,21 @@
+from collections import Counter
+
+from benchmark import generate_synthetic_data
+from milestone2 import extract_rules_and_constraints, preprocess_data
+from sharding import sharded_schedule
+
+
+def test_no_course_runs_twice_in_a_block_across_shards():
+    data = generate_synthetic_data(5000, seed=1)
+    rules = extract_rules_and_constraints(data)
+    pre = preprocess_data(data, rules)
+    (student_schedule, teacher_schedule, resolved, unresolved, section_assignments), info = \
+        sharded_schedule(data, rules, pre, shards=4, workers=1)
+    assert len(info['shards']) > 1
+
+    course_blocks = Counter()
+    for blocks in teacher_schedule.values():
+        for block, label in blocks.items():
+            course_blocks[label.split(' (')[0], block] += 1
+    assert [key for key, count in course_blocks.items() if count > 1] == []
+    assert len(resolved) + len(unresolved) == sum(len(requests) for requests in pre['course_requests'].values())